@@ -1,5 +1,7 @@
 import { NextRequest, NextResponse } from 'next/server';
 import { connectToDatabase } from '@/lib/mongodb';
+import { DATE_FIELDS, formatFecha } from '@/lib/dates';
+import { SEARCH_PROJECTION, searchFilter } from '@/lib/search';
 
 export async function POST(request: NextRequest) {
   try {
@@ -16,11 +18,7 @@ export async function POST(request: NextRequest) {
     const query: any = {};
     
     if (filters.search) {
-      query.$or = [
-        { nombre: { $regex: filters.search, $options: 'i' } },
-        { nif: { $regex: filters.search, $options: 'i' } },
-        { fines: { $regex: filters.search, $options: 'i' } }
-      ];
+      Object.assign(query, searchFilter(filters.search));
     }
     
     if (filters.provincia) {
@@ -35,8 +33,8 @@ export async function POST(request: NextRequest) {
       query['actividades.clasificacion1'] = { $regex: filters.actividad, $options: 'i' };
     }
     
-    // Build projection
-    const projection: any = {};
+    // Build projection (sin campos pedidos, todo menos las claves de búsqueda)
+    const projection: any = fields.length > 0 ? {} : { ...SEARCH_PROJECTION };
     if (fields.length > 0) {
       fields.forEach((field: string) => {
         projection[field] = 1;
@@ -90,6 +88,9 @@ function convertToCSV(data: any[], fields: string[] | null): string {
       
       if (obj[key] === null || obj[key] === undefined) {
         acc[pre + key] = '';
+      } else if (obj[key] instanceof Date && key in DATE_FIELDS) {
+        // Fechas del registro como DD/MM/YYYY, igual que en la hoja original
+        acc[pre + key] = formatFecha(obj[key]);
       } else if (typeof obj[key] === 'object' && !Array.isArray(obj[key]) && !(obj[key] instanceof Date)) {
         Object.assign(acc, flattenObject(obj[key], pre + key));
       } else if (Array.isArray(obj[key])) {
@@ -1,9 +1,23 @@
 import { NextResponse } from 'next/server';
 import { connectToDatabase } from '@/lib/mongodb';
+import { readFacetFilters } from '@/lib/facets';
 
 export async function GET() {
   try {
     const { db } = await connectToDatabase();
+
+    // Listas guardadas con el cubo de filtros (facet_cube.py): una lectura por _id
+    const stored = await readFacetFilters(db);
+    if (stored) {
+      return NextResponse.json({
+        provincias: stored.provincias,
+        estados: stored.estados,
+        actividades: stored.actividades.filter((item: { _id: unknown }) => Boolean(item._id)),
+        funciones: stored.funciones.filter((item: { _id: unknown }) => Boolean(item._id))
+      });
+    }
+
+    // Sin cubo (p. ej. tras /api/restore): las agregaciones sobre toda la colección
     const collection = db.collection('fundaciones');
     
     // Get provinces with counts
@@ -1,5 +1,7 @@
 import { NextRequest, NextResponse } from 'next/server';
 import { connectToDatabase } from '@/lib/mongodb';
+import { countFromFacets } from '@/lib/facets';
+import { SEARCH_PROJECTION, searchFilter } from '@/lib/search';
 
 export async function GET(request: NextRequest) {
   try {
@@ -21,11 +23,8 @@ export async function GET(request: NextRequest) {
     const query: any = {};
     
     if (search) {
-      query.$or = [
-        { nombre: { $regex: search, $options: 'i' } },
-        { nif: { $regex: search, $options: 'i' } },
-        { fines: { $regex: search, $options: 'i' } }
-      ];
+      // Claves normalizadas con índice en lugar de $regex sin anclar sobre el texto
+      Object.assign(query, searchFilter(search));
     }
     
     if (provincia) {
@@ -52,12 +51,14 @@ export async function GET(request: NextRequest) {
       sortCriteria.nombre = sortOrder === 'asc' ? 1 : -1;
     }
     
-    // Get total count
-    const total = await db.collection('fundaciones').countDocuments(query);
+    // Get total count: sin búsqueda de texto lo suma el cubo de filtros, si lo hay
+    const facetTotal = search ? null : await countFromFacets(db, { provincia, estado, actividad, funcion });
+    const total = facetTotal ?? await db.collection('fundaciones').countDocuments(query);
     
     // Get paginated results
     const fundaciones = await db.collection('fundaciones')
       .find(query)
+      .project(SEARCH_PROJECTION)
       .sort(sortCriteria)
       .skip((page - 1) * limit)
       .limit(limit)
@@ -0,0 +1,39 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { connectToDatabase } from '@/lib/mongodb';
+import { PERSONAS_COLLECTION, personaKey } from '@/lib/personas';
+
+// Fundaciones en las que aparece una persona: GET /api/personas?nombre=...&rol=patrono
+export async function GET(request: NextRequest) {
+  try {
+    const { db } = await connectToDatabase();
+    const searchParams = request.nextUrl.searchParams;
+
+    const key = personaKey(searchParams.get('nombre') || '');
+    const rol = searchParams.get('rol') || '';
+    if (!key) {
+      return NextResponse.json(
+        { error: 'Missing nombre' },
+        { status: 400 }
+      );
+    }
+
+    // Igualdad sobre la clave normalizada: una búsqueda en el índice { key, rol }
+    const query: Record<string, string> = { key };
+    if (rol) {
+      query.rol = rol;
+    }
+    const data = await db.collection(PERSONAS_COLLECTION)
+      .find(query, { projection: { _id: 0, key: 0 } })
+      .sort({ fundacionNombre: 1 })
+      .toArray();
+
+    return NextResponse.json({ nombre: searchParams.get('nombre'), total: data.length, data });
+
+  } catch (error) {
+    console.error('API Error:', error);
+    return NextResponse.json(
+      { error: 'Internal Server Error' },
+      { status: 500 }
+    );
+  }
+}
@@ -1,9 +1,92 @@
 import { NextRequest, NextResponse } from 'next/server';
+import { createHash } from 'crypto';
+import type { AnyBulkWriteOperation, Collection, Document } from 'mongodb';
 import { connectToDatabase } from '@/lib/mongodb';
+import { buildIndexes } from '@/lib/indexes';
+import { insertSized } from '@/lib/batching';
+import { invalidateStats } from '@/lib/stats';
+import { invalidateFacets } from '@/lib/facets';
+import { normalizeDates } from '@/lib/dates';
+import { addSearchKeys } from '@/lib/search';
+import { rebuildPersonas } from '@/lib/personas';
 
 // Proteger el endpoint con una API key simple
 const RESTORE_API_KEY = process.env.RESTORE_API_KEY || 'your-secure-api-key-here';
 
+// Campos (rutas con puntos los anidados) que cambian en cada carga y no cuentan como diferencia
+const VOLATILE_FIELDS = new Set(['fechaActualizacion', 'contentHash', 'metadata.fechaActualizacion']);
+const SYNC_BATCH_SIZE = 500;
+
+// JSON canónico: claves ordenadas y sin espacios (mismo formato que collection_sync.py)
+function canonicalJson(value: unknown): string {
+  if (Array.isArray(value)) {
+    return '[' + value.map(canonicalJson).join(',') + ']';
+  }
+  if (value && typeof value === 'object' && !(value instanceof Date)) {
+    const entries = Object.keys(value as Record<string, unknown>).sort()
+      .map(key => JSON.stringify(key) + ':' + canonicalJson((value as Record<string, unknown>)[key]));
+    return '{' + entries.join(',') + '}';
+  }
+  return JSON.stringify(value ?? null);
+}
+
+// El documento sin sus VOLATILE_FIELDS, también los anidados
+function stableFields(value: Document, prefix = ''): Document {
+  return Object.fromEntries(Object.entries(value)
+    .filter(([key]) => !VOLATILE_FIELDS.has(prefix + key))
+    .map(([key, item]) => [key, isPlainObject(item) ? stableFields(item, prefix + key + '.') : item]));
+}
+
+function isPlainObject(value: unknown): value is Document {
+  return !!value && typeof value === 'object' && !Array.isArray(value) && !(value instanceof Date);
+}
+
+function contentHash(doc: Document): string {
+  return createHash('sha1').update(canonicalJson(stableFields(doc)), 'utf8').digest('hex');
+}
+
+// Sin él, el siguiente modo sync reescribiría todas las fundaciones restauradas
+function addContentHash(doc: Document) {
+  doc.contentHash = contentHash(doc);
+}
+
+// Escribe solo las fundaciones nuevas, modificadas o eliminadas
+async function syncCollection(collection: Collection, data: Document[]) {
+  const stored = new Map<unknown, string | undefined>();
+  for await (const doc of collection.find({}, { projection: { contentHash: 1 } })) {
+    stored.set(doc._id, doc.contentHash);
+  }
+
+  const stats = { inserted: 0, updated: 0, unchanged: 0, deleted: 0 };
+  const operations: AnyBulkWriteOperation<Document>[] = [];
+  const seen = new Set<unknown>();
+
+  for (const doc of data) {
+    seen.add(doc._id);
+    if (stored.has(doc._id) && stored.get(doc._id) === doc.contentHash) {
+      stats.unchanged++;
+      continue;
+    }
+    if (stored.has(doc._id)) {
+      stats.updated++;
+    } else {
+      stats.inserted++;
+    }
+    operations.push({ replaceOne: { filter: { _id: doc._id }, replacement: doc, upsert: true } });
+  }
+
+  const missing = [...stored.keys()].filter(id => !seen.has(id));
+  stats.deleted = missing.length;
+  for (let i = 0; i < missing.length; i += SYNC_BATCH_SIZE) {
+    operations.push({ deleteMany: { filter: { _id: { $in: missing.slice(i, i + SYNC_BATCH_SIZE) } } } });
+  }
+
+  for (let i = 0; i < operations.length; i += SYNC_BATCH_SIZE) {
+    await collection.bulkWrite(operations.slice(i, i + SYNC_BATCH_SIZE), { ordered: false });
+  }
+  return stats;
+}
+
 export async function POST(request: NextRequest) {
   try {
     // Verificar API key
@@ -15,7 +98,7 @@ export async function POST(request: NextRequest) {
       );
     }
 
-    const { data } = await request.json();
+    const { data, mode } = await request.json();
     
     if (!data || !Array.isArray(data)) {
       return NextResponse.json(
@@ -24,21 +107,49 @@ export async function POST(request: NextRequest) {
       );
     }
 
+    // Fechas en texto a fechas BSON, claves de búsqueda y hash de contenido, como los guardan los scripts de carga
+    data.forEach(normalizeDates);
+    data.forEach(addSearchKeys);
+    data.forEach(addContentHash);
+    
     const { db } = await connectToDatabase();
     const collection = db.collection('fundaciones');
     
-    // Limpiar colección existente
-    await collection.deleteMany({});
+    // Modo sync: sin vaciar la colección, solo las diferencias
+    if (mode === 'sync') {
+      if (data.length === 0) {
+        return NextResponse.json(
+          { error: 'Refusing to sync an empty data set' },
+          { status: 400 }
+        );
+      }
+      const stats = await syncCollection(collection, data);
+      await invalidateStats(db);
+      await invalidateFacets(db);
+      await rebuildPersonas(db);
+      return NextResponse.json({
+        success: true,
+        message: 'Database synced successfully',
+        ...stats
+      });
+    }
+    
+    // Eliminar la colección existente (también sus índices: se insertan los datos primero)
+    if (await db.listCollections({ name: 'fundaciones' }).hasNext()) {
+      await collection.drop();
+    }
     
-    // Insertar nuevos datos
-    const result = await collection.insertMany(data);
+    // Insertar nuevos datos en lotes por tamaño BSON
+    const result = await insertSized(collection, data);
     
     // Crear índices
-    await collection.createIndex({ nombre: 1 });
-    await collection.createIndex({ estado: 1 });
-    await collection.createIndex({ nif: 1 });
-    await collection.createIndex({ 'direccionEstatutaria.provincia': 1 });
-    await collection.createIndex({ 'actividades.clasificacion1': 1 });
+    await buildIndexes(collection);
+    
+    // Las estadísticas y el cubo de filtros guardados eran de los datos anteriores;
+    // el índice de personas se reconstruye con los nuevos
+    await invalidateStats(db);
+    await invalidateFacets(db);
+    await rebuildPersonas(db);
     
     return NextResponse.json({
       success: true,
@@ -76,30 +187,36 @@ export async function PUT(request: NextRequest) {
       );
     }
 
+    batch.forEach(normalizeDates);
+    batch.forEach(addSearchKeys);
+    batch.forEach(addContentHash);
+    
     const { db } = await connectToDatabase();
     const collection = db.collection('fundaciones');
     
-    // Limpiar colección en el primer lote
-    if (clearFirst && batchNumber === 1) {
-      await collection.deleteMany({});
+    // Eliminar la colección en el primer lote (los índices se crean en el último)
+    if (clearFirst && batchNumber === 1 && await db.listCollections({ name: 'fundaciones' }).hasNext()) {
+      await collection.drop();
     }
     
-    // Insertar lote
-    const result = await collection.insertMany(batch);
+    // Insertar lote (partido por tamaño BSON si hace falta)
+    const result = await insertSized(collection, batch);
+    // Cada lote cambia los totales: /stats las recalcula en la siguiente petición, /filters usa la colección
+    await invalidateStats(db);
+    await invalidateFacets(db);
     
-    // Crear índices en el último lote
+    // Crear índices y reconstruir el índice de personas en el último lote
     if (batchNumber === totalBatches) {
-      await collection.createIndex({ nombre: 1 });
-      await collection.createIndex({ estado: 1 });
-      await collection.createIndex({ nif: 1 });
-      await collection.createIndex({ 'direccionEstatutaria.provincia': 1 });
-      await collection.createIndex({ 'actividades.clasificacion1': 1 });
+      await buildIndexes(collection);
+      await rebuildPersonas(db);
     }
     
     return NextResponse.json({
       success: true,
       message: `Batch ${batchNumber}/${totalBatches} processed`,
-      documentsInserted: result.insertedCount
+      documentsInserted: result.insertedCount,
+      // Tamaño de lote recomendado para los siguientes envíos, según la latencia medida
+      suggestedBatchSize: result.suggestedBatchSize
     });
     
   } catch (error) {
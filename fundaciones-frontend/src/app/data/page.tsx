@@ -3,6 +3,7 @@
 import React, { useState, useEffect, Suspense } from 'react';
 import { useSearchParams } from 'next/navigation';
 import Header from '@/components/layout/Header';
+import { formatFecha } from '@/lib/dates';
 import { Eye, ChevronDown, ChevronUp, ArrowLeft } from 'lucide-react';
 
 interface Foundation {
@@ -176,8 +177,8 @@ function DataContent() {
                         {singleFoundation.estado}
                       </span>
                     </p>
-                    <p><strong>Fecha de Constitución:</strong> {singleFoundation.fechaConstitucion || 'N/A'}</p>
-                    <p><strong>Fecha de Inscripción:</strong> {singleFoundation.fechaInscripcion || 'N/A'}</p>
+                    <p><strong>Fecha de Constitución:</strong> {formatFecha(singleFoundation.fechaConstitucion) || 'N/A'}</p>
+                    <p><strong>Fecha de Inscripción:</strong> {formatFecha(singleFoundation.fechaInscripcion) || 'N/A'}</p>
                   </div>
                 </div>
 
@@ -393,8 +394,8 @@ function DataContent() {
                             <div>
                               <h4 className="font-semibold text-gray-700 mb-2">Información Básica</h4>
                               <p><strong>NIF:</strong> {fundacion.nif || 'N/A'}</p>
-                              <p><strong>Fecha Constitución:</strong> {fundacion.fechaConstitucion || 'N/A'}</p>
-                              <p><strong>Fecha Inscripción:</strong> {fundacion.fechaInscripcion || 'N/A'}</p>
+                              <p><strong>Fecha Constitución:</strong> {formatFecha(fundacion.fechaConstitucion) || 'N/A'}</p>
+                              <p><strong>Fecha Inscripción:</strong> {formatFecha(fundacion.fechaInscripcion) || 'N/A'}</p>
                             </div>
                             
                             <div>
@@ -465,8 +466,8 @@ function DataContent() {
                     <p><strong>Número de Registro:</strong> {selectedFundacion.numRegistro}</p>
                     <p><strong>NIF:</strong> {selectedFundacion.nif || 'N/A'}</p>
                     <p><strong>Estado:</strong> {selectedFundacion.estado}</p>
-                    <p><strong>Fecha de Constitución:</strong> {selectedFundacion.fechaConstitucion || 'N/A'}</p>
-                    <p><strong>Fecha de Inscripción:</strong> {selectedFundacion.fechaInscripcion || 'N/A'}</p>
+                    <p><strong>Fecha de Constitución:</strong> {formatFecha(selectedFundacion.fechaConstitucion) || 'N/A'}</p>
+                    <p><strong>Fecha de Inscripción:</strong> {formatFecha(selectedFundacion.fechaInscripcion) || 'N/A'}</p>
                   </div>
                 </div>
 
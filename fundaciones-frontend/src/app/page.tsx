@@ -3,6 +3,7 @@
 import { useState, useEffect } from 'react';
 import { useRouter } from 'next/navigation';
 import Header from '@/components/layout/Header';
+import { formatFecha } from '@/lib/dates';
 import { Search, ChevronRight, Building, MapPin, Calendar, Filter } from 'lucide-react';
 
 interface Foundation {
@@ -291,7 +292,7 @@ export default function Home() {
                         {fundacion.fechaConstitucion && (
                           <div className="flex items-center space-x-2">
                             <Calendar size={16} />
-                            <span>{fundacion.fechaConstitucion}</span>
+                            <span>{formatFecha(fundacion.fechaConstitucion)}</span>
                           </div>
                         )}
                         
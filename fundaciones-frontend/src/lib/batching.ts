@@ -0,0 +1,49 @@
+import { BSON, type Collection, type Document } from 'mongodb';
+
+// Bytes por insertMany: muy por debajo del límite de 48MB por mensaje
+// (mismo presupuesto máximo que batch_sizing.py)
+export const MAX_BATCH_BYTES = 16 * 1024 * 1024;
+// Tiempo de escritura por lote al que se ajusta el tamaño sugerido
+const TARGET_LATENCY_MS = 500;
+
+// Agrupa los documentos por tamaño BSON en lugar de por número
+export function* sizedBatches(documents: Document[], maxBytes = MAX_BATCH_BYTES) {
+  let batch: Document[] = [];
+  let bytes = 0;
+  for (const doc of documents) {
+    const size = BSON.calculateObjectSize(doc);
+    if (batch.length > 0 && bytes + size > maxBytes) {
+      yield { documents: batch, bytes };
+      batch = [];
+      bytes = 0;
+    }
+    batch.push(doc);
+    bytes += size;
+  }
+  if (batch.length > 0) {
+    yield { documents: batch, bytes };
+  }
+}
+
+// Inserta en lotes por tamaño y mide la latencia; suggestedBatchSize es el
+// número de documentos de este tamaño medio que se escribirían en
+// TARGET_LATENCY_MS sin pasar de MAX_BATCH_BYTES
+export async function insertSized(collection: Collection, documents: Document[]) {
+  let insertedCount = 0;
+  let batches = 0;
+  let totalBytes = 0;
+  const started = Date.now();
+  for (const batch of sizedBatches(documents)) {
+    const result = await collection.insertMany(batch.documents, { ordered: false });
+    insertedCount += result.insertedCount;
+    totalBytes += batch.bytes;
+    batches++;
+  }
+  const elapsedMs = Math.max(1, Date.now() - started);
+  const averageBytes = totalBytes / Math.max(1, documents.length);
+  const suggestedBatchSize = Math.max(1, Math.round(Math.min(
+    documents.length * TARGET_LATENCY_MS / elapsedMs,
+    MAX_BATCH_BYTES / Math.max(1, averageBytes)
+  )));
+  return { insertedCount, batches, totalBytes, elapsedMs, suggestedBatchSize };
+}
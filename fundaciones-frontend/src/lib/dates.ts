@@ -0,0 +1,66 @@
+import type { Document } from 'mongodb';
+
+// Fechas guardadas como fechas BSON a medianoche UTC, con el año aparte (date_fields.py)
+export const DATE_FIELDS: Record<string, string | null> = {
+  fechaConstitucion: 'anioConstitucion',
+  fechaInscripcion: 'anioInscripcion',
+  fechaExtincion: null
+};
+
+const ORIGINALS_FIELD = 'fechasOriginales';
+
+// Mismos formatos que DATE_FORMATS en date_fields.py: DD/MM/YYYY (o con - o .) y YYYY-MM-DD[ HH:MM:SS]
+const DAY_FIRST = /^(\d{1,2})([\/.-])(\d{1,2})\2(\d{4})(?: \d{1,2}:\d{2}:\d{2})?$/;
+const YEAR_FIRST = /^(\d{4})-(\d{1,2})-(\d{1,2})(?:[ T]\d{2}:\d{2}:\d{2}(?:\.\d+)?Z?)?$/;
+
+function utcDate(year: number, month: number, day: number): Date | null {
+  const date = new Date(Date.UTC(year, month - 1, day));
+  // Rechaza fechas imposibles (31/02) en lugar de desbordar al mes siguiente
+  return date.getUTCMonth() === month - 1 && date.getUTCDate() === day ? date : null;
+}
+
+export function parseFecha(value: string): Date | null {
+  const text = value.trim();
+  const dayFirst = DAY_FIRST.exec(text);
+  if (dayFirst) {
+    return utcDate(Number(dayFirst[4]), Number(dayFirst[3]), Number(dayFirst[1]));
+  }
+  const yearFirst = YEAR_FIRST.exec(text);
+  if (yearFirst) {
+    return utcDate(Number(yearFirst[1]), Number(yearFirst[2]), Number(yearFirst[3]));
+  }
+  return null;
+}
+
+// Convierte en fechas los campos de fecha que llegan como texto (JSON de /api/restore);
+// el texto que no se puede interpretar se guarda en fechasOriginales, como en los scripts
+export function normalizeDates(doc: Document): Document {
+  for (const [field, yearField] of Object.entries(DATE_FIELDS)) {
+    const value = doc[field];
+    if (typeof value === 'string') {
+      const date = parseFecha(value);
+      if (!date) {
+        doc[ORIGINALS_FIELD] = { ...(doc[ORIGINALS_FIELD] || {}), [field]: value };
+      }
+      doc[field] = date;
+    }
+    if (yearField && field in doc) {
+      doc[yearField] = doc[field] instanceof Date ? doc[field].getUTCFullYear() : null;
+    }
+  }
+  return doc;
+}
+
+// DD/MM/YYYY para mostrar; los textos de cargas anteriores se muestran tal cual
+export function formatFecha(value?: string | Date | null): string {
+  if (!value) {
+    return '';
+  }
+  const date = value instanceof Date ? value : YEAR_FIRST.test(value) ? new Date(value) : null;
+  if (!date || isNaN(date.getTime())) {
+    return String(value);
+  }
+  const day = String(date.getUTCDate()).padStart(2, '0');
+  const month = String(date.getUTCMonth() + 1).padStart(2, '0');
+  return `${day}/${month}/${date.getUTCFullYear()}`;
+}
@@ -0,0 +1,71 @@
+import type { Db, Document } from 'mongodb';
+import { STATS_COLLECTION } from './stats';
+
+// Cubo de recuentos por provincia × estado × actividades × funciones (facet_cube.py)
+export const FACETS_COLLECTION = 'fundaciones_facets';
+// Documento en 'fundaciones_stats' con las listas de filtros; marca el cubo como completo
+export const FACETS_ID = 'facets';
+// Igual que FACETS_VERSION en facet_cube.py: otra versión se ignora
+export const FACETS_VERSION = 1;
+
+interface FacetsDocument extends Document {
+  _id: string;
+  version: number;
+}
+
+export interface FacetQuery {
+  provincia?: string;
+  estado?: string;
+  actividad?: string;
+  funcion?: string;
+}
+
+// Listas guardadas de /api/fundaciones/filters, o null si falta el cubo o es de otra versión
+export async function readFacetFilters(db: Db) {
+  const stored = await db.collection<FacetsDocument>(STATS_COLLECTION).findOne(
+    { _id: FACETS_ID, version: FACETS_VERSION },
+    { projection: { filters: 1 } }
+  );
+  return stored ? stored.filters : null;
+}
+
+// Total del listado sumando las celdas del cubo, o null si no hay cubo.
+// Cada documento está en una sola celda, y los $regex de actividad y función se
+// aplican a los arrays de la celda igual que a los de sus actividades
+export async function countFromFacets(db: Db, filters: FacetQuery): Promise<number | null> {
+  const stored = await db.collection<FacetsDocument>(STATS_COLLECTION).findOne(
+    { _id: FACETS_ID, version: FACETS_VERSION },
+    { projection: { total: 1 } }
+  );
+  if (!stored) {
+    return null;
+  }
+
+  const match: Document = {};
+  if (filters.provincia) {
+    match.provincia = filters.provincia;
+  }
+  if (filters.estado) {
+    match.estado = filters.estado;
+  }
+  if (filters.actividad) {
+    match.actividades = { $regex: filters.actividad, $options: 'i' };
+  }
+  if (filters.funcion) {
+    match.funciones = { $regex: filters.funcion, $options: 'i' };
+  }
+  if (Object.keys(match).length === 0) {
+    return stored.total;
+  }
+
+  const [result] = await db.collection(FACETS_COLLECTION).aggregate([
+    { $match: match },
+    { $group: { _id: null, total: { $sum: '$count' } } }
+  ]).toArray();
+  return result ? result.total : 0;
+}
+
+// Tras escribir en 'fundaciones' el cubo deja de valer hasta que un script lo reconstruya
+export async function invalidateFacets(db: Db) {
+  await db.collection<FacetsDocument>(STATS_COLLECTION).deleteOne({ _id: FACETS_ID });
+}
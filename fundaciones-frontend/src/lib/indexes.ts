@@ -0,0 +1,16 @@
+import type { Collection, IndexDirection } from 'mongodb';
+import manifest from './fundaciones-indexes.json';
+
+// Mismo manifiesto que usan los scripts de migración (index_manifest.py)
+interface ManifestIndex {
+  keys: Record<string, IndexDirection>;
+  options?: Record<string, unknown>;
+}
+
+// Crea todos los índices en un único createIndexes, después de la carga
+export async function buildIndexes(collection: Collection) {
+  const indexes = manifest.indexes as ManifestIndex[];
+  return collection.createIndexes(
+    indexes.map(index => ({ key: index.keys, ...(index.options || {}) }))
+  );
+}
@@ -0,0 +1,70 @@
+import type { Db, Document } from 'mongodb';
+import { insertSized } from './batching';
+import { words } from './search';
+
+// Índice inverso de patronos, fundadores y directivos (personas.py); mantener los dos en paralelo
+export const PERSONAS_COLLECTION = 'personas';
+
+// Array de la fundación -> rol de sus personas
+const ROLES: Record<string, string> = { patronos: 'patrono', fundadores: 'fundador', directivos: 'directivo' };
+
+const PERSONA_PROJECTION = { nombre: 1, patronos: 1, fundadores: 1, directivos: 1 };
+
+// Palabras del nombre normalizadas y ordenadas: 'PÉREZ GARCÍA, Juan' y 'Juan Pérez García' son la misma persona
+export function personaKey(name: unknown): string {
+  return typeof name === 'string' ? words(name).sort().join(' ') : '';
+}
+
+export function personaEntries(doc: Document): Document[] {
+  const entries: Document[] = [];
+  for (const [field, rol] of Object.entries(ROLES)) {
+    for (const person of doc[field] ?? []) {
+      if (!person || typeof person !== 'object') {
+        continue;
+      }
+      const key = personaKey(person.nombre);
+      if (!key) {
+        continue;
+      }
+      entries.push({
+        key,
+        nombre: person.nombre,
+        rol,
+        cargo: person.cargo ?? null,
+        fundacion: doc._id,
+        fundacionNombre: doc.nombre ?? null
+      });
+    }
+  }
+  return entries;
+}
+
+// Reconstruye 'personas' desde 'fundaciones' en una colección auxiliar que se renombra encima
+export async function rebuildPersonas(db: Db) {
+  const scratch = db.collection(PERSONAS_COLLECTION + '_build');
+  if (await db.listCollections({ name: scratch.collectionName }).hasNext()) {
+    await scratch.drop();
+  }
+
+  let entries: Document[] = [];
+  let total = 0;
+  const cursor = db.collection('fundaciones').find({}, { projection: PERSONA_PROJECTION });
+  for await (const doc of cursor) {
+    entries.push(...personaEntries(doc));
+    if (entries.length >= 5000) {
+      total += (await insertSized(scratch, entries)).insertedCount;
+      entries = [];
+    }
+  }
+  if (entries.length > 0) {
+    total += (await insertSized(scratch, entries)).insertedCount;
+  }
+
+  if (total > 0) {
+    await scratch.createIndexes([{ key: { key: 1, rol: 1 } }, { key: { fundacion: 1 } }]);
+    await scratch.rename(PERSONAS_COLLECTION, { dropTarget: true });
+  } else if (await db.listCollections({ name: PERSONAS_COLLECTION }).hasNext()) {
+    await db.collection(PERSONAS_COLLECTION).drop();
+  }
+  return total;
+}
@@ -0,0 +1,100 @@
+import type { Document } from 'mongodb';
+
+// Claves de búsqueda normalizadas que calculan los scripts (search_keys.py); mantener los dos en paralelo
+export const SEARCH_FIELDS = ['nombreNorm', 'nifNorm', 'nombreTokens', 'finesTokens'] as const;
+
+// Las claves no se devuelven en los listados ni en las exportaciones
+export const SEARCH_PROJECTION: Record<string, 0> = Object.fromEntries(
+  SEARCH_FIELDS.map((field) => [field, 0 as const])
+);
+
+// Prefijo más corto guardado de las palabras del nombre; las más cortas se guardan enteras
+const MIN_PREFIX = 3;
+
+// Igual que STOPWORDS en search_keys.py
+const STOPWORDS = new Set([
+  'a', 'al', 'con', 'de', 'del', 'e', 'el', 'en', 'la', 'las', 'lo', 'los', 'o', 'para',
+  'por', 'que', 'se', 'su', 'sus', 'u', 'un', 'una', 'y'
+]);
+
+const WORD = /[\p{L}\p{N}]+/gu;
+
+// NFC, minúsculas (ß como ss, igual que casefold()) y sin acentos (NFKD sin marcas combinantes)
+export function foldText(text: string): string {
+  return text.normalize('NFC').toLowerCase().replace(/ß/g, 'ss')
+    .normalize('NFKD').replace(/\p{M}/gu, '');
+}
+
+export function words(text: string): string[] {
+  return foldText(text).match(WORD) ?? [];
+}
+
+function unique(items: string[]): string[] {
+  return Array.from(new Set(items));
+}
+
+function prefixes(tokens: string[]): string[] {
+  return unique(tokens.flatMap((token) => {
+    const entries: string[] = [];
+    for (let end = Math.min(MIN_PREFIX, token.length); end <= token.length; end++) {
+      entries.push(token.slice(0, end));
+    }
+    return entries;
+  }));
+}
+
+export function normalizeNif(value: string): string | null {
+  return foldText(value).toUpperCase().replace(/[^0-9A-Z]+/g, '') || null;
+}
+
+function asText(value: unknown): string | null {
+  if (value === null || value === undefined || (typeof value === 'number' && Number.isNaN(value))) {
+    return null;
+  }
+  return typeof value === 'string' ? value : String(value);
+}
+
+// Añade las claves a un documento (JSON de /api/restore), como add_search_keys() en los scripts
+export function addSearchKeys(doc: Document): Document {
+  const nombre = asText(doc.nombre);
+  const nif = asText(doc.nif);
+  const fines = asText(doc.fines);
+  const nombreTokens = nombre === null ? [] : words(nombre);
+  doc.nombreNorm = nombreTokens.join(' ') || null;
+  doc.nifNorm = nif === null ? null : normalizeNif(nif);
+  doc.nombreTokens = prefixes(nombreTokens);
+  doc.finesTokens = fines === null ? [] : unique(words(fines).filter((token) => !STOPWORDS.has(token)));
+  return doc;
+}
+
+function escapeRegex(text: string): string {
+  return text.replace(/[.*+?^${}()|[\]\\]/g, '\\$&');
+}
+
+// Filtro de búsqueda servido por índices: prefijo anclado de nombreNorm y nifNorm, y
+// palabras exactas en los arrays de tokens, la última como prefijo (mientras se escribe):
+// nombreTokens guarda los prefijos, en finesTokens es un $regex anclado.
+// Una búsqueda sin letras ni dígitos no encuentra nada
+export function searchFilter(search: string): Document {
+  const tokens = words(search);
+  const nif = normalizeNif(search);
+  const branches: Document[] = [];
+
+  if (tokens.length > 0) {
+    branches.push({ nombreNorm: { $regex: '^' + escapeRegex(tokens.join(' ')) } });
+    branches.push({ nombreTokens: { $all: tokens } });
+    const last = tokens[tokens.length - 1];
+    const complete = tokens.slice(0, -1).filter((token) => !STOPWORDS.has(token));
+    branches.push({
+      finesTokens: complete.length > 0
+        ? { $all: complete, $regex: '^' + escapeRegex(last) }
+        : { $regex: '^' + escapeRegex(last) }
+    });
+  }
+  // Un NIF lleva dígitos: sin ellos no vale la pena buscar en nifNorm
+  if (nif && /\d/.test(nif)) {
+    branches.push({ nifNorm: { $regex: '^' + escapeRegex(nif) } });
+  }
+
+  return branches.length > 0 ? { $or: branches } : { _id: { $exists: false } };
+}
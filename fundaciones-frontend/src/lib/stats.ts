@@ -0,0 +1,174 @@
+import type { Db, Document } from 'mongodb';
+
+// Documento de estadísticas materializado (collection_stats.py)
+export const STATS_COLLECTION = 'fundaciones_stats';
+export const STATS_ID = 'fundaciones';
+// Igual que STATS_VERSION en collection_stats.py: otra versión se ignora
+export const STATS_VERSION = 1;
+
+interface StatsDocument extends Document {
+  _id: string;
+  version: number;
+}
+
+// Campos de la respuesta de /api/fundaciones/stats
+const RESPONSE_FIELDS = [
+  'total', 'byEstado', 'byProvincia', 'byActividad', 'byFuncion', 'yearlyTrends', 'patronosStats',
+  'fundadoresStats', 'activeFundacionesWithContact', 'activitiesDistribution', 'avgPatronosPerFoundation'
+];
+
+const RESPONSE_PROJECTION = Object.fromEntries([['_id', 0], ...RESPONSE_FIELDS.map(field => [field, 1])]);
+
+// Lectura por _id del documento guardado, o null si falta o es de otra versión
+export async function readStats(db: Db) {
+  return db.collection<StatsDocument>(STATS_COLLECTION).findOne(
+    { _id: STATS_ID, version: STATS_VERSION },
+    { projection: RESPONSE_PROJECTION }
+  );
+}
+
+// Guarda unas estadísticas calculadas en vivo, salvo que otro proceso ya haya escrito unas
+export async function storeStats(db: Db, stats: Document) {
+  await db.collection<StatsDocument>(STATS_COLLECTION).updateOne(
+    { _id: STATS_ID },
+    { $setOnInsert: { ...stats, version: STATS_VERSION, source: 'api', computedAt: new Date(), generation: 1 } },
+    { upsert: true }
+  );
+}
+
+// Tras escribir en 'fundaciones' las estadísticas guardadas dejan de valer
+export async function invalidateStats(db: Db) {
+  await db.collection<StatsDocument>(STATS_COLLECTION).deleteOne({ _id: STATS_ID });
+}
+
+// Las agregaciones originales del endpoint, sobre toda la colección
+export async function aggregateStats(db: Db) {
+  const [
+    totalFundaciones,
+    estadoStats,
+    provinciaStats,
+    actividadStats,
+    funcionStats,
+    patronosStats,
+    fundadoresStats,
+    activeFundaciones,
+    activitiesPerFoundation,
+    avgPatronosPerFoundation
+  ] = await Promise.all([
+    // Total count
+    db.collection('fundaciones').countDocuments(),
+
+    // By estado
+    db.collection('fundaciones').aggregate([
+      { $group: { _id: '$estado', count: { $sum: 1 } } },
+      { $sort: { count: -1 } }
+    ]).toArray(),
+
+    // By provincia
+    db.collection('fundaciones').aggregate([
+      { $match: { 'direccionEstatutaria.provincia': { $exists: true, $ne: null } } },
+      { $group: { _id: '$direccionEstatutaria.provincia', count: { $sum: 1 } } },
+      { $sort: { count: -1 } },
+      { $limit: 10 }
+    ]).toArray(),
+
+    // By actividad
+    db.collection('fundaciones').aggregate([
+      { $unwind: '$actividades' },
+      { $match: { 'actividades.clasificacion1': { $exists: true, $ne: null } } },
+      { $group: { _id: '$actividades.clasificacion1', count: { $sum: 1 } } },
+      { $sort: { count: -1 } },
+      { $limit: 10 }
+    ]).toArray(),
+
+    // By funcion
+    db.collection('fundaciones').aggregate([
+      { $unwind: '$actividades' },
+      { $match: { 'actividades.funcion1': { $exists: true, $ne: null } } },
+      { $group: { _id: '$actividades.funcion1', count: { $sum: 1 } } },
+      { $sort: { count: -1 } }
+    ]).toArray(),
+
+    // Patronos statistics
+    db.collection('fundaciones').aggregate([
+      { $match: { patronos: { $exists: true, $ne: [] } } },
+      { $project: { patronosCount: { $size: '$patronos' } } },
+      { $group: {
+        _id: null,
+        totalPatronos: { $sum: '$patronosCount' },
+        avgPatronos: { $avg: '$patronosCount' },
+        maxPatronos: { $max: '$patronosCount' },
+        minPatronos: { $min: '$patronosCount' }
+      }}
+    ]).toArray(),
+
+    // Fundadores count
+    db.collection('fundaciones').aggregate([
+      { $match: { fundadores: { $exists: true, $ne: [] } } },
+      { $project: { fundadoresCount: { $size: '$fundadores' } } },
+      { $group: {
+        _id: null,
+        totalFundadores: { $sum: '$fundadoresCount' },
+        avgFundadores: { $avg: '$fundadoresCount' }
+      }}
+    ]).toArray(),
+
+    // Active foundations with contact info
+    db.collection('fundaciones').countDocuments({
+      estado: 'Activa',
+      $or: [
+        { 'direccionEstatutaria.email': { $exists: true, $nin: [null, ''] } },
+        { 'direccionEstatutaria.web': { $exists: true, $nin: [null, ''] } },
+        { 'direccionEstatutaria.telefono': { $exists: true, $nin: [null, ''] } }
+      ]
+    }),
+
+    // Activities distribution
+    db.collection('fundaciones').aggregate([
+      { $project: { actividadesCount: { $size: '$actividades' } } },
+      { $group: {
+        _id: '$actividadesCount',
+        count: { $sum: 1 }
+      }},
+      { $sort: { _id: 1 } }
+    ]).toArray(),
+
+    // Average patronos per foundation
+    db.collection('fundaciones').aggregate([
+      { $match: { patronos: { $exists: true, $ne: [] } } },
+      { $group: {
+        _id: null,
+        avgPatronos: { $avg: { $size: '$patronos' } }
+      }}
+    ]).toArray()
+  ]);
+
+  // Get yearly trends: año de constitución ya extraído en la carga (anioConstitucion, con índice)
+  const yearlyTrends = await db.collection('fundaciones').aggregate([
+    { $match: { anioConstitucion: { $gte: 1990 } } },
+    {
+      $group: {
+        _id: '$anioConstitucion',
+        count: { $sum: 1 }
+      }
+    },
+    { $sort: { _id: 1 } }
+  ]).toArray();
+
+  return {
+    total: totalFundaciones,
+    byEstado: estadoStats,
+    byProvincia: provinciaStats,
+    byActividad: actividadStats,
+    byFuncion: funcionStats,
+    yearlyTrends: yearlyTrends.map(item => ({
+      year: item._id,
+      count: item.count
+    })),
+    patronosStats: patronosStats[0] || { totalPatronos: 0, avgPatronos: 0, maxPatronos: 0, minPatronos: 0 },
+    fundadoresStats: fundadoresStats[0] || { totalFundadores: 0, avgFundadores: 0 },
+    activeFundacionesWithContact: activeFundaciones,
+    activitiesDistribution: activitiesPerFoundation,
+    avgPatronosPerFoundation: avgPatronosPerFoundation[0]?.avgPatronos || 0
+  };
+}
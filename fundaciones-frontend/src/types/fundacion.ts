@@ -28,10 +28,15 @@ export interface Fundacion {
   _id: number;
   nombre: string;
   numRegistro: string;
+  // Fechas BSON, serializadas en JSON como texto ISO
   fechaConstitucion?: string;
+  anioConstitucion?: number;
   fechaInscripcion?: string;
+  anioInscripcion?: number;
   nif?: string;
   fechaExtincion?: string;
+  // Texto de las fechas que no se pudieron interpretar
+  fechasOriginales?: Record<string, string>;
   estado: string;
   fines?: string;
   direccionEstatutaria?: Direccion;
@@ -1,11 +1,18 @@
 import pandas as pd
 import json
+import argparse
 from datetime import datetime
 
+from excel_stream import ExcelStream, DEFAULT_CHUNK_SIZE, peak_rss_mb
+from sheet_cache import read_sheet
+
+# Distinct values kept per column by the streamed analysis; past this the count is reported as ">N"
+MAX_UNIQUES = 10000
+
 def analyze_excel_file(file_path):
     """Analyze the Excel file structure and content"""
     try:
-        df = pd.read_excel(file_path)
+        df = read_sheet(file_path)
         
         print("=== EXCEL FILE ANALYSIS ===")
         print(f"\nFile: {file_path}")
@@ -51,10 +58,85 @@ def analyze_excel_file(file_path):
             }, f, ensure_ascii=False, indent=2)
         
         print("\n✅ Analysis complete! Results saved to excel_analysis.json")
+        print(f"🧠 Peak memory: {peak_rss_mb():.0f} MB")
+        
+    except Exception as e:
+        print(f"❌ Error analyzing file: {e}")
+
+def analyze_excel_stream(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Same column analysis, reading the sheet in blocks of chunk_size rows"""
+    try:
+        stream = ExcelStream(file_path)
+        columns = list(stream.header)
+        non_null = dict.fromkeys(columns, 0)
+        uniques = {col: set() for col in columns}
+        samples = {col: [] for col in columns}
+        dtypes = {}
+        total_rows = 0
+        
+        for chunk in stream.chunks(chunk_size):
+            total_rows += len(chunk)
+            for col in columns:
+                values = chunk[col].dropna()
+                non_null[col] += len(values)
+                seen = uniques[col]
+                if len(seen) <= MAX_UNIQUES:
+                    seen.update(values.tolist())
+                    if len(seen) > MAX_UNIQUES:
+                        # Stop tracking: one more distinct value is all the report needs
+                        uniques[col] = set(list(seen)[:MAX_UNIQUES + 1])
+                if len(samples[col]) < 5:
+                    samples[col].extend(values.head(5 - len(samples[col])).tolist())
+                if len(values):
+                    # A column is numeric only if every block was
+                    kind = str(chunk[col].dtype)
+                    dtypes[col] = kind if dtypes.get(col, kind) == kind else 'object'
+            print(f"📖 {total_rows} rows read...")
+        stream.close()
+        
+        print("=== EXCEL FILE ANALYSIS ===")
+        print(f"\nFile: {file_path}")
+        print(f"Total rows: {total_rows}")
+        print(f"Total columns: {len(columns)}")
+        
+        print("\n=== COLUMNS ===")
+        column_info = {}
+        for i, col in enumerate(columns):
+            dtype = dtypes.get(col, 'float64')
+            print(f"{i+1}. {col} - Type: {dtype}, Non-null: {non_null[col]}/{total_rows}")
+            column_info[col] = {
+                'dtype': dtype,
+                'non_null_count': non_null[col],
+                'null_count': total_rows - non_null[col],
+                'unique_values': (len(uniques[col]) if len(uniques[col]) <= MAX_UNIQUES
+                                  else f'>{MAX_UNIQUES}'),
+                'sample_values': samples[col]
+            }
+        
+        with open('migration-scripts/excel_analysis.json', 'w', encoding='utf-8') as f:
+            json.dump({
+                'file_name': file_path.split('/')[-1],
+                'total_rows': total_rows,
+                'total_columns': len(columns),
+                'columns': columns,
+                'column_info': column_info,
+                'analysis_date': datetime.now().isoformat()
+            }, f, ensure_ascii=False, indent=2, default=str)
+        
+        print("\n✅ Analysis complete! Results saved to excel_analysis.json")
+        print(f"🧠 Peak memory: {peak_rss_mb():.0f} MB")
         
     except Exception as e:
         print(f"❌ Error analyzing file: {e}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Analyze the structure of the registry Excel file')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='Read the sheet in blocks of N rows (bounded memory)')
+    args = parser.parse_args()
+
     file_path = "/Users/paulo/Documents/Proyectos/Trabajo/Captaru/Datos Subvenciones/BBDD de fundaciones España actualizada 040724.xls"
-    analyze_excel_file(file_path)
\ No newline at end of file
+    if args.chunk_size:
+        analyze_excel_stream(file_path, args.chunk_size)
+    else:
+        analyze_excel_file(file_path)
\ No newline at end of file
@@ -0,0 +1,72 @@
+"""Size-aware, self-tuning insert batches
+
+A fixed number of documents per insert_many is a poor batch size for the
+registry: a foundation with 31 patronos and a long 'fines' weighs many times
+more than one with a name and an address. AdaptiveBatcher closes a batch on
+its encoded BSON size instead, and after each write moves that byte budget
+towards what the server writes in target_latency seconds. The budget never
+goes above MAX_BATCH_BYTES, well under the 48MB wire message limit.
+
+Documents are encoded once: the batch holds the RawBSONDocument of the
+bytes that were measured, and insert_many sends those bytes as they are.
+"""
+import os
+import threading
+
+import bson
+from bson.raw_bson import RawBSONDocument
+
+# Server limits: 48,000,000 bytes per message, 100,000 writes per batch
+MAX_MESSAGE_BYTES = 48_000_000
+MAX_WRITE_BATCH = 100_000
+
+MAX_BATCH_BYTES = min(int(os.getenv('INSERT_MAX_BATCH_MB', '16')) * 1024 * 1024, MAX_MESSAGE_BYTES // 2)
+INITIAL_BATCH_BYTES = 1024 * 1024
+MIN_BATCH_BYTES = 64 * 1024
+TARGET_LATENCY = float(os.getenv('INSERT_TARGET_LATENCY', '0.5'))
+
+
+class AdaptiveBatcher:
+    """Group documents into batches of about batch_bytes encoded bytes
+
+    add() returns True when the pending batch is full; take() hands it over as
+    (documents, bytes). record() is called with the bytes and seconds of each
+    completed write (possibly from writer threads) to retune batch_bytes.
+    """
+
+    def __init__(self, initial_bytes=INITIAL_BATCH_BYTES, max_bytes=MAX_BATCH_BYTES, target_latency=TARGET_LATENCY):
+        self.max_bytes = max_bytes
+        self.batch_bytes = min(initial_bytes, max_bytes)
+        self.target_latency = target_latency
+        self.documents = []
+        self.pending_bytes = 0
+        self.largest = 0
+        self.writes = 0
+        self.lock = threading.Lock()
+
+    def add(self, doc):
+        encoded = bson.encode(doc)
+        size = len(encoded)
+        self.largest = max(self.largest, size)
+        self.documents.append(RawBSONDocument(encoded))
+        self.pending_bytes += size
+        return self.pending_bytes >= self.batch_bytes or len(self.documents) >= MAX_WRITE_BATCH
+
+    def take(self):
+        batch = (self.documents, self.pending_bytes)
+        self.documents, self.pending_bytes = [], 0
+        return batch
+
+    def record(self, nbytes, seconds):
+        """Move the budget halfway towards what fits in target_latency at the measured rate"""
+        if nbytes <= 0 or seconds <= 0:
+            return
+        wanted = nbytes / seconds * self.target_latency
+        with self.lock:
+            self.writes += 1
+            budget = (self.batch_bytes + wanted) / 2
+            self.batch_bytes = int(min(self.max_bytes, max(MIN_BATCH_BYTES, budget)))
+
+    def summary(self):
+        return (f"batch budget {self.batch_bytes / (1024 * 1024):.1f} MB after {self.writes} writes, "
+                f"largest document {self.largest / 1024:.0f} KB")
@@ -0,0 +1,92 @@
+"""Benchmark: row-wise (iterrows) vs column-wise document building"""
+import argparse
+import importlib.util
+import os
+import sys
+import time
+from datetime import datetime
+
+import bson
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+
+from columnar_builder import build_registry_documents, build_production_documents  # noqa: E402
+from synthetic_registry import registry_frame, production_frame  # noqa: E402
+
+FIXED_NOW = datetime(2024, 7, 4)
+
+
+def load_script(filename):
+    """Import one of the hyphen-named migration scripts as a module"""
+    name = filename.replace('-', '_').rsplit('.', 1)[0]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(SCRIPTS_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def encode(doc):
+    """BSON bytes of a document with the per-row timestamp pinned"""
+    if 'metadata' in doc:
+        doc['metadata']['fechaActualizacion'] = FIXED_NOW
+    return bson.encode(doc)
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<12} {elapsed:8.3f}s")
+    return result, elapsed
+
+
+def bench_registry(rows):
+    fixed = load_script('migrate-to-mongodb-fixed.py')
+    df = registry_frame(rows)
+    print(f"\n📊 Registry layout ({rows} rows, {len(df.columns)} columns)")
+
+    def row_wise():
+        return [fixed.restructure_foundation_data(row) for _, row in df.iterrows()]
+
+    def column_wise():
+        errors = []
+        return [doc for _, doc in build_registry_documents(df, fixed.fix_encoding, errors, fixed.FUENTE_DATOS)]
+
+    expected, t_row = timed('iterrows', row_wise)
+    actual, t_col = timed('columnar', column_wise)
+    return compare(expected, actual, t_row, t_col)
+
+
+def bench_production(rows):
+    production = load_script('restore-from-excel-production.py')
+    df = production_frame(rows)
+    print(f"\n📊 Production layout ({rows} rows, {len(df.columns)} columns)")
+
+    def row_wise():
+        return [production.convert_to_mongodb_document(row) for _, row in df.iterrows()]
+
+    def column_wise():
+        return [doc for _, doc in build_production_documents(df, production.clean_text,
+                                                               production.normalize_activity_name)]
+
+    expected, t_row = timed('iterrows', row_wise)
+    actual, t_col = timed('columnar', column_wise)
+    return compare(expected, actual, t_row, t_col)
+
+
+def compare(expected, actual, t_row, t_col):
+    identical = len(expected) == len(actual) and all(
+        encode(a) == encode(b) for a, b in zip(expected, actual))
+    print(f"  speedup      {t_row / t_col:8.1f}x")
+    print(f"  {'✅ byte-identical documents' if identical else '❌ documents differ'}")
+    return identical
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=5000)
+    args = parser.parse_args()
+
+    ok = bench_registry(args.rows) & bench_production(args.rows)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,85 @@
+"""Micro-benchmark: sequential str.replace cleaners vs the compiled text_repair profiles"""
+import argparse
+import html
+import os
+import random
+import re
+import sys
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+
+import text_repair  # noqa: E402
+from text_repair import RULES, get_repairer  # noqa: E402
+
+WORDS = ['FUNDACIÃ“N', 'Fundación', 'cultura', 'investigaciÃ³n', 'EducaciÃ³n', 'social', 'arte',
+         'mÃºsica', 'sanidad', 'calle', '1Âº', '2Âª', 'niÃ±os', '&#xD;', 'Musco', 'ele', 'MEDITERRÁÁNEO',
+         'ESPAÁÑOLA', 'Â¡', 'â€œ', 'de', 'la', 'y', 'para', 'el', 'desarrollo']
+SHORT_VALUES = ['Madrid', 'MÃ¡laga', 'A CoruÃ±a', 'Inscrita', 'Presidente', 'Secretario', 'Vocal',
+                'LeÃ³n', 'CÃ¡diz', 'Extinguida']
+
+
+def legacy(group_names, unescape_html=False, collapse=False, strip=False):
+    """Sequential str.replace reference for a set of rule groups (one pass per rule)"""
+    pairs = [(rule.old, rule.new) for rule in RULES if rule.group in group_names]
+
+    def clean(text):
+        if unescape_html:
+            text = html.unescape(text)
+        for old, new in pairs:
+            text = text.replace(old, new)
+        if collapse:
+            text = re.sub(r'\s+', ' ', text).strip()
+        elif strip:
+            text = text.strip()
+        return text
+    return clean
+
+
+def corpus(n, seed=0):
+    rng = random.Random(seed)
+    strings = []
+    for _ in range(n):
+        kind = rng.random()
+        if kind < 0.5:
+            strings.append(rng.choice(SHORT_VALUES))
+        elif kind < 0.8:
+            strings.append(' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))))
+        else:
+            strings.append(' '.join(rng.choice(WORDS) for _ in range(rng.randint(40, 120))))
+    return strings
+
+
+def per_string(fn, strings, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for s in strings:
+            fn(s)
+        best = min(best, time.perf_counter() - start)
+    return best / len(strings) * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--strings', type=int, default=20000)
+    args = parser.parse_args()
+
+    strings = corpus(args.strings)
+    print(f"📊 {len(strings)} strings, {len(RULES)} rules\n")
+    print(f"{'profile':<34} {'replace µs':>10} {'engine µs':>10} {'memo µs':>10} {'same':>7}")
+
+    for name, profile in text_repair.PROFILES.items():
+        if profile.drop_disallowed:
+            continue
+        reference = legacy(profile.groups, profile.unescape_html, profile.collapse_whitespace, profile.strip)
+        repairer = get_repairer(name)
+
+        t_legacy = per_string(reference, strings)
+        text_repair.MEMO_MAX_LENGTH = -1
+        t_engine = per_string(repairer, strings)
+        text_repair.MEMO_MAX_LENGTH = 120
+        t_memo = per_string(repairer, strings)
+        same = sum(reference(s) == repairer(s) for s in strings) / len(strings)
+        print(f"{name:<34} {t_legacy:10.2f} {t_engine:10.2f} {t_memo:10.2f} {same:7.1%}")
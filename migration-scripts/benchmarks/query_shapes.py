@@ -0,0 +1,245 @@
+"""The reads the Next.js API routes send, as pymongo calls
+
+Same filters, pipelines, sorts and pagination as fundaciones-frontend/src/app/
+api/fundaciones/**/route.ts, so their cost can be measured against a loaded
+collection. Keep these in step with the routes when they change.
+"""
+import os
+import re
+import sys
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+
+from collection_stats import STATS_COLLECTION, STATS_ID, STATS_VERSION  # noqa: E402
+from facet_cube import FACETS_COLLECTION, FACETS_ID, FACETS_VERSION  # noqa: E402
+from search_keys import SEARCH_FIELDS, STOPWORDS, normalize_nif, words  # noqa: E402
+
+# Representative parameter values; the synthetic workbooks contain all of them
+SEARCH = 'cultura'
+# A search being typed: the last word is a prefix
+SEARCH_PREFIX = 'fundacion cult'
+PROVINCIA = 'Madrid'
+ESTADO = 'Inscrita'
+ACTIVIDAD = 'CULTURA'
+FUNCION = 'social'
+
+
+def _regex(value):
+    return {'$regex': value, '$options': 'i'}
+
+
+def search_filter(search):
+    """searchFilter() of src/lib/search.ts: anchored and equality lookups on the search keys"""
+    tokens = words(search)
+    nif = normalize_nif(search)
+    branches = []
+    if tokens:
+        last = {'$regex': '^' + re.escape(tokens[-1])}
+        complete = [token for token in tokens[:-1] if token not in STOPWORDS]
+        branches.append({'nombreNorm': {'$regex': '^' + re.escape(' '.join(tokens))}})
+        branches.append({'nombreTokens': {'$all': tokens}})
+        branches.append({'finesTokens': {'$all': complete, **last} if complete else last})
+    if nif and any(c.isdigit() for c in nif):
+        branches.append({'nifNorm': {'$regex': '^' + re.escape(nif)}})
+    return {'$or': branches} if branches else {'_id': {'$exists': False}}
+
+
+def list_query(search='', provincia='', estado='', actividad='', funcion='', keyed=True):
+    """GET /api/fundaciones filter; keyed=False for the former unanchored $regex search"""
+    query = {}
+    if search and keyed:
+        query.update(search_filter(search))
+    elif search:
+        query['$or'] = [{'nombre': _regex(search)}, {'nif': _regex(search)}, {'fines': _regex(search)}]
+    if provincia:
+        query['direccionEstatutaria.provincia'] = provincia
+    if estado:
+        query['estado'] = estado
+    if actividad:
+        query['actividades.clasificacion1'] = _regex(actividad)
+    if funcion:
+        query['actividades.funcion1'] = _regex(funcion)
+    return query
+
+
+def facet_count(collection, provincia='', estado='', actividad='', funcion=''):
+    """The listing total summed from the facet cube (src/lib/facets.ts), or None without one"""
+    stored = collection.database[STATS_COLLECTION].find_one({'_id': FACETS_ID, 'version': FACETS_VERSION},
+                                                            {'total': 1})
+    if not stored:
+        return None
+    match = {}
+    if provincia:
+        match['provincia'] = provincia
+    if estado:
+        match['estado'] = estado
+    if actividad:
+        match['actividades'] = _regex(actividad)
+    if funcion:
+        match['funciones'] = _regex(funcion)
+    if not match:
+        return stored['total']
+    result = list(collection.database[FACETS_COLLECTION].aggregate([
+        {'$match': match}, {'$group': {'_id': None, 'total': {'$sum': '$count'}}}]))
+    return result[0]['total'] if result else 0
+
+
+def list_page(collection, page=1, limit=20, sort_by='name', sort_order='asc', facets=False, keyed=True,
+              **filters):
+    """GET /api/fundaciones: countDocuments (or the facet cube) + one sorted page"""
+    query = list_query(keyed=keyed, **filters)
+    direction = 1 if sort_order == 'asc' else -1
+    sort = [('fechaConstitucion' if sort_by == 'date' else 'nombre', direction)]
+    total = None
+    if facets and not filters.get('search'):
+        total = facet_count(collection, **filters)
+    if total is None:
+        total = collection.count_documents(query)
+    data = list(collection.find(query, dict.fromkeys(SEARCH_FIELDS, 0)).sort(sort).skip((page - 1) * limit).limit(limit))
+    return total, data
+
+
+def get_by_id(collection, _id=1):
+    """POST /api/fundaciones"""
+    return collection.find_one({'_id': _id})
+
+
+def export(collection, fields=('nombre', 'nif', 'estado', 'direccionEstatutaria'), **filters):
+    """POST /api/fundaciones/export (the route has no funcion filter)"""
+    filters.pop('funcion', None)
+    projection = dict.fromkeys(fields, 1)
+    projection['_id'] = 1
+    return list(collection.find(list_query(**filters), projection))
+
+
+def _present(field):
+    return {field: {'$exists': True, '$ne': None}}
+
+
+def _non_empty(field):
+    return {field: {'$exists': True, '$nin': [None, '']}}
+
+
+STATS_PIPELINES = {
+    'estado': [
+        {'$group': {'_id': '$estado', 'count': {'$sum': 1}}},
+        {'$sort': {'count': -1}}
+    ],
+    'provincia': [
+        {'$match': _present('direccionEstatutaria.provincia')},
+        {'$group': {'_id': '$direccionEstatutaria.provincia', 'count': {'$sum': 1}}},
+        {'$sort': {'count': -1}},
+        {'$limit': 10}
+    ],
+    'actividad': [
+        {'$unwind': '$actividades'},
+        {'$match': _present('actividades.clasificacion1')},
+        {'$group': {'_id': '$actividades.clasificacion1', 'count': {'$sum': 1}}},
+        {'$sort': {'count': -1}},
+        {'$limit': 10}
+    ],
+    'funcion': [
+        {'$unwind': '$actividades'},
+        {'$match': _present('actividades.funcion1')},
+        {'$group': {'_id': '$actividades.funcion1', 'count': {'$sum': 1}}},
+        {'$sort': {'count': -1}}
+    ],
+    'patronos': [
+        {'$match': {'patronos': {'$exists': True, '$ne': []}}},
+        {'$project': {'patronosCount': {'$size': '$patronos'}}},
+        {'$group': {'_id': None, 'totalPatronos': {'$sum': '$patronosCount'},
+                    'avgPatronos': {'$avg': '$patronosCount'}, 'maxPatronos': {'$max': '$patronosCount'},
+                    'minPatronos': {'$min': '$patronosCount'}}}
+    ],
+    'fundadores': [
+        {'$match': {'fundadores': {'$exists': True, '$ne': []}}},
+        {'$project': {'fundadoresCount': {'$size': '$fundadores'}}},
+        {'$group': {'_id': None, 'totalFundadores': {'$sum': '$fundadoresCount'},
+                    'avgFundadores': {'$avg': '$fundadoresCount'}}}
+    ],
+    'actividades_distribution': [
+        {'$project': {'actividadesCount': {'$size': '$actividades'}}},
+        {'$group': {'_id': '$actividadesCount', 'count': {'$sum': 1}}},
+        {'$sort': {'_id': 1}}
+    ],
+    'avg_patronos': [
+        {'$match': {'patronos': {'$exists': True, '$ne': []}}},
+        {'$group': {'_id': None, 'avgPatronos': {'$avg': {'$size': '$patronos'}}}}
+    ],
+    'yearly_trends': [
+        {'$match': {'anioConstitucion': {'$gte': 1990}}},
+        {'$group': {'_id': '$anioConstitucion', 'count': {'$sum': 1}}},
+        {'$sort': {'_id': 1}}
+    ],
+}
+
+ACTIVE_WITH_CONTACT = {
+    'estado': 'Activa',
+    '$or': [{f'direccionEstatutaria.{field}': {'$exists': True, '$nin': [None, '']}}
+            for field in ('email', 'web', 'telefono')]
+}
+
+
+def stats(collection):
+    """GET /api/fundaciones/stats without a stats document: every count and pipeline of the fallback"""
+    results = {'total': collection.count_documents({}),
+               'active_with_contact': collection.count_documents(ACTIVE_WITH_CONTACT)}
+    for name, pipeline in STATS_PIPELINES.items():
+        results[name] = list(collection.aggregate(pipeline))
+    return results
+
+
+def stats_document(collection):
+    """GET /api/fundaciones/stats: one read of the document collection_stats.py stores"""
+    return collection.database[STATS_COLLECTION].find_one({'_id': STATS_ID, 'version': STATS_VERSION})
+
+
+def _facet(path, unwind=None):
+    pipeline = [{'$unwind': unwind}] if unwind else []
+    return pipeline + [
+        {'$match': _non_empty(path)},
+        {'$group': {'_id': f'${path}', 'count': {'$sum': 1}}},
+        {'$sort': {'_id': 1}}
+    ]
+
+
+FILTER_PIPELINES = {
+    'provincias': _facet('direccionEstatutaria.provincia'),
+    'estados': _facet('estado'),
+    'actividades': _facet('actividades.clasificacion1', '$actividades'),
+    'funciones': _facet('actividades.funcion1', '$actividades'),
+}
+
+
+def filters(collection):
+    """GET /api/fundaciones/filters"""
+    return {name: list(collection.aggregate(pipeline)) for name, pipeline in FILTER_PIPELINES.items()}
+
+
+def facet_filters(collection):
+    """GET /api/fundaciones/filters: one read of the lists facet_cube.py stores"""
+    return collection.database[STATS_COLLECTION].find_one({'_id': FACETS_ID, 'version': FACETS_VERSION},
+                                                          {'filters': 1})
+
+
+# name -> call, one entry per distinct request shape
+SHAPES = {
+    'list_default': lambda c: list_page(c),
+    'list_page_50': lambda c: list_page(c, page=50),
+    'list_sort_date_desc': lambda c: list_page(c, sort_by='date', sort_order='desc'),
+    'list_search': lambda c: list_page(c, search=SEARCH),
+    'list_search_regex': lambda c: list_page(c, search=SEARCH, keyed=False),
+    'list_search_prefix': lambda c: list_page(c, search=SEARCH_PREFIX),
+    'list_provincia_estado': lambda c: list_page(c, provincia=PROVINCIA, estado=ESTADO),
+    'list_actividad_funcion': lambda c: list_page(c, actividad=ACTIVIDAD, funcion=FUNCION),
+    'list_default_facets': lambda c: list_page(c, facets=True),
+    'list_provincia_estado_facets': lambda c: list_page(c, provincia=PROVINCIA, estado=ESTADO, facets=True),
+    'list_actividad_funcion_facets': lambda c: list_page(c, actividad=ACTIVIDAD, funcion=FUNCION, facets=True),
+    'get_by_id': lambda c: get_by_id(c),
+    'export_provincia': lambda c: export(c, provincia=PROVINCIA),
+    'stats': stats,
+    'stats_document': stats_document,
+    'filters': filters,
+    'facet_filters': facet_filters,
+}
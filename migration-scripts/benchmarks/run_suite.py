@@ -0,0 +1,254 @@
+"""Benchmark suite: document builders, text fixers, load, repair and API queries
+
+Everything runs on synthetic data (synthetic_registry.py), against mongomock
+by default (pip install mongomock) or a MongoDB server given with
+--mongodb-uri. Use a throwaway mongod: the load stage replaces
+fundaciones_espana.fundaciones.
+
+    python benchmarks/run_suite.py --rows 20000 --out results/$(git rev-parse --short HEAD).json
+    python benchmarks/run_suite.py --compare results/abc1234.json
+
+Results are JSON (one object per section, one entry per measurement) so
+two commits can be compared with --compare.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+
+import sheet_cache  # noqa: E402
+import text_repair  # noqa: E402
+from columnar_builder import build_registry_documents, build_production_documents  # noqa: E402
+from repair_pipeline import build_chain, run_repair  # noqa: E402
+from bench_ingest import load_script  # noqa: E402
+from synthetic_registry import registry_frame, production_frame, write_workbook  # noqa: E402
+from query_shapes import SHAPES  # noqa: E402
+
+SECTIONS = ['builders', 'fixers', 'pipeline', 'queries']
+
+# The number compared across runs for each kind of entry (lower is better)
+PRIMARY = ('per_row_us', 'per_string_us', 'median_ms', 'seconds')
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPTS_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def quiet(fn, *args, **kwargs):
+    """Call fn with its progress prints swallowed"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def bench_builders(rows, seed):
+    fixed = load_script('migrate-to-mongodb-fixed.py')
+    production = load_script('restore-from-excel-production.py')
+    registry_df = registry_frame(rows, seed=seed)
+    production_df = production_frame(rows, seed=seed)
+
+    cases = {
+        'registry.restructure_foundation_data': lambda: [fixed.restructure_foundation_data(row)
+                                                         for _, row in registry_df.iterrows()],
+        'registry.columnar': lambda: list(build_registry_documents(registry_df, fixed.fix_encoding, [],
+                                                                   fixed.FUENTE_DATOS)),
+        'production.convert_to_mongodb_document': lambda: [production.convert_to_mongodb_document(row)
+                                                           for _, row in production_df.iterrows()],
+        'production.columnar': lambda: list(build_production_documents(production_df, production.clean_text,
+                                                                       production.normalize_activity_name)),
+    }
+    results = {}
+    for name, fn in cases.items():
+        _, seconds = timed(fn)
+        results[name] = {'seconds': seconds, 'rows': rows, 'per_row_us': seconds / rows * 1e6}
+    return results
+
+
+def text_corpus(rows, seed):
+    """Every non-empty text cell of a synthetic production sheet"""
+    df = production_frame(rows, seed=seed)
+    strings = []
+    for column in df.columns:
+        if df[column].dtype == object:
+            strings.extend(value for value in df[column].dropna() if isinstance(value, str))
+    return strings
+
+
+def text_fixers():
+    """name -> one-string fixer: each migration script's cleaner and every repair profile"""
+    fixers = {
+        'migrate-to-mongodb-fixed.fix_encoding': load_script('migrate-to-mongodb-fixed.py').fix_encoding,
+        'migrate-clean-encoding.clean_text': load_script('migrate-clean-encoding.py').clean_text,
+        'restore-from-excel-production.clean_text': load_script('restore-from-excel-production.py').clean_text,
+        'normalize_activity_name': text_repair.normalize_activity_name,
+    }
+    for name in text_repair.PROFILES:
+        fixers[name] = (lambda profile: lambda text: text_repair.repair(text, profile))(name)
+    return fixers
+
+
+def bench_fixers(rows, seed):
+    strings = text_corpus(rows, seed)
+    results = {}
+    for name, fix in text_fixers().items():
+        # One pass: repeated values hit the profile memo as they do in a real run
+        _, seconds = timed(lambda: [fix(text) for text in strings])
+        results[name] = {'seconds': seconds, 'strings': len(strings),
+                         'per_string_us': seconds / len(strings) * 1e6}
+    return results
+
+
+def connect(mongodb_uri):
+    """(client, backend name): mongomock unless a server URI is given"""
+    if mongodb_uri:
+        from pymongo import MongoClient
+        return MongoClient(mongodb_uri), 'mongod'
+    import mongomock
+    return mongomock.MongoClient(), 'mongomock'
+
+
+def bench_pipeline(client, mongodb_uri, rows, seed, workdir):
+    """Excel -> MongoDB load (parse, build, insert, indexes), then one repair pass"""
+    production = load_script('restore-from-excel-production.py')
+    production.MongoClient = lambda uri: client
+    path = os.path.join(workdir, f'production-{rows}.xlsx')
+    quiet(write_workbook, path, 'production', rows, seed=seed)
+
+    # Parse the workbook every time: the cache would hide the slowest step
+    cache_dir, sheet_cache.CACHE_DIR = sheet_cache.CACHE_DIR, ''
+    try:
+        ok, load_seconds = timed(lambda: quiet(production.migrate_to_mongodb, path,
+                                               mongodb_uri or 'mongodb://localhost:27017'))
+    finally:
+        sheet_cache.CACHE_DIR = cache_dir
+    if not ok:
+        raise RuntimeError('The load stage failed; run restore-from-excel-production.py for details')
+
+    collection = client['fundaciones_espana'].fundaciones
+    documents = collection.estimated_document_count()
+    # mongomock runs $regex with Python's re, which rejects the PCRE \x{...} escapes of the triggers
+    prefilter = mongodb_uri is not None
+    repaired, repair_seconds = timed(lambda: quiet(run_repair, collection, build_chain(), prefilter=prefilter))
+    return {
+        'load': {'seconds': load_seconds, 'documents': documents},
+        'repair': {'seconds': repair_seconds, 'processed': repaired['processed'], 'updated': repaired['updated'],
+                   'prefilter': prefilter},
+    }
+
+
+def bench_queries(client, repeat):
+    collection = client['fundaciones_espana'].fundaciones
+    results = {}
+    for name, shape in SHAPES.items():
+        shape(collection)  # warm-up: first call pays for cold caches
+        samples = [timed(lambda: shape(collection))[1] * 1000 for _ in range(repeat)]
+        results[name] = {'median_ms': statistics.median(samples), 'min_ms': min(samples), 'repeat': repeat}
+    return results
+
+
+def primary(entry):
+    for key in PRIMARY:
+        if key in entry:
+            return key, entry[key]
+    return None, None
+
+
+def compare(previous, current):
+    """Print current vs previous for every entry both runs have"""
+    print(f"\n📊 {previous['meta'].get('commit')} -> {current['meta'].get('commit')}")
+    for section in SECTIONS:
+        for name, entry in current.get(section, {}).items():
+            before = previous.get(section, {}).get(name)
+            key, value = primary(entry)
+            if before is None or key not in before:
+                continue
+            change = (value / before[key] - 1) * 100 if before[key] else 0.0
+            flag = '🔺' if change > 10 else '🔻' if change < -10 else '  '
+            print(f"{flag} {section}.{name:<44} {before[key]:12.3f} -> {value:12.3f} {key} ({change:+.1f}%)")
+
+
+def run(rows, seed, repeat, mongodb_uri, sections):
+    results = {'meta': {
+        'commit': git_commit(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'rows': rows,
+        'seed': seed,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }}
+    if 'builders' in sections:
+        print("⏱️  Document builders...")
+        results['builders'] = bench_builders(rows, seed)
+    if 'fixers' in sections:
+        print("⏱️  Text fixers...")
+        results['fixers'] = bench_fixers(rows, seed)
+    if 'pipeline' in sections or 'queries' in sections:
+        client, results['meta']['backend'] = connect(mongodb_uri)
+        with tempfile.TemporaryDirectory() as workdir:
+            print(f"⏱️  Load and repair ({results['meta']['backend']})...")
+            results['pipeline'] = bench_pipeline(client, mongodb_uri, rows, seed, workdir)
+        if 'queries' in sections:
+            print(f"⏱️  API query shapes ({results['meta']['backend']})...")
+            results['queries'] = bench_queries(client, repeat)
+    return results
+
+
+def print_results(results):
+    for section in SECTIONS:
+        if section not in results:
+            continue
+        print(f"\n=== {section} ===")
+        for name, entry in results[section].items():
+            key, value = primary(entry)
+            print(f"  {name:<46} {value:12.3f} {key}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark builders, fixers, load/repair and API queries')
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5, help='Runs of each query shape')
+    parser.add_argument('--mongodb-uri', default=None,
+                        help='Throwaway MongoDB server to use instead of mongomock')
+    parser.add_argument('--only', default=','.join(SECTIONS),
+                        help=f"Comma-separated sections (default: {','.join(SECTIONS)})")
+    parser.add_argument('--out', default=None, help='Write the results to this JSON file')
+    parser.add_argument('--compare', default=None, help='Previous results JSON to compare against')
+    args = parser.parse_args()
+
+    sections = [section.strip() for section in args.only.split(',') if section.strip()]
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        parser.error(f"Unknown sections: {', '.join(sorted(unknown))}")
+
+    results = run(args.rows, args.seed, args.repeat, args.mongodb_uri, sections)
+    print_results(results)
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results saved to {args.out}")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(json.load(f), results)
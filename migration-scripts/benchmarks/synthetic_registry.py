@@ -0,0 +1,276 @@
+"""Synthetic registry workbooks for load and scale testing
+
+Writes .xlsx files with exactly the columns the two loaders read: the
+'@_idfundacion' registry export (migrate-to-mongodb-fixed.py) and the
+'Nº Hoja Registral' production export (restore-from-excel-production.py).
+Text is clean Spanish with a configurable share of the corruption the real
+file has: UTF-8 read as cp1252 ('Ã³', 'Âº') and stray '&#xD;' entities.
+Each foundation gets a number of patronos and fundadores drawn from a
+configurable range.
+
+    python benchmarks/synthetic_registry.py --layout registry --rows 100k
+    python benchmarks/synthetic_registry.py --all --out-dir /tmp/registry
+
+The files are .xlsx because .xls stops at 65,536 rows. Rows are generated
+and written in blocks, so 1M rows need no more memory than 10k.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+BLOCK_ROWS = 10_000
+
+# Slots each layout has for people (the loaders read exactly these)
+REGISTRY_SLOTS = {'patronos': 31, 'fundadores': 30}
+PRODUCTION_SLOTS = {'patronos': 22, 'fundadores': 15}
+
+DEFAULT_MOJIBAKE_RATE = 0.3
+DEFAULT_ENTITY_RATE = 0.05
+DEFAULT_PATRONOS = (1, 12)
+DEFAULT_FUNDADORES = (0, 3)
+
+PROVINCIAS = ['Madrid', 'Barcelona', 'Valencia', 'Sevilla', 'Málaga', 'A Coruña', 'León', 'Cádiz']
+ESTADOS = ['Inscrita', 'Extinguida', 'En liquidación']
+CARGOS = ['Presidente', 'Secretario', 'Vocal', 'Tesorero', 'Vicepresidente']
+CLASIFICACIONES = ['CULTURA', 'SANIDAD.', 'arte', 'Educación', 'Investigación']
+WORDS = ['FUNDACIÓN', 'Fundación', 'cultura', 'investigación', 'Educación', 'social', 'arte',
+         'música', 'sanidad', '1º', '2ª', 'deporte', 'niños', 'desarrollo', 'de', 'la', 'y', 'para']
+
+
+def mojibake(text):
+    """UTF-8 bytes read back as cp1252 ('ó' -> 'Ã³', 'º' -> 'Âº')
+
+    Bytes cp1252 leaves undefined come through as latin-1, as Excel shows them.
+    """
+    out = []
+    for ch in text:
+        raw = ch.encode('utf-8')
+        try:
+            out.append(raw.decode('cp1252'))
+        except UnicodeDecodeError:
+            out.append(raw.decode('latin-1'))
+    return ''.join(out)
+
+
+class TextMaker:
+    """Random text with a set share of mojibake and '&#xD;' corruption"""
+
+    def __init__(self, rng, mojibake_rate=DEFAULT_MOJIBAKE_RATE, entity_rate=DEFAULT_ENTITY_RATE):
+        self.rng = rng
+        self.mojibake_rate = mojibake_rate
+        self.entity_rate = entity_rate
+
+    def corrupt(self, text):
+        rng = self.rng
+        if rng.random() < self.mojibake_rate:
+            text = mojibake(text)
+        if rng.random() < self.entity_rate:
+            words = text.split(' ')
+            words.insert(rng.randint(0, len(words)), '&#xD;')
+            text = ' '.join(words)
+        return text
+
+    def words(self, n):
+        return self.corrupt(' '.join(self.rng.choice(WORDS) for _ in range(n)))
+
+    def choice(self, values):
+        return self.corrupt(self.rng.choice(values))
+
+
+def _sparse(rng, n, fill, make):
+    return [make() if rng.random() < fill else np.nan for _ in range(n)]
+
+
+def _counts(rng, n, bounds, slots):
+    """People per foundation, uniform in bounds and capped at the layout's slots"""
+    low, high = min(bounds[0], slots), min(bounds[1], slots)
+    return [rng.randint(low, high) for _ in range(n)]
+
+
+def _slot(counts, i, make):
+    return [make() if count > i else np.nan for count in counts]
+
+
+def registry_frame(n, seed=0, start=0, mojibake_rate=DEFAULT_MOJIBAKE_RATE, entity_rate=DEFAULT_ENTITY_RATE,
+                   patronos=DEFAULT_PATRONOS, fundadores=DEFAULT_FUNDADORES):
+    """Frame with the '@_idfundacion' registry columns, ids start + 1 .. start + n"""
+    rng = random.Random(seed)
+    text = TextMaker(rng, mojibake_rate, entity_rate)
+    data = {
+        '@_idfundacion': [float(start + i + 1) for i in range(n)],
+        'Nombre': [text.words(3) for _ in range(n)],
+        'NumRegistro': _sparse(rng, n, 0.9, lambda: f'{rng.randint(1, 999)}/{rng.randint(1, 99)}'),
+        'FechaConstitucion': pd.to_datetime(_sparse(rng, n, 0.9, lambda: f'{rng.randint(1950, 2023)}-01-15')),
+        'FechaInscripcion': pd.to_datetime(_sparse(rng, n, 0.9, lambda: f'{rng.randint(1950, 2023)}-03-01')),
+        'NIFFundacion': _sparse(rng, n, 0.8, lambda: f'G{rng.randint(10000000, 99999999)}'),
+        'FechaExtincion': _sparse(rng, n, 0.05, lambda: '01/01/2020'),
+        'EstadoFundacion': [text.choice(ESTADOS) for _ in range(n)],
+        'Fines': _sparse(rng, n, 0.9, lambda: text.words(40)),
+    }
+    prefix = 'DireccionEstatutaria/DireccionEstatutaria/'
+    data[prefix + 'Domicilio'] = _sparse(rng, n, 0.95, lambda: f'Calle {text.words(2)}, {rng.randint(1, 99)}')
+    data[prefix + 'CodigoPostal'] = _sparse(rng, n, 0.9, lambda: float(rng.randint(1000, 52999)))
+    data[prefix + 'Provincia'] = _sparse(rng, n, 0.95, lambda: text.choice(PROVINCIAS))
+    data[prefix + 'Telefono'] = _sparse(rng, n, 0.6, lambda: float(rng.randint(600000000, 999999999)))
+    data[prefix + 'Fax'] = _sparse(rng, n, 0.2, lambda: float(rng.randint(900000000, 999999999)))
+    data[prefix + 'CorreoElectronico'] = _sparse(rng, n, 0.5, lambda: 'info@example.org')
+    data[prefix + 'Web'] = _sparse(rng, n, 0.4, lambda: 'www.example.org')
+    prefix = 'DireccionNotificacion/DireccionNotificacion/'
+    data[prefix + 'Domicilio'] = _sparse(rng, n, 0.3, lambda: f'Plaza {text.words(2)}')
+    data[prefix + 'Localidad'] = _sparse(rng, n, 0.3, lambda: text.choice(PROVINCIAS))
+    data[prefix + 'CodigoPostal'] = _sparse(rng, n, 0.3, lambda: float(rng.randint(1000, 52999)))
+    data[prefix + 'Provincia'] = _sparse(rng, n, 0.3, lambda: text.choice(PROVINCIAS))
+
+    activity = ['NombreActividad', 'Clasificacion1', 'Clasificacion2', 'Clasificacion3',
+                'Clasificacion4', 'Funcion1', 'Funcion2']
+    for field in activity:
+        data[f'Actividades/Actividades/{field}'] = _sparse(rng, n, 0.5, lambda: text.words(2))
+    for i in range(4):
+        for field in activity:
+            data[f'Actividades/Actividades/{i}/{field}'] = _sparse(rng, n, 0.4 / (i + 1), lambda: text.words(2))
+
+    founders = _counts(rng, n, fundadores, REGISTRY_SLOTS['fundadores'])
+    for i in range(REGISTRY_SLOTS['fundadores']):
+        data[f'Fundadores/Fundador/{i}/NombreFundador'] = _slot(founders, i, lambda: text.words(3))
+    members = _counts(rng, n, patronos, REGISTRY_SLOTS['patronos'])
+    for i in range(REGISTRY_SLOTS['patronos']):
+        data[f'Patronos/Patron/{i}/NombrePatron'] = _slot(members, i, lambda: text.words(3))
+        data[f'Patronos/Patron/{i}/CargoPatron'] = _slot(members, i, lambda: text.choice(CARGOS))
+
+    for i in range(12):
+        data[f'Directivos/Directivo/{i}/NombreDirectivo'] = _sparse(rng, n, 0.3 / (i + 1), lambda: text.words(3))
+        data[f'Directivos/Directivo/{i}/CargoDirectivo'] = _sparse(rng, n, 0.3 / (i + 1),
+                                                                   lambda: text.choice(CARGOS))
+    data['Organos/Organo/NombreOrgano'] = _sparse(rng, n, 0.5, lambda: 'Patronato')
+    for i in range(3):
+        data[f'Organos/Organo/{i}/NombreOrgano'] = _sparse(rng, n, 0.2, lambda: text.corrupt('Comisión Delegada'))
+    return pd.DataFrame(data, index=range(start, start + n))
+
+
+def production_frame(n, seed=0, start=0, mojibake_rate=DEFAULT_MOJIBAKE_RATE, entity_rate=DEFAULT_ENTITY_RATE,
+                     patronos=DEFAULT_PATRONOS, fundadores=DEFAULT_FUNDADORES):
+    """Frame with the 'Nº Hoja Registral' production columns, ids start + 1 .. start + n"""
+    rng = random.Random(seed)
+    text = TextMaker(rng, mojibake_rate, entity_rate)
+    data = {
+        'Nº Hoja Registral': [start + i + 1 for i in range(n)],
+        'Denominación': [text.words(3) for _ in range(n)],
+        'Número de Registro': [rng.randint(1, 9999) for _ in range(n)],
+        'Estado': [text.choice(ESTADOS) for _ in range(n)],
+        'Fecha de Constitución': _sparse(rng, n, 0.9, lambda: f'15/01/{rng.randint(1950, 2023)}'),
+        'Fecha de Inscripción': _sparse(rng, n, 0.9, lambda: f'01/03/{rng.randint(1950, 2023)}'),
+        'Fines': _sparse(rng, n, 0.9, lambda: text.words(40)),
+        'N.I.F.': _sparse(rng, n, 0.8, lambda: f'G{rng.randint(10000000, 99999999)}'),
+        'Domicilio': _sparse(rng, n, 0.95, lambda: f'Calle {text.words(2)}'),
+        'Provincia': _sparse(rng, n, 0.95, lambda: text.choice(PROVINCIAS)),
+        'Código Postal': _sparse(rng, n, 0.9, lambda: float(rng.randint(1000, 52999))),
+        'Teléfono': _sparse(rng, n, 0.6, lambda: float(rng.randint(600000000, 999999999))),
+        'E-mail': _sparse(rng, n, 0.5, lambda: 'info@example.org'),
+        'Web': _sparse(rng, n, 0.4, lambda: 'www.example.org'),
+        'Domicilio (a efectos de notificación)': _sparse(rng, n, 0.3, lambda: text.corrupt('Plaza Mayor')),
+        'Provincia (a efectos de notificación)': _sparse(rng, n, 0.3, lambda: text.choice(PROVINCIAS)),
+        'Localidad (a efectos de notificación)': _sparse(rng, n, 0.3, lambda: text.choice(PROVINCIAS)),
+        'Código Postal (a efectos de notificación)': _sparse(rng, n, 0.3, lambda: float(rng.randint(1000, 52999))),
+    }
+    for i in range(1, 6):
+        fill = 0.8 / i
+        data[f'Actividad {i}'] = _sparse(rng, n, fill, lambda: text.words(2))
+        data[f'Clasificación {i}.1'] = _sparse(rng, n, fill, lambda: text.choice(CLASIFICACIONES))
+        data[f'Clasificación {i}.2'] = _sparse(rng, n, fill, lambda: text.words(1))
+        data[f'Función {i}.1'] = _sparse(rng, n, fill, lambda: text.words(1))
+
+    founders = _counts(rng, n, fundadores, PRODUCTION_SLOTS['fundadores'])
+    for i in range(1, PRODUCTION_SLOTS['fundadores'] + 1):
+        data[f'Fundador {i}'] = _slot(founders, i - 1, lambda: text.words(3))
+    members = _counts(rng, n, patronos, PRODUCTION_SLOTS['patronos'])
+    for i in range(1, PRODUCTION_SLOTS['patronos'] + 1):
+        data[f'Patrono {i}'] = _slot(members, i - 1, lambda: text.words(3))
+        data[f'Cargo Patrono {i}'] = _slot(members, i - 1, lambda: text.choice(CARGOS))
+
+    for i in range(1, 6):
+        data[f'Nombre y Apellidos {i}'] = _sparse(rng, n, 0.3 / i, lambda: text.words(3))
+        data[f'Cargo {i}'] = _sparse(rng, n, 0.3 / i, lambda: text.choice(CARGOS))
+        data[f'Órgano de Representación {i}'] = _sparse(rng, n, 0.4 / i, lambda: 'Patronato')
+    return pd.DataFrame(data, index=range(start, start + n))
+
+
+LAYOUTS = {'registry': registry_frame, 'production': production_frame}
+
+
+def _cell(value):
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    if value is pd.NaT:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value
+
+
+def write_workbook(path, layout, rows, seed=0, block_rows=BLOCK_ROWS, **options):
+    """Write rows synthetic foundations of a layout to an .xlsx file, block by block
+
+    options: mojibake_rate, entity_rate, patronos=(min, max), fundadores=(min, max)
+    """
+    import openpyxl
+
+    make_frame = LAYOUTS[layout]
+    book = openpyxl.Workbook(write_only=True)
+    sheet = book.create_sheet()
+    started = time.perf_counter()
+    for start in range(0, rows, block_rows):
+        # One seed per block: the same arguments always give the same file
+        frame = make_frame(min(block_rows, rows - start), seed=seed * 1_000_003 + start, start=start, **options)
+        if start == 0:
+            sheet.append(list(frame.columns))
+        for values in frame.itertuples(index=False, name=None):
+            sheet.append([_cell(value) for value in values])
+        print(f"📝 {layout}: {start + len(frame)}/{rows} rows ({time.perf_counter() - started:.0f}s)")
+    book.save(path)
+    print(f"✅ {path} ({os.path.getsize(path) / (1024 * 1024):.1f} MB)")
+    return path
+
+
+def _rows(value):
+    return SIZES[value.lower()] if value.lower() in SIZES else int(value)
+
+
+def _bounds(value):
+    low, _, high = value.partition('-')
+    return int(low), int(high or low)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Write synthetic registry workbooks for load and scale tests')
+    parser.add_argument('--layout', choices=sorted(LAYOUTS), default='registry')
+    parser.add_argument('--rows', type=_rows, default=SIZES['10k'], help='Row count, or one of 10k, 100k, 1m')
+    parser.add_argument('--all', action='store_true', help='Both layouts at 10k, 100k and 1m rows')
+    parser.add_argument('--out', help='Output file (default: <layout>-<rows>.xlsx in --out-dir)')
+    parser.add_argument('--out-dir', default='.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mojibake-rate', type=float, default=DEFAULT_MOJIBAKE_RATE,
+                        help="Share of text cells with UTF-8 read as cp1252 ('Ã³', 'Âº')")
+    parser.add_argument('--entity-rate', type=float, default=DEFAULT_ENTITY_RATE,
+                        help="Share of text cells with a stray '&#xD;'")
+    parser.add_argument('--patronos', type=_bounds, default=DEFAULT_PATRONOS, help='Patronos per foundation, e.g. 1-12')
+    parser.add_argument('--fundadores', type=_bounds, default=DEFAULT_FUNDADORES,
+                        help='Fundadores per foundation, e.g. 0-3')
+    args = parser.parse_args()
+
+    options = dict(mojibake_rate=args.mojibake_rate, entity_rate=args.entity_rate,
+                   patronos=args.patronos, fundadores=args.fundadores)
+    jobs = ([(layout, rows) for rows in SIZES.values() for layout in sorted(LAYOUTS)] if args.all
+            else [(args.layout, args.rows)])
+    if args.out and len(jobs) > 1:
+        sys.exit('--out names a single file; use --out-dir with --all')
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    for layout, rows in jobs:
+        path = args.out or os.path.join(args.out_dir, f'{layout}-{rows}.xlsx')
+        write_workbook(path, layout, rows, seed=args.seed, **options)
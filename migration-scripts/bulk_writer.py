@@ -0,0 +1,93 @@
+"""Batched, unordered bulk updates for the in-place fix scripts"""
+import os
+import time
+
+import bson
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure
+
+# Overridable per run, e.g. BULK_BATCH_SIZE=2000 python fix-ordinal-numbers.py
+DEFAULT_BATCH_SIZE = int(os.getenv('BULK_BATCH_SIZE', '500'))
+DEFAULT_MAX_RETRIES = int(os.getenv('BULK_MAX_RETRIES', '3'))
+
+
+class BulkUpdater:
+    """Collect UpdateOne operations and send them with bulk_write(ordered=False)
+
+    Each batch is one round-trip. A batch that fails on a network error is
+    resent as a whole (the $set updates are idempotent); per-document write
+    errors are counted and the rest of the batch still applies.
+    """
+
+    def __init__(self, collection, batch_size=None, max_retries=None, retry_delay=1.0, verbose=True, label=''):
+        self.collection = collection
+        self.batch_size = batch_size or DEFAULT_BATCH_SIZE
+        self.max_retries = DEFAULT_MAX_RETRIES if max_retries is None else max_retries
+        self.retry_delay = retry_delay
+        self.verbose = verbose
+        self.label = f'[{label}] ' if label else ''
+        self.operations = []
+        self.batches = 0
+        self.sent = 0
+        self.matched = 0
+        self.modified = 0
+        self.failed = 0
+        self.retries = 0
+        # Time spent in bulk_write and encoded size of the $set documents sent
+        self.write_time = 0.0
+        self.bytes_sent = 0
+        self._pending_bytes = 0
+
+    def update(self, _id, updates):
+        """Queue a $set of the given fields on one document"""
+        self._pending_bytes += len(bson.encode(updates))
+        self.add(UpdateOne({'_id': _id}, {'$set': updates}))
+
+    def add(self, operation):
+        self.operations.append(operation)
+        if len(self.operations) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Send the pending operations as one unordered bulk write"""
+        if not self.operations:
+            return
+        operations, self.operations = self.operations, []
+        nbytes, self._pending_bytes = self._pending_bytes, 0
+        batch = self.batches + 1
+        started = time.perf_counter()
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = self.collection.bulk_write(operations, ordered=False)
+                self.matched += result.matched_count
+                self.modified += result.modified_count
+                break
+            except BulkWriteError as e:
+                details = e.details
+                self.matched += details.get('nMatched', 0)
+                self.modified += details.get('nModified', 0)
+                self.failed += len(details.get('writeErrors', []))
+                print(f"❌ {self.label}Batch {batch}: {len(details.get('writeErrors', []))} updates failed")
+                break
+            except ConnectionFailure as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                delay = self.retry_delay * 2 ** attempt
+                print(f"⚠️  {self.label}Batch {batch} failed ({e}), retrying in {delay:.0f}s...")
+                time.sleep(delay)
+
+        self.write_time += time.perf_counter() - started
+        self.batches = batch
+        self.sent += len(operations)
+        self.bytes_sent += nbytes
+        if self.verbose:
+            print(f"✅ {self.label}Batch {batch}: {len(operations)} updates sent ({self.sent} total, {self.modified} modified)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
@@ -0,0 +1,282 @@
+"""Materialized statistics for /api/fundaciones/stats
+
+The stats route used to run ten aggregations over the whole collection on
+every request. The loaders now count the same figures while they build the
+documents (StatsAccumulator) and store the result as one document in
+'fundaciones_stats', which the route reads by _id. Repairs (repair-database.py
+and the fix-*.py scripts) adjust the stored counts with the changes they made
+(StatsDelta) instead of recounting.
+
+Each figure keeps the semantics of the aggregation it replaces: null or
+missing values are grouped under None where the pipeline groups them, and
+skipped where it matches {$exists: true, $ne: null}. The stored document
+carries STATS_VERSION, bumped whenever its shape changes; the route falls
+back to the live aggregations when the version is not the one it expects.
+
+    python collection_stats.py      # recount from the collection (e.g. after editing 'fundaciones' by hand)
+"""
+import math
+import os
+from collections import Counter
+from datetime import datetime
+
+STATS_COLLECTION = 'fundaciones_stats'
+STATS_ID = 'fundaciones'
+# Keep in step with STATS_VERSION in the stats route
+STATS_VERSION = 1
+
+TOP = 10
+FIRST_TREND_YEAR = 1990
+CONTACT_FIELDS = ('email', 'web', 'telefono')
+
+# Fields a recount needs from each document
+PROJECTION = {
+    'estado': 1, 'anioConstitucion': 1, 'patronos': 1, 'fundadores': 1, 'actividades': 1,
+    **{f'direccionEstatutaria.{field}': 1 for field in ('provincia',) + CONTACT_FIELDS}
+}
+
+_NAN = float('nan')
+
+
+def _key(value):
+    # Every NaN is a different dict key; MongoDB groups them together
+    if isinstance(value, float) and math.isnan(value):
+        return _NAN
+    return value
+
+
+def _present(value):
+    """{$exists: true, $nin: [null, '']}"""
+    return value is not None and value != ''
+
+
+def _sorted_counts(counter, by_count=True):
+    if by_count:
+        # $sort on count alone leaves ties unordered; order them by value for stable output
+        items = sorted(counter.items(), key=lambda item: (-item[1], str(item[0])))
+    else:
+        items = sorted(counter.items(), key=lambda item: (item[0] is None, item[0]))
+    return [{'_id': value, 'count': count} for value, count in items if count > 0]
+
+
+def _activities(doc):
+    """The elements $unwind: '$actividades' produces"""
+    actividades = doc.get('actividades')
+    if actividades is None:
+        return []
+    return actividades if isinstance(actividades, list) else [actividades]
+
+
+def stats_keys(doc):
+    """The grouping values of a document a text repair may change"""
+    actividades = [item for item in _activities(doc) if isinstance(item, dict)]
+    direccion = doc.get('direccionEstatutaria')
+    provincia = direccion.get('provincia') if isinstance(direccion, dict) else None
+    return (
+        _key(doc.get('estado')),
+        _key(provincia),
+        tuple(_key(item.get('clasificacion1')) for item in actividades),
+        tuple(_key(item.get('funcion1')) for item in actividades),
+    )
+
+
+class StatsAccumulator:
+    """Counts every figure of the stats route in one pass over the documents"""
+
+    def __init__(self):
+        self.total = 0
+        self.estado = Counter()
+        self.provincia = Counter()
+        self.actividad = Counter()
+        self.funcion = Counter()
+        self.years = Counter()
+        self.actividades_count = Counter()
+        self.active_with_contact = 0
+        self.patronos = []
+        self.fundadores = []
+        # Documents per stats_keys() tuple, for the facet cube (facet_cube.py)
+        self.keys = Counter()
+
+    def add(self, doc):
+        self.total += 1
+        keys = stats_keys(doc)
+        self.keys[keys] += 1
+        estado, provincia, clasificaciones, funciones = keys
+        self.estado[estado] += 1
+        if provincia is not None:
+            self.provincia[provincia] += 1
+        self.actividad.update(value for value in clasificaciones if value is not None)
+        self.funcion.update(value for value in funciones if value is not None)
+
+        actividades = doc.get('actividades')
+        if isinstance(actividades, list):
+            self.actividades_count[len(actividades)] += 1
+        patronos = doc.get('patronos')
+        if isinstance(patronos, list) and patronos:
+            self.patronos.append(len(patronos))
+        fundadores = doc.get('fundadores')
+        if isinstance(fundadores, list) and fundadores:
+            self.fundadores.append(len(fundadores))
+
+        anio = doc.get('anioConstitucion')
+        if isinstance(anio, int) and anio >= FIRST_TREND_YEAR:
+            self.years[anio] += 1
+
+        if estado == 'Activa':
+            direccion = doc.get('direccionEstatutaria')
+            if isinstance(direccion, dict) and any(_present(direccion.get(field)) for field in CONTACT_FIELDS):
+                self.active_with_contact += 1
+
+    def add_many(self, documents):
+        for doc in documents:
+            self.add(doc)
+        return self
+
+    def document(self):
+        """The fundaciones_stats document, shaped like the route's response"""
+        patronos = {'totalPatronos': 0, 'avgPatronos': 0, 'maxPatronos': 0, 'minPatronos': 0}
+        if self.patronos:
+            patronos = {'_id': None, 'totalPatronos': sum(self.patronos),
+                        'avgPatronos': sum(self.patronos) / len(self.patronos),
+                        'maxPatronos': max(self.patronos), 'minPatronos': min(self.patronos)}
+        fundadores = {'totalFundadores': 0, 'avgFundadores': 0}
+        if self.fundadores:
+            fundadores = {'_id': None, 'totalFundadores': sum(self.fundadores),
+                          'avgFundadores': sum(self.fundadores) / len(self.fundadores)}
+        provincias = _sorted_counts(self.provincia)
+        actividades = _sorted_counts(self.actividad)
+        return {
+            '_id': STATS_ID,
+            'version': STATS_VERSION,
+            'total': self.total,
+            'byEstado': _sorted_counts(self.estado),
+            'byProvincia': provincias[:TOP],
+            'byActividad': actividades[:TOP],
+            'byFuncion': _sorted_counts(self.funcion),
+            'yearlyTrends': [{'year': year, 'count': count} for year, count in sorted(self.years.items())],
+            'patronosStats': patronos,
+            'fundadoresStats': fundadores,
+            'activeFundacionesWithContact': self.active_with_contact,
+            'activitiesDistribution': _sorted_counts(self.actividades_count, by_count=False),
+            'avgPatronosPerFoundation': patronos['avgPatronos'],
+            # Full counts behind the top-10 lists, for StatsDelta
+            'counts': {'provincia': provincias, 'actividad': actividades},
+        }
+
+
+class StatsDelta:
+    """Changes of grouping values made by a repair, to apply to the stored stats"""
+
+    def __init__(self):
+        self.estado = Counter()
+        self.provincia = Counter()
+        self.actividad = Counter()
+        self.funcion = Counter()
+        # Documents per (before, after) pair, for the facet cube
+        self.moves = Counter()
+
+    def change(self, before, after):
+        """Record one document going from stats_keys() before to after"""
+        if before == after:
+            return
+        self.moves[(before, after)] += 1
+        for counter, old, new in zip((self.estado, self.provincia), before[:2], after[:2]):
+            counter[old] -= 1
+            counter[new] += 1
+        for counter, old, new in zip((self.actividad, self.funcion), before[2:], after[2:]):
+            counter.subtract(old)
+            counter.update(new)
+
+    def merge(self, other):
+        for name in ('estado', 'provincia', 'actividad', 'funcion', 'moves'):
+            getattr(self, name).update(getattr(other, name))
+
+    def __bool__(self):
+        return any(any(counter.values()) for counter in (self.estado, self.provincia, self.actividad, self.funcion))
+
+
+def entry_counter(entries):
+    """Counter of the {_id, count} entries of a stored list"""
+    return Counter({_key(entry['_id']): entry['count'] for entry in entries})
+
+
+def compute_stats(collection):
+    """StatsAccumulator over the documents stored in collection (one streamed pass)"""
+    return StatsAccumulator().add_many(collection.find({}, PROJECTION))
+
+
+def save_stats(db, accumulator, source):
+    """Replace the stored stats; returns the document written"""
+    doc = accumulator.document()
+    doc['source'] = source
+    doc['computedAt'] = datetime.now()
+    previous = db[STATS_COLLECTION].find_one({'_id': STATS_ID}, {'generation': 1}) or {}
+    doc['generation'] = previous.get('generation', 0) + 1
+    db[STATS_COLLECTION].replace_one({'_id': STATS_ID}, doc, upsert=True)
+    print(f"📊 Statistics saved to '{STATS_COLLECTION}' (generation {doc['generation']}, {doc['total']} documents)")
+    return doc
+
+
+def apply_delta(db, delta, collection=None):
+    """Apply a repair's StatsDelta to the stored stats; recounts when they are missing or outdated
+
+    A changed estado may change activeFundacionesWithContact, which also
+    depends on the contact fields: that one figure is counted again on the
+    server.
+    """
+    collection = collection if collection is not None else db.fundaciones
+    stored = db[STATS_COLLECTION].find_one({'_id': STATS_ID})
+    if not stored or stored.get('version') != STATS_VERSION or 'counts' not in stored:
+        return save_stats(db, compute_stats(collection), 'recount')
+    if not delta:
+        return stored
+
+    estado = entry_counter(stored['byEstado'])
+    estado.update(delta.estado)
+    provincia = entry_counter(stored['counts']['provincia'])
+    provincia.update(delta.provincia)
+    actividad = entry_counter(stored['counts']['actividad'])
+    actividad.update(delta.actividad)
+    funcion = entry_counter(stored['byFuncion'])
+    funcion.update(delta.funcion)
+    for counter in (provincia, actividad, funcion):
+        counter.pop(None, None)
+
+    provincias = _sorted_counts(provincia)
+    actividades = _sorted_counts(actividad)
+    update = {
+        'byEstado': _sorted_counts(estado),
+        'byProvincia': provincias[:TOP],
+        'byActividad': actividades[:TOP],
+        'byFuncion': _sorted_counts(funcion),
+        'counts': {'provincia': provincias, 'actividad': actividades},
+        'source': 'repair',
+        'computedAt': datetime.now(),
+        'generation': stored.get('generation', 0) + 1,
+    }
+    if any(delta.estado.values()):
+        update['activeFundacionesWithContact'] = collection.count_documents({
+            'estado': 'Activa',
+            '$or': [{f'direccionEstatutaria.{field}': {'$exists': True, '$nin': [None, '']}}
+                    for field in CONTACT_FIELDS]
+        })
+
+    # Only if nobody rewrote the stats meanwhile; otherwise count everything again
+    result = db[STATS_COLLECTION].update_one({'_id': STATS_ID, 'generation': stored.get('generation')},
+                                             {'$set': update})
+    if not result.matched_count:
+        return save_stats(db, compute_stats(collection), 'recount')
+    print(f"📊 Statistics updated in '{STATS_COLLECTION}' (generation {update['generation']})")
+    stored.update(update)
+    return stored
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    db = client[os.getenv('MONGODB_DB_NAME', 'fundaciones_espana')]
+    print("📊 Counting statistics from 'fundaciones'...")
+    save_stats(db, compute_stats(db.fundaciones), 'recount')
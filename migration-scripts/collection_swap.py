@@ -0,0 +1,64 @@
+"""Blue/green reloads of the fundaciones collection
+
+A loader fills '<name>_staging' and builds its indexes there while the API
+keeps serving the live collection. promote() then replaces the live
+collection with a single renameCollection(dropTarget=True), which is atomic,
+so readers see either the old dataset or the complete new one. The replaced
+data is first copied server-side to '<name>_previous' for rollback().
+
+rollback() builds its copy in '<name>_rollback', never in the staging
+collection, so a --blue-green load in progress (or waiting for --resume)
+keeps its data.
+"""
+STAGING_SUFFIX = '_staging'
+PREVIOUS_SUFFIX = '_previous'
+ROLLBACK_SUFFIX = '_rollback'
+
+
+def staging_name(name):
+    return name + STAGING_SUFFIX
+
+
+def previous_name(name):
+    return name + PREVIOUS_SUFFIX
+
+
+def copy_indexes(source, target):
+    """Create on target the indexes source has (except _id)"""
+    for index_name, info in source.index_information().items():
+        if index_name == '_id_':
+            continue
+        keys = info['key']
+        options = {key: value for key, value in info.items() if key not in ('key', 'v', 'ns')}
+        if any(field == '_fts' for field, _ in keys):
+            # Text indexes report their fields as weights
+            keys = [(field, 'text') for field in info['weights']]
+        target.create_index(keys, name=index_name, **options)
+
+
+def promote(db, name='fundaciones', keep_previous=True):
+    """Atomically replace the live collection with the staging one"""
+    staging = db[staging_name(name)]
+    if staging.estimated_document_count() == 0:
+        raise RuntimeError(f"'{staging.name}' is empty, refusing to promote it")
+
+    if keep_previous and name in db.list_collection_names():
+        print(f"💾 Keeping the current '{name}' as '{previous_name(name)}'...")
+        db[name].aggregate([{'$out': previous_name(name)}])
+
+    staging.rename(name, dropTarget=True)
+    print(f"🔁 '{staging.name}' is now '{name}'")
+
+
+def rollback(db, name='fundaciones'):
+    """Put the previous version back live, with the current indexes"""
+    previous = previous_name(name)
+    if previous not in db.list_collection_names():
+        raise RuntimeError(f"No '{previous}' collection to roll back to")
+
+    scratch = db[name + ROLLBACK_SUFFIX]
+    scratch.drop()
+    db[previous].aggregate([{'$out': scratch.name}])
+    copy_indexes(db[name], scratch)
+    scratch.rename(name, dropTarget=True)
+    print(f"⏪ '{name}' rolled back to '{previous}'")
@@ -0,0 +1,92 @@
+"""Diff-based sync of freshly built documents into an existing collection
+
+Instead of clearing the collection and inserting everything again, each
+incoming document is hashed and compared with the contentHash stored on the
+current one. Only new and changed documents are written (unordered bulk
+upserts) and only foundations that disappeared from the source are deleted,
+so the collection stays online and its indexes stay warm.
+"""
+import hashlib
+import json
+import math
+from datetime import datetime
+
+from pymongo import DeleteMany, ReplaceOne
+
+from bulk_writer import BulkUpdater
+
+# Fields (dotted paths for nested ones) that change on every build and must not count as a difference
+VOLATILE_FIELDS = frozenset(('fechaActualizacion', 'contentHash', 'metadata.fechaActualizacion'))
+
+DELETE_CHUNK = 1000
+
+
+def _json_default(value):
+    # Dates as JSON.stringify() writes a Date: the route must compute the same hash
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%dT%H:%M:%S.') + f'{value.microsecond // 1000:03d}Z'
+    return str(value)
+
+
+def _stable(value, prefix=''):
+    """A document without its VOLATILE_FIELDS, nested ones included"""
+    return {key: _stable(item, prefix + key + '.') if isinstance(item, dict) else _scalar(item, prefix + key + '.')
+            for key, item in value.items() if prefix + key not in VOLATILE_FIELDS}
+
+
+def _scalar(value, prefix):
+    # Numbers as they come back from a JSON backup: NaN (empty Excel cell) is null, 1.0 is 1
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            return None
+        return int(value) if value.is_integer() else value
+    if isinstance(value, list):
+        return [_stable(item, prefix) if isinstance(item, dict) else _scalar(item, prefix) for item in value]
+    return value
+
+
+def content_hash(doc):
+    """SHA-1 of the canonical JSON of a document, volatile fields left out
+
+    Same canonical form as contentHash() in the /api/restore route: sorted
+    keys, no whitespace, non-ASCII kept as is.
+    """
+    canonical = json.dumps(_stable(doc), sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=_json_default)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def sync_documents(collection, documents, batch_size=None, delete_missing=True, dry_run=False):
+    """Upsert what changed, delete what is gone; returns the counts of each
+
+    documents: iterable of documents with their final _id.
+    """
+    stored = {doc['_id']: doc.get('contentHash') for doc in collection.find({}, {'contentHash': 1})}
+    stats = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+    seen = set()
+    writer = BulkUpdater(collection, batch_size=batch_size, verbose=False)
+
+    for doc in documents:
+        _id = doc['_id']
+        seen.add(_id)
+        doc['contentHash'] = content_hash(doc)
+
+        previous = stored.get(_id, False)
+        if previous == doc['contentHash']:
+            stats['unchanged'] += 1
+            continue
+        stats['inserted' if previous is False else 'updated'] += 1
+        if not dry_run:
+            writer.add(ReplaceOne({'_id': _id}, doc, upsert=True))
+
+    missing = [_id for _id in stored if _id not in seen]
+    # An empty source would wipe the collection: treat it as an error upstream
+    if delete_missing and seen:
+        stats['deleted'] = len(missing)
+        if not dry_run:
+            for start in range(0, len(missing), DELETE_CHUNK):
+                writer.add(DeleteMany({'_id': {'$in': missing[start:start + DELETE_CHUNK]}}))
+
+    writer.flush()
+    stats['batches'] = writer.batches
+    stats['failed'] = writer.failed
+    return stats
@@ -0,0 +1,439 @@
+"""Column-oriented document builders for the Excel migrators"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from date_fields import ORIGINALS_FIELD, date_columns
+from search_keys import add_search_keys
+
+# Marker for cleaners that return null values untouched (fix_encoding)
+KEEP = object()
+
+
+def column_arrays(df):
+    """Split a DataFrame into per-column arrays holding the same objects iterrows() yields"""
+    # df.values is exactly what iterrows() slices row by row, so the cell
+    # objects (Python float/int/str, Timestamp...) are identical
+    values = df.values
+    return {name: values[:, j] for j, name in enumerate(df.columns)}
+
+
+def notna_mask(values):
+    """Vectorized pd.notna over an object column"""
+    return np.asarray(pd.notna(values), dtype=bool)
+
+
+def map_column(values, clean, rows=None, nulls=KEEP, memo=None):
+    """Apply a text cleaner once per distinct string of a column
+
+    Passing the same memo dict across columns shares the cleaned strings
+    between them (cargos, provincias and names repeat across slots).
+    """
+    if memo is None:
+        memo = {}
+    if rows is None:
+        rows = np.arange(len(values))
+    out = np.full(len(values), None, dtype=object)
+    if len(rows) == 0:
+        return out
+
+    subset = values[rows]
+    null = ~notna_mask(subset)
+    is_str = np.fromiter((isinstance(v, str) for v in subset), dtype=bool, count=len(subset))
+
+    # Strings: one clean() call per unique value
+    if is_str.any():
+        codes, uniques = pd.factorize(subset[is_str])
+        cleaned = np.empty(len(uniques), dtype=object)
+        cleaned[:] = [memo[u] if u in memo else memo.setdefault(u, clean(u)) for u in uniques]
+        out[rows[is_str]] = cleaned[codes]
+
+    # Nulls: either untouched or a fixed value, without calling clean()
+    if null.any():
+        out[rows[null]] = subset[null] if nulls is KEEP else nulls
+
+    # Anything else (numbers in text columns) goes through clean() as-is
+    other = ~(is_str | null)
+    if other.any():
+        cleaned = np.empty(other.sum(), dtype=object)
+        cleaned[:] = [clean(v) for v in subset[other]]
+        out[rows[other]] = cleaned
+
+    return out
+
+
+def _gated(values, mask, transform=None):
+    """Return the value (or transform(value)) where mask is set and None elsewhere"""
+    out = np.full(len(values), None, dtype=object)
+    rows = np.flatnonzero(mask)
+    if transform is None:
+        out[rows] = values[rows]
+    else:
+        transformed = np.empty(len(rows), dtype=object)
+        transformed[:] = [transform(v) for v in values[rows]]
+        out[rows] = transformed
+    return out
+
+
+class _Columns:
+    """Column lookup mirroring row[...] / row.get(...) on an iterrows() row"""
+
+    def __init__(self, df):
+        self.arrays = column_arrays(df)
+        self.index = df.index
+        self.length = len(df)
+        self._missing = np.full(self.length, None, dtype=object)
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def get(self, name):
+        return self.arrays.get(name, self._missing)
+
+    @classmethod
+    def of(cls, df):
+        return df if isinstance(df, _Columns) else cls(df)
+
+
+class _RecordingColumns(_Columns):
+    """_Columns that remembers every column name a builder looks up"""
+
+    def __init__(self, df):
+        super().__init__(df)
+        self.seen = set()
+
+    def __getitem__(self, name):
+        self.seen.add(name)
+        return super().__getitem__(name)
+
+    def get(self, name):
+        self.seen.add(name)
+        return super().get(name)
+
+
+def used_columns(build_documents, header, *args):
+    """Names in header that a builder reads, found with a dry run over zero rows
+
+    The rest of the sheet (unused repeated slots...) can be skipped by the
+    reader. args are the builder's arguments after the DataFrame.
+    """
+    cols = _RecordingColumns(pd.DataFrame(columns=list(header)))
+    for _ in build_documents(cols, *args):
+        pass
+    return [name for name in header if name in cols.seen]
+
+
+def _append_slots(entries, slots, build):
+    """Append one entry per filled slot, keeping the row-wise slot order"""
+    for mask, columns in slots:
+        for r in np.flatnonzero(mask).tolist():
+            entries[r].append(build(r, columns))
+
+
+def _originals(r, columns):
+    """fechasOriginales of row r: the text of its unparseable dates"""
+    return {field: originals[r] for field, originals in columns if originals[r] is not None}
+
+
+def build_registry_documents(df, clean, errors, fuente_datos, encoding_fixed=True, dates=None):
+    """Yield (index, document) for the '@_idfundacion' registry layout
+
+    Produces the same documents as restructure_foundation_data() in
+    migrate-to-mongodb-fixed.py; rows that fail are appended to errors.
+    Date cells are counted in dates (a date_fields.DateReport).
+    """
+    cols = _Columns.of(df)
+    n = cols.length
+    index = cols.index
+    memo = {}
+
+    ids = cols['@_idfundacion']
+    required = ['Nombre', 'NumRegistro', 'FechaConstitucion', 'FechaInscripcion',
+                'NIFFundacion', 'FechaExtincion', 'EstadoFundacion', 'Fines']
+    missing = next((name for name in required if name not in cols.arrays), None)
+
+    top = {}
+    originals = []
+    if missing is None:
+        for name in ['Nombre', 'NumRegistro', 'EstadoFundacion', 'Fines']:
+            mask = notna_mask(cols[name])
+            top[name] = map_column(cols[name], clean, np.flatnonzero(mask), memo=memo)
+        top['NIFFundacion'] = _gated(cols['NIFFundacion'], notna_mask(cols['NIFFundacion']))
+        for name, field in [('FechaConstitucion', 'fechaConstitucion'), ('FechaInscripcion', 'fechaInscripcion'),
+                            ('FechaExtincion', 'fechaExtincion')]:
+            top[field] = date_columns(cols[name], field, dates)
+            originals.append((field, top[field][2]))
+
+    # Dirección Estatutaria
+    prefix = 'DireccionEstatutaria/DireccionEstatutaria/'
+    de_mask = notna_mask(cols.get(prefix + 'Domicilio'))
+    de_rows = np.flatnonzero(de_mask)
+    de_dom = map_column(cols.get(prefix + 'Domicilio'), clean, de_rows, memo=memo)
+    de_prov = map_column(cols.get(prefix + 'Provincia'), clean, de_rows, memo=memo)
+    de_cp = cols.get(prefix + 'CodigoPostal')
+    de_cp_mask = notna_mask(de_cp)
+    de_tel = cols.get(prefix + 'Telefono')
+    de_tel_mask = notna_mask(de_tel)
+    de_fax = cols.get(prefix + 'Fax')
+    de_fax_mask = notna_mask(de_fax)
+    de_email = cols.get(prefix + 'CorreoElectronico')
+    de_web = cols.get(prefix + 'Web')
+
+    # Dirección Notificación
+    prefix = 'DireccionNotificacion/DireccionNotificacion/'
+    dn_mask = notna_mask(cols.get(prefix + 'Domicilio'))
+    dn_rows = np.flatnonzero(dn_mask)
+    dn_dom = map_column(cols.get(prefix + 'Domicilio'), clean, dn_rows, memo=memo)
+    dn_loc = map_column(cols.get(prefix + 'Localidad'), clean, dn_rows, memo=memo)
+    dn_prov = map_column(cols.get(prefix + 'Provincia'), clean, dn_rows, memo=memo)
+    dn_cp = cols.get(prefix + 'CodigoPostal')
+    dn_cp_mask = notna_mask(dn_cp)
+
+    def slot(name, fields):
+        """Mask plus cleaned field arrays for one repeated column group"""
+        mask = notna_mask(cols.get(name.format(field=fields[0][1])))
+        rows = np.flatnonzero(mask)
+        return mask, [(key, map_column(cols.get(name.format(field=field)), clean, rows, memo=memo))
+                      for key, field in fields]
+
+    def build(r, columns):
+        return {key: values[r] for key, values in columns}
+
+    # Actividades: the single-activity columns first, then slots 0-3
+    actividad_fields = [('nombre', 'NombreActividad'), ('clasificacion1', 'Clasificacion1'),
+                        ('clasificacion2', 'Clasificacion2'), ('clasificacion3', 'Clasificacion3'),
+                        ('clasificacion4', 'Clasificacion4'), ('funcion1', 'Funcion1'),
+                        ('funcion2', 'Funcion2')]
+    actividades = [[] for _ in range(n)]
+    _append_slots(actividades,
+                  [slot('Actividades/Actividades/{field}', actividad_fields)]
+                  + [slot(f'Actividades/Actividades/{i}/{{field}}', actividad_fields) for i in range(4)],
+                  build)
+
+    fundadores = [[] for _ in range(n)]
+    _append_slots(fundadores,
+                  [slot(f'Fundadores/Fundador/{i}/{{field}}', [('nombre', 'NombreFundador')])
+                   for i in range(30)],
+                  build)
+
+    patronos = [[] for _ in range(n)]
+    _append_slots(patronos,
+                  [slot(f'Patronos/Patron/{i}/{{field}}', [('nombre', 'NombrePatron'), ('cargo', 'CargoPatron')])
+                   for i in range(31)],
+                  build)
+
+    directivos = [[] for _ in range(n)]
+    _append_slots(directivos,
+                  [slot(f'Directivos/Directivo/{i}/{{field}}', [('nombre', 'NombreDirectivo'), ('cargo', 'CargoDirectivo')])
+                   for i in range(12)],
+                  build)
+
+    organos = [[] for _ in range(n)]
+    _append_slots(organos,
+                  [slot('Organos/Organo/{field}', [('nombre', 'NombreOrgano')])]
+                  + [slot(f'Organos/Organo/{i}/{{field}}', [('nombre', 'NombreOrgano')]) for i in range(3)],
+                  build)
+
+    for r in range(n):
+        try:
+            foundation = {'_id': int(ids[r])}
+            if missing is not None:
+                raise KeyError(missing)
+            foundation.update({
+                'nombre': top['Nombre'][r],
+                'numRegistro': top['NumRegistro'][r],
+                'fechaConstitucion': top['fechaConstitucion'][0][r],
+                'anioConstitucion': top['fechaConstitucion'][1][r],
+                'fechaInscripcion': top['fechaInscripcion'][0][r],
+                'anioInscripcion': top['fechaInscripcion'][1][r],
+                'nif': top['NIFFundacion'][r],
+                'fechaExtincion': top['fechaExtincion'][0][r],
+                'estado': top['EstadoFundacion'][r],
+                'fines': top['Fines'][r],
+                'direccionEstatutaria': None,
+                'direccionNotificacion': None,
+                'actividades': actividades[r],
+                'fundadores': fundadores[r],
+                'patronos': patronos[r],
+                'directivos': directivos[r],
+                'organos': organos[r]
+            })
+
+            if de_mask[r]:
+                foundation['direccionEstatutaria'] = {
+                    'domicilio': de_dom[r],
+                    'codigoPostal': int(de_cp[r]) if de_cp_mask[r] else None,
+                    'provincia': de_prov[r],
+                    'telefono': str(int(de_tel[r])) if de_tel_mask[r] else None,
+                    'fax': str(int(de_fax[r])) if de_fax_mask[r] else None,
+                    'email': de_email[r],
+                    'web': de_web[r]
+                }
+
+            if dn_mask[r]:
+                foundation['direccionNotificacion'] = {
+                    'domicilio': dn_dom[r],
+                    'localidad': dn_loc[r],
+                    'codigoPostal': int(dn_cp[r]) if dn_cp_mask[r] else None,
+                    'provincia': dn_prov[r]
+                }
+
+            unparsed = _originals(r, originals)
+            if unparsed:
+                foundation[ORIGINALS_FIELD] = unparsed
+            add_search_keys(foundation)
+
+            foundation['metadata'] = {
+                'fechaActualizacion': datetime.now(),
+                'fuenteDatos': fuente_datos
+            }
+            if encoding_fixed:
+                foundation['metadata']['encodingFixed'] = True
+
+        except Exception as e:
+            errors.append({
+                'index': index[r],
+                'id': ids[r],
+                'error': str(e)
+            })
+            print(f"❌ Error processing row {index[r]}: {e}")
+            continue
+
+        yield index[r], foundation
+
+
+def build_production_documents(df, clean, normalize_activity, dates=None):
+    """Yield (index, document) for the 'Nº Hoja Registral' production layout
+
+    Produces the same documents as convert_to_mongodb_document() in
+    restore-from-excel-production.py. clean() must map nulls to None. Date
+    cells are counted in dates (a date_fields.DateReport).
+    """
+    cols = _Columns.of(df)
+    n = cols.length
+    index = cols.index
+    memo = {}
+
+    def text(name, rows=None):
+        return map_column(cols[name], clean, rows, nulls=None, memo=memo)
+
+    def as_str(name):
+        values = cols[name]
+        return _gated(values, notna_mask(values), str)
+
+    ids = cols['Nº Hoja Registral']
+    nombre = text('Denominación')
+    num_registro = cols['Número de Registro']
+    estado = text('Estado')
+    fecha_constitucion, anio_constitucion, constitucion_text = date_columns(
+        cols['Fecha de Constitución'], 'fechaConstitucion', dates)
+    fecha_inscripcion, anio_inscripcion, inscripcion_text = date_columns(
+        cols['Fecha de Inscripción'], 'fechaInscripcion', dates)
+    originals = [('fechaConstitucion', constitucion_text), ('fechaInscripcion', inscripcion_text)]
+    fines = text('Fines')
+    nif = as_str('N.I.F.')
+
+    de_dom = text('Domicilio')
+    de_prov = text('Provincia')
+    de_cp = cols['Código Postal']
+    de_cp_mask = notna_mask(de_cp)
+    de_tel = as_str('Teléfono')
+    de_email = text('E-mail')
+    de_web = text('Web')
+
+    dn_dom = text('Domicilio (a efectos de notificación)')
+    dn_prov = text('Provincia (a efectos de notificación)')
+    dn_loc = text('Localidad (a efectos de notificación)')
+    dn_cp = cols['Código Postal (a efectos de notificación)']
+    dn_cp_mask = notna_mask(dn_cp)
+
+    def gated_text(gate, names):
+        mask = notna_mask(cols[gate])
+        rows = np.flatnonzero(mask)
+        return mask, [text(name, rows) for name in names]
+
+    actividades = [[] for _ in range(n)]
+    for i in range(1, 6):
+        mask, (nombres, clas1, clas2, func1) = gated_text(
+            f'Actividad {i}',
+            [f'Actividad {i}', f'Clasificación {i}.1', f'Clasificación {i}.2', f'Función {i}.1'])
+        rows = np.flatnonzero(mask)
+        clas1 = map_column(clas1, normalize_activity, rows, nulls=KEEP)
+        for r in rows.tolist():
+            actividades[r].append({
+                'nombre': nombres[r],
+                'clasificacion1': clas1[r],
+                'clasificacion2': clas2[r],
+                'funcion1': func1[r]
+            })
+
+    fundadores = [[] for _ in range(n)]
+    for i in range(1, 16):
+        mask, (nombres,) = gated_text(f'Fundador {i}', [f'Fundador {i}'])
+        for r in np.flatnonzero(mask).tolist():
+            fundadores[r].append({'nombre': nombres[r]})
+
+    patronos = [[] for _ in range(n)]
+    for i in range(1, 23):
+        mask, (nombres,) = gated_text(f'Patrono {i}', [f'Patrono {i}'])
+        cargos = cols.get(f'Cargo Patrono {i}')
+        cargo_mask = notna_mask(cargos)
+        cargos = map_column(cargos, clean, np.flatnonzero(mask & cargo_mask), nulls=None, memo=memo)
+        for r in np.flatnonzero(mask).tolist():
+            patrono = {'nombre': nombres[r]}
+            if cargo_mask[r]:
+                patrono['cargo'] = cargos[r]
+            patronos[r].append(patrono)
+
+    directivos = [[] for _ in range(n)]
+    for i in range(1, 6):
+        mask, (nombres, cargos) = gated_text(f'Nombre y Apellidos {i}',
+                                             [f'Nombre y Apellidos {i}', f'Cargo {i}'])
+        for r in np.flatnonzero(mask).tolist():
+            directivos[r].append({'nombre': nombres[r], 'cargo': cargos[r]})
+
+    organos = [[] for _ in range(n)]
+    for i in range(1, 6):
+        mask, (nombres,) = gated_text(f'Órgano de Representación {i}', [f'Órgano de Representación {i}'])
+        for r in np.flatnonzero(mask).tolist():
+            organos[r].append({'nombre': nombres[r]})
+
+    for r in range(n):
+        doc = {
+            '_id': int(ids[r]),
+            'nombre': nombre[r],
+            'numRegistro': str(num_registro[r]),
+            'estado': estado[r],
+            'fechaConstitucion': fecha_constitucion[r],
+            'anioConstitucion': anio_constitucion[r],
+            'fechaInscripcion': fecha_inscripcion[r],
+            'anioInscripcion': anio_inscripcion[r],
+            'fines': fines[r],
+            'nif': nif[r]
+        }
+        doc['direccionEstatutaria'] = {
+            'domicilio': de_dom[r],
+            'provincia': de_prov[r],
+            'codigoPostal': int(de_cp[r]) if de_cp_mask[r] else None,
+            'telefono': de_tel[r],
+            'email': de_email[r],
+            'web': de_web[r]
+        }
+        doc['direccionNotificacion'] = {
+            'domicilio': dn_dom[r],
+            'provincia': dn_prov[r],
+            'localidad': dn_loc[r],
+            'codigoPostal': int(dn_cp[r]) if dn_cp_mask[r] else None
+        }
+        doc['actividades'] = actividades[r]
+        doc['fundadores'] = fundadores[r]
+        doc['patronos'] = patronos[r]
+        doc['directivos'] = directivos[r]
+        doc['organos'] = organos[r]
+        unparsed = _originals(r, originals)
+        if unparsed:
+            doc[ORIGINALS_FIELD] = unparsed
+        add_search_keys(doc)
+
+        yield index[r], doc
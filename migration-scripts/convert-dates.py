@@ -0,0 +1,115 @@
+"""Convert the dates of an already loaded collection to BSON dates
+
+Collections loaded before date_fields.py hold fechaConstitucion and
+fechaInscripcion as text (or as whatever the sheet cell was) and have no
+anioConstitucion/anioInscripcion. This converts them in place, in blocks of
+documents parsed column-wise like the loaders do, then creates the year
+indexes and recounts the stats (their yearly trends come from
+anioConstitucion).
+
+    python convert-dates.py
+    python convert-dates.py --dry-run      # only report what would be converted
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+from bulk_writer import BulkUpdater
+from collection_stats import compute_stats, save_stats
+from date_fields import DATE_FIELDS, ORIGINALS_FIELD, DateReport, date_columns
+from index_manifest import build_indexes
+from run_metrics import RunMetrics
+
+load_dotenv()
+
+# Documents still to convert: a date stored as text, or no year fields yet
+PENDING = {'$or': [{field: {'$type': 'string'}} for field in DATE_FIELDS]
+           + [{year: {'$exists': False}} for year in DATE_FIELDS.values() if year]}
+
+
+def convert_block(docs, report):
+    """[(_id, $set)] for a block of documents"""
+    updates = [{} for _ in docs]
+    for field, year_field in DATE_FIELDS.items():
+        # Every document gets the year fields; fechaExtincion only where the layout has it
+        present = [i for i, doc in enumerate(docs) if year_field or field in doc]
+        if not present:
+            continue
+        values = np.empty(len(present), dtype=object)
+        values[:] = [docs[i].get(field) for i in present]
+        dates, years, originals = date_columns(values, field, report)
+        for j, i in enumerate(present):
+            updates[i][field] = dates[j]
+            if year_field:
+                updates[i][year_field] = years[j]
+            if originals[j] is not None:
+                updates[i][f'{ORIGINALS_FIELD}.{field}'] = originals[j]
+    return [(doc['_id'], update) for doc, update in zip(docs, updates) if update]
+
+
+def convert_dates():
+    parser = argparse.ArgumentParser(description='Convert the date fields of the fundaciones collection')
+    parser.add_argument('--dry-run', action='store_true', help='Parse and report without writing')
+    parser.add_argument('--block-size', type=int, default=5000, help='Documents parsed together (default: 5000)')
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='Updates per bulk_write round-trip (default: BULK_BATCH_SIZE or 500)')
+    args = parser.parse_args()
+
+    try:
+        client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+        db = client[os.getenv('MONGODB_DB_NAME', 'fundaciones_espana')]
+        collection = db.fundaciones
+
+        print("📅 Converting dates to BSON dates...")
+        if args.dry_run:
+            print("⚠️  Dry run, nothing will be written")
+
+        metrics = RunMetrics('convert-dates')
+        report = DateReport()
+        writer = BulkUpdater(collection, batch_size=args.batch_size)
+        updated = 0
+        block = []
+        cursor = collection.find(PENDING, {field: 1 for field in DATE_FIELDS})
+
+        def flush_block():
+            nonlocal updated
+            for _id, update in convert_block(block, report):
+                if not args.dry_run:
+                    writer.update(_id, update)
+                metrics.changed('convert_dates', update)
+                updated += 1
+            metrics.count('documents', len(block))
+            metrics.progress(f"✅ Converted {updated} documents...")
+            block.clear()
+
+        metrics.start('clean')
+        for doc in metrics.timed('read', cursor, within='clean'):
+            block.append(doc)
+            if len(block) >= args.block_size:
+                flush_block()
+        flush_block()
+        writer.flush()
+        metrics.stop('clean')
+        metrics.add_writer(writer, within='clean')
+
+        print(f"🎉 Date conversion complete! Converted {updated} documents")
+        report.print_summary()
+
+        if not args.dry_run and updated:
+            with metrics.stage('index'):
+                build_indexes(collection)
+            with metrics.stage('stats'):
+                save_stats(db, compute_stats(collection), 'recount')
+        metrics.finish(updated=updated, dryRun=args.dry_run, dates=report.report())
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    convert_dates()
@@ -0,0 +1,152 @@
+"""Registry dates as BSON dates, with an indexed year
+
+The sheets hold fechaConstitucion, fechaInscripcion and fechaExtincion as
+datetime cells, as 'DD/MM/YYYY' text or as the str() of a Timestamp
+('YYYY-MM-DD 00:00:00'), and the builders used to store whichever form they
+got, so the stats route had to regex-match and $substr the text. They now
+store a datetime (midnight, a BSON date that sorts and ranges correctly)
+and, for constitution and inscription, the year as an int
+(anioConstitucion, anioInscripcion), which is indexed.
+
+parse_dates() converts a whole column: datetime cells directly, text with
+one vectorized pd.to_datetime pass per format in DATE_FORMATS, each over the
+cells no earlier format matched. A value no format matches is stored as
+None, keeps its original text under fechasOriginales, and is counted in the
+DateReport the loaders print and add to their run report.
+"""
+from collections import Counter
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+# Tried in this order; day first, as the registry writes its dates
+DATE_FORMATS = ('%d/%m/%Y', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y %H:%M:%S', '%Y-%m-%d', '%d-%m-%Y', '%d.%m.%Y')
+
+# Document field -> year field (None: no year)
+DATE_FIELDS = {
+    'fechaConstitucion': 'anioConstitucion',
+    'fechaInscripcion': 'anioInscripcion',
+    'fechaExtincion': None,
+}
+
+ORIGINALS_FIELD = 'fechasOriginales'
+
+
+def _midnight(value):
+    return datetime(value.year, value.month, value.day)
+
+
+def parse_dates(values):
+    """(dates, invalid) for an object array of cells
+
+    dates holds a datetime or None per cell; invalid marks the non-null cells
+    that could not be parsed.
+    """
+    values = np.asarray(values, dtype=object)
+    n = len(values)
+    dates = np.full(n, None, dtype=object)
+    present = np.asarray(pd.notna(values), dtype=bool)
+    invalid = present.copy()
+
+    # Datetime cells (Timestamp is a datetime); date cells from openpyxl
+    is_date = np.fromiter((isinstance(v, date) for v in values), dtype=bool, count=n) & present
+    if is_date.any():
+        converted = np.empty(is_date.sum(), dtype=object)
+        converted[:] = [_midnight(v) for v in values[is_date]]
+        dates[is_date] = converted
+        invalid[is_date] = False
+
+    is_str = np.fromiter((isinstance(v, str) for v in values), dtype=bool, count=n)
+    pending = np.flatnonzero(is_str)
+    if len(pending):
+        text = pd.Series(values[pending], dtype=object).str.strip()
+        for fmt in DATE_FORMATS:
+            parsed = pd.to_datetime(text, format=fmt, errors='coerce')
+            ok = parsed.notna().to_numpy()
+            if ok.any():
+                converted = np.empty(ok.sum(), dtype=object)
+                converted[:] = [_midnight(v) for v in parsed[ok]]
+                dates[pending[ok]] = converted
+                invalid[pending[ok]] = False
+            pending, text = pending[~ok], text[~ok]
+            if not len(pending):
+                break
+    return dates, invalid
+
+
+def year_of(dates):
+    """The year of each datetime of parse_dates(), None where there is none"""
+    years = np.full(len(dates), None, dtype=object)
+    rows = np.flatnonzero(np.fromiter((d is not None for d in dates), dtype=bool, count=len(dates)))
+    years[rows] = [dates[r].year for r in rows.tolist()]
+    return years
+
+
+def original_text(value):
+    return value if isinstance(value, str) else str(value)
+
+
+def date_columns(values, field, report=None):
+    """(dates, years, originals) for one column of the columnar builders
+
+    years is None for a field without a year field; originals holds the text
+    of the unparseable cells and None elsewhere.
+    """
+    dates, invalid = parse_dates(values)
+    if report is not None:
+        report.add(field, dates, invalid, values)
+    originals = np.full(len(dates), None, dtype=object)
+    rows = np.flatnonzero(invalid)
+    originals[rows] = [original_text(values[r]) for r in rows.tolist()]
+    return dates, year_of(dates) if DATE_FIELDS[field] else None, originals
+
+
+def date_values(value, field, report=None, originals=None):
+    """{field: date, year field: year} for one cell, for the row-by-row builders
+
+    The text of an unparseable value goes to originals[field].
+    """
+    dates, invalid = parse_dates(np.array([value], dtype=object))
+    if report is not None:
+        report.add(field, dates, invalid, [value])
+    if invalid[0] and originals is not None:
+        originals[field] = original_text(value)
+    values = {field: dates[0]}
+    if DATE_FIELDS[field]:
+        values[DATE_FIELDS[field]] = dates[0].year if dates[0] is not None else None
+    return values
+
+
+class DateReport:
+    """Parsed, empty and unparseable cells per date field, with the commonest bad values"""
+
+    def __init__(self, samples=10):
+        self.samples = samples
+        self.counts = {}
+        self.invalid = {}
+
+    def add(self, field, dates, invalid, values):
+        counts = self.counts.setdefault(field, Counter())
+        parsed = sum(d is not None for d in dates)
+        bad = int(np.count_nonzero(invalid))
+        counts['parsed'] += parsed
+        counts['unparseable'] += bad
+        counts['empty'] += len(dates) - parsed - bad
+        if bad:
+            values = np.asarray(values, dtype=object)
+            self.invalid.setdefault(field, Counter()).update(original_text(v) for v in values[np.asarray(invalid)])
+
+    def report(self):
+        return {field: {**{key: counts[key] for key in ('parsed', 'empty', 'unparseable')},
+                        'samples': [{'value': value, 'count': count}
+                                    for value, count in self.invalid.get(field, Counter()).most_common(self.samples)]}
+                for field, counts in self.counts.items()}
+
+    def print_summary(self):
+        for field, entry in self.report().items():
+            line = f"📅 {field}: {entry['parsed']} dates, {entry['empty']} empty"
+            if entry['unparseable']:
+                examples = ', '.join(repr(sample['value']) for sample in entry['samples'][:3])
+                line += f", ⚠️  {entry['unparseable']} unparseable (e.g. {examples})"
+            print(line)
@@ -0,0 +1,432 @@
+"""Duplicate foundations and people, found by blocking instead of comparing every pair
+
+The same foundation appears under slightly different names or with a
+repeated NIF, across registry releases too, and the same person under
+spelling variants across patronos. Comparing every pair is O(n²); this only
+compares the pairs that share a block:
+
+    foundations   the same NIF (nifNorm); the same normalized name prefix;
+                  the same postal code and name start; MinHash-LSH on the
+                  name's character trigrams
+    people        the same key but for one word (names of three words or
+                  more); MinHash-LSH on the trigrams of their key (see
+                  personas.py; people with the same key are already one entry)
+
+Blocks larger than MAX_BLOCK (a postal code of a big city, a very common
+name start) are skipped and counted: they would bring the quadratic cost
+back, and the other keys still put their real duplicates together.
+
+Each candidate pair is scored with the Jaccard similarity of the names'
+trigrams, or their edit similarity when that is higher and the trigrams
+are close (see similarity()). For foundations, a shared NIF or postal code adds to it and two
+different NIFs take from it; for people, sharing a foundation adds to it.
+Pairs at or above the threshold are linked, and the connected groups are
+written to 'duplicados', one document per cluster:
+
+    {_id: 'fundacion:fundaciones:1234', tipo: 'fundacion', size: 2, score: 0.93,
+     miembros: [{id: 1234, coleccion: 'fundaciones', nombre: ..., nif: ...}, ...],
+     pares: [{a: 1234, b: 5678, score: 0.93, motivos: ['nif', 'nombre']}]}
+
+With --previous the foundations of 'fundaciones_previous' (the release
+before the last blue/green promote) are compared too, so a foundation that
+changed its record between releases shows up; the same _id in both
+releases is the same record and is not reported.
+
+    python dedup.py
+    python dedup.py --previous --dry-run
+"""
+import argparse
+import os
+import sys
+import zlib
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+from pymongo import IndexModel
+
+from collection_swap import previous_name
+from personas import PERSONAS_COLLECTION, persona_entries, PERSONA_PROJECTION
+from search_keys import STOPWORDS, normalize_nif, words
+
+DUPLICATES_COLLECTION = 'duplicados'
+
+# Words that say nothing about which foundation it is; already folded
+GENERIC_WORDS = STOPWORDS | frozenset(('fundacion', 'fundacio', 'fundazioa', 'fundaciones', 'privada'))
+
+# Candidate blocks above this size are skipped
+MAX_BLOCK = 200
+
+# Characters of the normalized name in the prefix blocks, and with the postal code
+NAME_PREFIX = 10
+POSTAL_NAME_PREFIX = 4
+
+# MinHash-LSH: BANDS bands of ROWS values; pairs above ~(1/BANDS)^(1/ROWS) similarity meet in a band
+BANDS = 8
+ROWS = 4
+MINHASH_SEED = 1
+MINHASH_PRIME = (1 << 32) + 15
+MINHASH_CHUNK = 10000
+
+# Scoring
+FOUNDATION_THRESHOLD = 0.85
+PERSON_THRESHOLD = 0.85
+# Trigram similarity from which the edit similarity is tried as well
+GREY_ZONE = 0.4
+NIF_WEIGHT = 0.6
+NIF_CONFLICT = 0.3
+POSTAL_WEIGHT = 0.1
+SHARED_FOUNDATION_WEIGHT = 0.1
+
+FOUNDATION_PROJECTION = {'nombre': 1, 'nombreNorm': 1, 'nif': 1, 'nifNorm': 1, 'direccionEstatutaria.codigoPostal': 1}
+
+DUPLICATE_INDEXES = [
+    IndexModel([('tipo', 1), ('size', -1)]),
+    IndexModel([('miembros.id', 1)]),
+]
+
+
+@lru_cache(maxsize=100000)
+def trigrams(text):
+    """Character trigrams of a normalized text, padded with a space at both ends"""
+    padded = f' {text} '
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2)) if text else frozenset()
+
+
+def edit_similarity(a, b):
+    """1 - Levenshtein distance / length of the longer text"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, left in enumerate(a, 1):
+        current = [i]
+        for j, right in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (left != right)))
+        previous = current
+    return 1 - previous[-1] / len(a)
+
+
+def similarity(a, b, threshold=1.0):
+    """Jaccard similarity of the trigrams of two normalized texts
+
+    A typo changes up to three trigrams, which is a lot of a short name: when
+    the Jaccard similarity is between GREY_ZONE and threshold, the edit
+    similarity is worked out too and the higher one is returned.
+    """
+    left, right = trigrams(a), trigrams(b)
+    if not left or not right:
+        return 0.0
+    shared = len(left & right)
+    score = shared / (len(left) + len(right) - shared)
+    if GREY_ZONE <= score < threshold:
+        score = max(score, edit_similarity(a, b))
+    return score
+
+
+@lru_cache(maxsize=100000)
+def _generic(word):
+    # 'fundacon', 'fuandacion': misspelt, it still says nothing
+    return word in GENERIC_WORDS or (word[:1] == 'f' and len(word) >= 7
+                                     and edit_similarity(word, 'fundacion') >= 0.75)
+
+
+def core_name(nombre):
+    """The words of a foundation name that tell it apart, joined by spaces"""
+    if not isinstance(nombre, str):
+        return ''
+    return ' '.join(word for word in words(nombre) if not _generic(word))
+
+
+def minhash_signatures(texts, permutations=BANDS * ROWS, seed=MINHASH_SEED):
+    """(len(texts), permutations) MinHash signatures of the texts' trigrams; empty texts keep the maximum"""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 32, size=permutations, dtype=np.uint64)
+    b = rng.integers(0, 1 << 32, size=permutations, dtype=np.uint64)
+    prime = np.uint64(MINHASH_PRIME)
+
+    signatures = np.full((len(texts), permutations), np.iinfo(np.uint64).max, dtype=np.uint64)
+    for begin in range(0, len(texts), MINHASH_CHUNK):
+        shingles = [trigrams(text) for text in texts[begin:begin + MINHASH_CHUNK]]
+        counts = np.fromiter((len(s) for s in shingles), dtype=np.int64, count=len(shingles))
+        if not counts.any():
+            continue
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for group in shingles for s in group),
+                             dtype=np.uint64, count=int(counts.sum()))
+        # (a * h + b) mod p stays below 2**64 with a, b, h < 2**32
+        values = (hashes[:, None] * a + b) % prime
+        present = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[present]
+        signatures[begin + present] = np.minimum.reduceat(values, starts, axis=0)
+    return signatures
+
+
+def lsh_blocks(signatures, valid):
+    """Blocks of rows whose signatures agree on a whole band"""
+    rows = np.flatnonzero(valid)
+    mix = np.random.default_rng(MINHASH_SEED + 1).integers(1, 1 << 63, size=ROWS, dtype=np.uint64) | np.uint64(1)
+    blocks = []
+    for band in range(BANDS):
+        # One wrapping uint64 per band; a collision only adds a candidate pair
+        keys = (signatures[rows, band * ROWS:(band + 1) * ROWS] * mix).sum(axis=1)
+        order = np.argsort(keys, kind='stable')
+        keys, members = keys[order], rows[order]
+        bounds = np.flatnonzero(np.diff(keys)) + 1
+        blocks.extend(block for block in np.split(members, bounds) if len(block) > 1)
+    return blocks
+
+
+def key_blocks(keys):
+    """Blocks of rows that share a non-empty key"""
+    groups = {}
+    for row, key in enumerate(keys):
+        if key:
+            groups.setdefault(key, []).append(row)
+    return [np.array(rows) for rows in groups.values() if len(rows) > 1]
+
+
+def word_blocks(keys):
+    """Blocks of rows whose keys are the same once one of their words is left out
+
+    A typo in one word leaves the rest of the key as it was, however few
+    trigrams the two spellings share. Keys of fewer than three words are left
+    to LSH: a single remaining word (a first name) would make blocks too big.
+    """
+    groups = {}
+    for row, key in enumerate(keys):
+        parts = key.split()
+        if len(parts) < 3:
+            continue
+        for rest in {' '.join(parts[:i] + parts[i + 1:]) for i in range(len(parts))}:
+            groups.setdefault(rest, []).append(row)
+    return [np.array(rows) for rows in groups.values() if len(rows) > 1]
+
+
+def candidate_pairs(n, blocks, report):
+    """(rows a, rows b) of the distinct pairs that share a block of at most MAX_BLOCK rows"""
+    codes = []
+    for block in blocks:
+        if len(block) > MAX_BLOCK:
+            report['oversized_blocks'] += 1
+            report['skipped_rows'] += len(block)
+            continue
+        block = np.sort(block)
+        left, right = np.triu_indices(len(block), k=1)
+        codes.append(block[left].astype(np.int64) * n + block[right])
+    if not codes:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    codes = np.unique(np.concatenate(codes))
+    report['candidate_pairs'] += len(codes)
+    return codes // n, codes % n
+
+
+def clusters(n, pairs):
+    """Connected groups (lists of rows, 2 or more) of the matched (a, b, ...) pairs"""
+    parent = list(range(n))
+
+    def find(row):
+        while parent[row] != row:
+            parent[row] = parent[parent[row]]
+            row = parent[row]
+        return row
+
+    for pair in pairs:
+        a, b = find(pair[0]), find(pair[1])
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+    groups = {}
+    for row in range(n):
+        groups.setdefault(find(row), []).append(row)
+    return [rows for rows in groups.values() if len(rows) > 1]
+
+
+def _cluster_documents(tipo, members, matches, groups, member_id):
+    """One 'duplicados' document per group of rows; member_id names a member in the cluster _id"""
+    group_of = {row: i for i, rows in enumerate(groups) for row in rows}
+    pairs = [[] for _ in groups]
+    for a, b, score, reasons in matches:
+        pairs[group_of[a]].append({'a': members[a]['id'], 'b': members[b]['id'], 'score': round(score, 4),
+                                   'motivos': reasons})
+    documents = []
+    computed_at = datetime.now()
+    for rows, pares in zip(groups, pairs):
+        group = [members[row] for row in sorted(rows)]
+        documents.append({
+            '_id': f"{tipo}:{member_id(group[0])}",
+            'tipo': tipo,
+            'size': len(group),
+            'score': max(pair['score'] for pair in pares),
+            'miembros': group,
+            'pares': pares,
+            'computedAt': computed_at,
+        })
+    return documents
+
+
+def find_duplicate_foundations(sources, report):
+    """'duplicados' documents of the foundations of [(collection name, cursor)]"""
+    members, names, nifs, postal = [], [], [], []
+    for source, cursor in sources:
+        for doc in cursor:
+            nif = doc.get('nifNorm') or normalize_nif(doc.get('nif'))
+            address = doc.get('direccionEstatutaria') or {}
+            members.append({'id': doc['_id'], 'coleccion': source, 'nombre': doc.get('nombre'), 'nif': nif})
+            names.append(core_name(doc.get('nombre')))
+            nifs.append(nif)
+            postal.append(address.get('codigoPostal') if isinstance(address, dict) else None)
+    n = len(members)
+    report['foundations'] = n
+
+    signatures = minhash_signatures(names)
+    blocks = (key_blocks(nifs)
+              + key_blocks([name[:NAME_PREFIX] if len(name) >= NAME_PREFIX else None for name in names])
+              + key_blocks([f'{code}:{name[:POSTAL_NAME_PREFIX]}' if code and name else None
+                            for code, name in zip(postal, names)])
+              + lsh_blocks(signatures, np.array([bool(name) for name in names])))
+    left, right = candidate_pairs(n, blocks, report)
+
+    matches = []
+    for a, b in zip(left.tolist(), right.tolist()):
+        if members[a]['id'] == members[b]['id']:
+            # The same record in two releases
+            continue
+        name_score = similarity(names[a], names[b], FOUNDATION_THRESHOLD)
+        score, reasons = name_score, []
+        if name_score >= 0.5:
+            reasons.append('nombre')
+        if nifs[a] and nifs[b]:
+            if nifs[a] == nifs[b]:
+                score += NIF_WEIGHT
+                reasons.append('nif')
+            else:
+                score -= NIF_CONFLICT
+        if postal[a] and postal[a] == postal[b]:
+            score += POSTAL_WEIGHT
+            reasons.append('codigoPostal')
+        if score >= FOUNDATION_THRESHOLD:
+            matches.append((a, b, min(score, 1.0), reasons))
+    report['foundation_matches'] = len(matches)
+    return _cluster_documents('fundacion', members, matches, clusters(n, matches),
+                              lambda member: f"{member['coleccion']}:{member['id']}")
+
+
+def person_groups(db, collection):
+    """[(key, names, foundation ids)] from 'personas', or from the foundations when it is missing"""
+    if PERSONAS_COLLECTION in db.list_collection_names():
+        return [(group['_id'], sorted(group['nombres']), sorted(group['fundaciones']))
+                for group in db[PERSONAS_COLLECTION].aggregate([
+                    {'$group': {'_id': '$key', 'nombres': {'$addToSet': '$nombre'},
+                                'fundaciones': {'$addToSet': '$fundacion'}}}], allowDiskUse=True)]
+    names, foundations = {}, {}
+    for doc in collection.find({}, PERSONA_PROJECTION):
+        for entry in persona_entries(doc):
+            names.setdefault(entry['key'], set()).add(entry['nombre'])
+            foundations.setdefault(entry['key'], set()).add(entry['fundacion'])
+    return [(key, sorted(names[key]), sorted(foundations[key])) for key in names]
+
+
+def find_duplicate_people(groups, report):
+    """'duplicados' documents of people whose keys are spelling variants of each other"""
+    groups = sorted(groups)
+    keys = [key for key, _, _ in groups]
+    n = len(keys)
+    report['people'] = n
+
+    signatures = minhash_signatures(keys)
+    blocks = word_blocks(keys) + lsh_blocks(signatures, np.ones(n, dtype=bool))
+    left, right = candidate_pairs(n, blocks, report)
+
+    matches = []
+    for a, b in zip(left.tolist(), right.tolist()):
+        score = similarity(keys[a], keys[b], PERSON_THRESHOLD)
+        reasons = ['nombre']
+        if set(groups[a][2]) & set(groups[b][2]):
+            score += SHARED_FOUNDATION_WEIGHT
+            reasons.append('fundacion')
+        if score >= PERSON_THRESHOLD:
+            matches.append((a, b, min(score, 1.0), reasons))
+    report['person_matches'] = len(matches)
+    members = [{'id': key, 'nombres': nombres, 'fundaciones': fundaciones} for key, nombres, fundaciones in groups]
+    return _cluster_documents('persona', members, matches, clusters(n, matches), lambda member: member['id'])
+
+
+def save_duplicates(db, documents):
+    """Replace 'duplicados' through a scratch collection renamed over it"""
+    scratch = db[DUPLICATES_COLLECTION + '_build']
+    scratch.drop()
+    if documents:
+        for begin in range(0, len(documents), 5000):
+            scratch.insert_many(documents[begin:begin + 5000], ordered=False)
+        scratch.create_indexes(DUPLICATE_INDEXES)
+        scratch.rename(DUPLICATES_COLLECTION, dropTarget=True)
+    else:
+        db[DUPLICATES_COLLECTION].drop()
+
+
+def find_duplicates(db, collection=None, previous=False, dry_run=False, metrics=None):
+    """Find and save the duplicate clusters; returns (documents, report)"""
+    from run_metrics import RunMetrics
+
+    collection = collection if collection is not None else db.fundaciones
+    metrics = metrics or RunMetrics('dedup')
+    report = Counter()
+
+    sources = [(collection.name, collection.find({}, FOUNDATION_PROJECTION))]
+    if previous:
+        older = db[previous_name(collection.name)]
+        if older.name not in db.list_collection_names():
+            raise RuntimeError(f"'{older.name}' does not exist: there is no previous release to compare")
+        sources.append((older.name, older.find({}, FOUNDATION_PROJECTION)))
+
+    with metrics.stage('foundations'):
+        documents = find_duplicate_foundations(sources, report)
+    with metrics.stage('people'):
+        documents += find_duplicate_people(person_groups(db, collection), report)
+    if not dry_run:
+        with metrics.stage('write'):
+            save_duplicates(db, documents)
+
+    report['clusters'] = len(documents)
+    return documents, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find duplicate foundations and people')
+    parser.add_argument('--previous', action='store_true',
+                        help="Also compare with the foundations of the previous release ('fundaciones_previous')")
+    parser.add_argument('--dry-run', action='store_true', help='Report the clusters without writing them')
+    args = parser.parse_args()
+
+    try:
+        from dotenv import load_dotenv
+        from pymongo import MongoClient
+        from run_metrics import RunMetrics
+
+        load_dotenv()
+        client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+        db = client[os.getenv('MONGODB_DB_NAME', 'fundaciones_espana')]
+        print("🔍 Looking for duplicate foundations and people...")
+        if args.dry_run:
+            print("⚠️  Dry run, nothing will be written")
+
+        metrics = RunMetrics('dedup')
+        documents, report = find_duplicates(db, previous=args.previous, dry_run=args.dry_run, metrics=metrics)
+        kinds = Counter(doc['tipo'] for doc in documents)
+        print(f"📊 {report['foundations']} foundations, {report['people']} people, "
+              f"{report['candidate_pairs']} candidate pairs compared")
+        if report['oversized_blocks']:
+            print(f"⚠️  {report['oversized_blocks']} blocks over {MAX_BLOCK} rows skipped")
+        print(f"🎉 {kinds['fundacion']} foundation clusters and {kinds['persona']} people clusters"
+              + ('' if args.dry_run else f" saved to '{DUPLICATES_COLLECTION}'"))
+        for doc in sorted(documents, key=lambda doc: -doc['size'])[:5]:
+            names = [member.get('nombre') or ', '.join(member.get('nombres', [])) for member in doc['miembros']]
+            print(f"   {doc['tipo']} ×{doc['size']}: {' | '.join(map(str, names))[:120]}")
+        metrics.finish(**report, dryRun=args.dry_run)
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
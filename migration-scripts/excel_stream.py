@@ -0,0 +1,183 @@
+"""Bounded-memory reader for the registry workbooks
+
+pd.read_excel() materializes the whole sheet, hundreds of mostly empty
+Patronos/Patron/{i}/... columns included, before the first document is
+built. ExcelStream opens the first sheet once (openpyxl read-only for .xlsx,
+xlrd on_demand for .xls) and yields DataFrames of chunk_size rows holding
+only the requested columns.
+
+For .xlsx, memory then depends on the chunk size and not on the size of the
+file. xlrd has no streaming reader: on_demand only skips the other sheets,
+and the first sheet of an .xls is still loaded whole (as xlrd cells, far
+smaller than the DataFrame read_excel() builds from them, but growing with
+the file). Save the registry as .xlsx to get flat memory.
+
+Cells are converted the way pandas' own Excel readers convert them and each
+block goes through pandas' TextParser, so a chunk has the same values and
+type inference as read_excel() would give for those rows. Inference is per
+chunk: pin the dtype of a column when it must not depend on the block.
+"""
+import datetime
+import hashlib
+import io
+import math
+import resource
+import sys
+
+import numpy as np
+from pandas.io.parsers import TextParser
+
+DEFAULT_CHUNK_SIZE = 5000
+
+XLSX_MAGIC = b'PK\x03\x04'
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far, in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _xls_cell(value, cell_type, datemode):
+    """Same conversion as pandas' xlrd reader"""
+    import xlrd
+
+    if cell_type == xlrd.XL_CELL_DATE:
+        try:
+            value = xlrd.xldate.xldate_as_datetime(value, datemode)
+        except OverflowError:
+            return value
+        # Dates on the epoch are times only
+        day = value.timetuple()[0:3]
+        if (not datemode and day == (1899, 12, 31)) or (datemode and day == (1904, 1, 1)):
+            value = datetime.time(value.hour, value.minute, value.second, value.microsecond)
+    elif cell_type == xlrd.XL_CELL_ERROR:
+        value = np.nan
+    elif cell_type == xlrd.XL_CELL_BOOLEAN:
+        value = bool(value)
+    elif cell_type == xlrd.XL_CELL_NUMBER and math.isfinite(value) and int(value) == value:
+        value = int(value)
+    return value
+
+
+def _xlsx_cell(cell):
+    """Same conversion as pandas' openpyxl reader"""
+    from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+
+    value = cell.value
+    if value is None:
+        return ''
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        return int(value) if int(value) == value else float(value)
+    return value
+
+
+class ExcelStream:
+    """The first sheet of an .xls/.xlsx workbook, read in row blocks
+
+    source: a path, the file contents as bytes, or a file-like object (e.g.
+    the BytesIO of a download).
+    """
+
+    def __init__(self, source):
+        self.path = source if isinstance(source, str) else None
+        if self.path is None:
+            self.contents = source if isinstance(source, bytes) else source.read()
+            magic = self.contents[:4]
+        else:
+            self.contents = None
+            with open(self.path, 'rb') as f:
+                magic = f.read(4)
+
+        self.format = 'xlsx' if magic == XLSX_MAGIC else 'xls'
+        if self.format == 'xlsx':
+            import openpyxl
+            self._book = openpyxl.load_workbook(self.path or io.BytesIO(self.contents),
+                                                read_only=True, data_only=True)
+            self._sheet = self._book.worksheets[0]
+            self.header = [cell.value for cell in next(self._sheet.iter_rows(max_row=1))]
+            # Read-only sheets only know their size if the file records it
+            self.row_count = (self._sheet.max_row - 1) if self._sheet.max_row else None
+        else:
+            import xlrd
+            print("⚠️  .xls sheets are loaded whole by xlrd: save the file as .xlsx for bounded memory")
+            self._book = xlrd.open_workbook(self.path, file_contents=self.contents, on_demand=True)
+            self._sheet = self._book.sheet_by_index(0)
+            self.header = self._sheet.row_values(0)
+            self.row_count = self._sheet.nrows - 1
+
+    @property
+    def fingerprint(self):
+        """SHA-1 of the file bytes"""
+        digest = hashlib.sha1()
+        if self.contents is not None:
+            digest.update(self.contents)
+        else:
+            with open(self.path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+        return digest.hexdigest()
+
+    def _rows(self, positions, skip_rows):
+        """Converted cell values of the selected columns, one list per data row
+
+        Empty rows are held back until a row with data follows, so the blank
+        rows at the end of a sheet are dropped like read_excel() does.
+        """
+        pending = []
+        for values in self._cells(positions, skip_rows):
+            if all(value == '' for value in values):
+                pending.append(values)
+                continue
+            if pending:
+                yield from pending
+                pending = []
+            yield values
+
+    def _cells(self, positions, skip_rows):
+        if self.format == 'xlsx':
+            for row in self._sheet.iter_rows(min_row=2 + skip_rows):
+                yield [_xlsx_cell(row[j]) if j < len(row) else '' for j in positions]
+        else:
+            sheet, datemode = self._sheet, self._book.datemode
+            for r in range(1 + skip_rows, sheet.nrows):
+                yield [_xls_cell(sheet.cell_value(r, j), sheet.cell_type(r, j), datemode)
+                       for j in positions]
+
+    def chunks(self, chunk_size=DEFAULT_CHUNK_SIZE, usecols=None, dtype=None, skip_rows=0):
+        """Yield DataFrames of up to chunk_size rows
+
+        usecols: column names to keep (default: all); dtype: {column: dtype}
+        hints; skip_rows: data rows to skip, e.g. those a resumed migration
+        already committed. The index counts data rows from the top of the sheet.
+        """
+        wanted = None if usecols is None else set(usecols)
+        names = [name for name in self.header if wanted is None or name in wanted]
+        positions = [self.header.index(name) for name in names]
+        dtype = {name: kind for name, kind in (dtype or {}).items() if name in names} or None
+
+        start = skip_rows
+        block = []
+        for values in self._rows(positions, skip_rows):
+            block.append(values)
+            if len(block) >= chunk_size:
+                yield self._frame(names, block, dtype, start)
+                start += len(block)
+                block = []
+        if block:
+            yield self._frame(names, block, dtype, start)
+
+    @staticmethod
+    def _frame(names, block, dtype, start):
+        df = TextParser([names] + block, header=0, dtype=dtype).read()
+        df.index = range(start, start + len(df))
+        return df
+
+    def close(self):
+        if self.format == 'xlsx':
+            self._book.close()
+        else:
+            self._book.release_resources()
@@ -0,0 +1,197 @@
+"""Precomputed facet counts for /api/fundaciones/filters and the listing totals
+
+The filters route grouped the whole collection four times per request, and
+the listing counted the matching documents before every page. The cube in
+'fundaciones_facets' holds one cell per combination of provincia, estado and
+the clasificacion1 and funcion1 values of a document's activities, with the
+number of documents that have it:
+
+    {provincia: 'Madrid', estado: 'Activa',
+     actividades: ['Cultura', 'Educación'], funciones: ['Docencia', 'Investigación'],
+     count: 42}
+
+A cell keeps the set of values of all of a document's activities rather than
+one clasificacion1 and one funcion1: the listing's actividad and funcion
+filters match any activity of a document, and a cell per single value would
+count a document with several activities more than once. So every document
+lives in exactly one cell, and the listing total for any provincia, estado,
+actividad and funcion filter is the sum of the counts of the cells the same
+query matches. The $regex filters run on the cells' arrays just as they run
+on the documents' actividades.
+
+The dropdown lists of the filters route count activities, not documents;
+they are stored ready to serve in the 'facets' document of
+'fundaciones_stats', which also marks the cube as complete. The routes fall
+back to the collection when it is missing or has another FACETS_VERSION.
+
+The loaders build the cube from the StatsAccumulator they already fill;
+repairs, fix-*.py scripts included, move documents between cells, and
+adjust the lists, with the StatsDelta they record.
+
+    python facet_cube.py      # rebuild from the collection (e.g. after editing 'fundaciones' by hand)
+"""
+import hashlib
+import math
+import os
+from collections import Counter
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from collection_stats import STATS_COLLECTION, compute_stats, entry_counter
+
+FACETS_COLLECTION = 'fundaciones_facets'
+FACETS_ID = 'facets'
+# Keep in step with FACETS_VERSION in src/lib/facets.ts
+FACETS_VERSION = 1
+
+# Top-level fields stats_keys() reads, for repairs that project their documents
+FACET_PROJECTION = {'estado': 1, 'direccionEstatutaria': 1, 'actividades': 1}
+
+
+def _bson_order(value):
+    # How $sort orders the values the filters route groups: null, numbers (NaN first), strings
+    if value is None:
+        return (0, 0, '')
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (1, -math.inf if math.isnan(value) else value, '')
+    if isinstance(value, str):
+        return (2, 0, value)
+    return (3, 0, repr(value))
+
+
+def cell_key(keys):
+    """The cube cell of a document, from its stats_keys()"""
+    estado, provincia, clasificaciones, funciones = keys
+    return (provincia, estado, tuple(sorted(set(clasificaciones), key=_bson_order)),
+            tuple(sorted(set(funciones), key=_bson_order)))
+
+
+def cell_id(cell):
+    return hashlib.sha1(repr(cell).encode('utf-8')).hexdigest()
+
+
+def cell_document(cell, count):
+    provincia, estado, actividades, funciones = cell
+    return {'_id': cell_id(cell), 'provincia': provincia, 'estado': estado,
+            'actividades': list(actividades), 'funciones': list(funciones), 'count': count}
+
+
+def cells_from_keys(keys):
+    """Counter of cells from a Counter of stats_keys() tuples"""
+    cells = Counter()
+    for key, count in keys.items():
+        cells[cell_key(key)] += count
+    return cells
+
+
+def _listed(counter):
+    """{_id, count} entries as the filters route returns them: no null or '', sorted by _id"""
+    return [{'_id': value, 'count': count}
+            for value, count in sorted(counter.items(), key=lambda item: _bson_order(item[0]))
+            if value is not None and value != '' and count > 0]
+
+
+def filter_lists(estado, provincia, actividad, funcion):
+    """The four dropdown lists of the filters route, from Counters of values"""
+    return {'provincias': _listed(provincia), 'estados': _listed(estado),
+            'actividades': _listed(actividad), 'funciones': _listed(funcion)}
+
+
+def _save_meta(db, filters, cells, total, source, generation=None):
+    """Write the 'facets' document; with generation, only over that generation"""
+    meta = {
+        '_id': FACETS_ID,
+        'version': FACETS_VERSION,
+        'filters': filters,
+        'cells': cells,
+        'total': total,
+        'source': source,
+        'computedAt': datetime.now(),
+    }
+    if generation is None:
+        previous = db[STATS_COLLECTION].find_one({'_id': FACETS_ID}, {'generation': 1}) or {}
+        meta['generation'] = previous.get('generation', 0) + 1
+        db[STATS_COLLECTION].replace_one({'_id': FACETS_ID}, meta, upsert=True)
+        return meta
+    meta['generation'] = generation + 1
+    result = db[STATS_COLLECTION].replace_one({'_id': FACETS_ID, 'generation': generation}, meta)
+    return meta if result.matched_count else None
+
+
+def save_facets(db, accumulator, source):
+    """Replace the cube with the cells counted by a StatsAccumulator
+
+    The cells go to a scratch collection that is renamed over the cube, so
+    the routes never read half of one.
+    """
+    cells = cells_from_keys(accumulator.keys)
+    scratch = db[FACETS_COLLECTION + '_build']
+    scratch.drop()
+    if cells:
+        scratch.insert_many([cell_document(cell, count) for cell, count in cells.items()], ordered=False)
+        scratch.create_index([('provincia', 1), ('estado', 1)])
+        scratch.rename(FACETS_COLLECTION, dropTarget=True)
+    else:
+        db[FACETS_COLLECTION].drop()
+    filters = filter_lists(accumulator.estado, accumulator.provincia, accumulator.actividad, accumulator.funcion)
+    meta = _save_meta(db, filters, len(cells), accumulator.total, source)
+    print(f"🧊 Facet cube saved to '{FACETS_COLLECTION}' ({len(cells)} cells, {meta['total']} documents)")
+    return meta
+
+
+def rebuild_facets(db, collection=None):
+    collection = collection if collection is not None else db.fundaciones
+    return save_facets(db, compute_stats(collection), 'recount')
+
+
+def apply_facet_delta(db, delta, collection=None):
+    """Move the documents a repair changed between cells; rebuilds when the cube is missing or outdated"""
+    collection = collection if collection is not None else db.fundaciones
+    stored = db[STATS_COLLECTION].find_one({'_id': FACETS_ID})
+    if not stored or stored.get('version') != FACETS_VERSION:
+        return rebuild_facets(db, collection)
+
+    moves = Counter()
+    for (before, after), count in delta.moves.items():
+        moves[cell_key(before)] -= count
+        moves[cell_key(after)] += count
+    operations = [
+        UpdateOne({'_id': cell_id(cell)},
+                  {'$inc': {'count': count},
+                   '$setOnInsert': {key: value for key, value in cell_document(cell, 0).items()
+                                    if key not in ('_id', 'count')}},
+                  upsert=True)
+        for cell, count in moves.items() if count
+    ]
+    if not operations:
+        return stored
+
+    cube = db[FACETS_COLLECTION]
+    cube.bulk_write(operations, ordered=False)
+    cube.delete_many({'count': {'$lte': 0}})
+
+    counters = []
+    for name, counter in (('estados', delta.estado), ('provincias', delta.provincia),
+                          ('actividades', delta.actividad), ('funciones', delta.funcion)):
+        counts = entry_counter(stored['filters'][name])
+        counts.update(counter)
+        counters.append(counts)
+    meta = _save_meta(db, filter_lists(*counters), cube.count_documents({}), stored['total'], 'repair',
+                      stored.get('generation', 0))
+    if meta is None:
+        # Someone rebuilt the cube meanwhile
+        return rebuild_facets(db, collection)
+    print(f"🧊 Facet cube updated in '{FACETS_COLLECTION}' ({len(operations)} cells changed)")
+    return meta
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    db = client[os.getenv('MONGODB_DB_NAME', 'fundaciones_espana')]
+    print("🧊 Building the facet cube from 'fundaciones'...")
+    rebuild_facets(db)
@@ -3,26 +3,15 @@ from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
 
+from run_metrics import RunMetrics
+from text_repair import repair, trigger_pattern
+from repair_pipeline import FixWriter, field_filter, fix_projection
+
 load_dotenv()
 
 def fix_double_accents(text):
-    if not isinstance(text, str):
-        return text
-    
-    # Fix double accent issues
-    result = text
-    result = result.replace('ÁÁ', 'Á')  # Double Á -> single Á
-    result = result.replace('ÉÉ', 'É')  # Double É -> single É
-    result = result.replace('ÍÍ', 'Í')  # Double Í -> single Í
-    result = result.replace('ÓÓ', 'Ó')  # Double Ó -> single Ó
-    result = result.replace('ÚÚ', 'Ú')  # Double Ú -> single Ú
-    result = result.replace('ÑÑ', 'Ñ')  # Double Ñ -> single Ñ
-    
-    # Fix specific cases we can see
-    result = result.replace('MEDITERRÁÁ', 'MEDITERRÁ')
-    result = result.replace('BRITÁNÁ', 'BRITÁ')
-    
-    return result
+    # Fix double accent issues (ÁÁ -> Á, MEDITERRÁÁ -> MEDITERRÁ...)
+    return repair(text, 'fix_double_accents')
 
 def fix_database_double_accents():
     try:
@@ -33,9 +22,17 @@ def fix_database_double_accents():
         print("🔧 Fixing double accent characters...")
         
         updated = 0
-        cursor = collection.find({})
+        metrics = RunMetrics('fix-double-accents')
+        writer = FixWriter(collection)
+        # Only documents with a doubled accent leave the server
+        fields = ['nombre', 'estado', 'fines', 'direccionEstatutaria.provincia', 'direccionEstatutaria.domicilio',
+                  'patronos.nombre', 'patronos.cargo']
+        cursor = collection.find(field_filter(fields, trigger_pattern('fix_double_accents')),
+                                 fix_projection(fields))
         
-        for doc in cursor:
+        metrics.start('clean')
+        for doc in metrics.timed('read', writer.documents(cursor), within='clean'):
+            metrics.count('documents')
             updates = {}
             
             # Fix nombre
@@ -44,7 +41,7 @@ def fix_database_double_accents():
                 if fixed != doc['nombre']:
                     updates['nombre'] = fixed
                     updated += 1
-                    print(f"Fixed: {doc['nombre']} -> {fixed}")
+                    metrics.log(f"Fixed: {doc['nombre']} -> {fixed}")
             
             # Fix estado
             if doc.get('estado') and ('ÁÁ' in doc['estado'] or 'ÉÉ' in doc['estado'] or 'ÍÍ' in doc['estado'] or 'ÓÓ' in doc['estado'] or 'ÚÚ' in doc['estado'] or 'ÑÑ' in doc['estado']):
@@ -80,7 +77,7 @@ def fix_database_double_accents():
                         patron['nombre'] = fix_double_accents(original)
                         if patron['nombre'] != original:
                             patronos_fixed = True
-                            print(f"Fixed patron: {original} -> {patron['nombre']}")
+                            metrics.log(f"Fixed patron: {original} -> {patron['nombre']}")
                     
                     if patron.get('cargo') and ('ÁÁ' in patron['cargo'] or 'ÉÉ' in patron['cargo']):
                         original = patron['cargo']
@@ -93,9 +90,21 @@ def fix_database_double_accents():
             
             # Apply updates
             if updates:
-                collection.update_one({'_id': doc['_id']}, {'$set': updates})
+                metrics.changed('fix_double_accents', updates)
+                writer.update(doc['_id'], updates)
+
+        writer.flush()
+        metrics.stop('clean')
+        metrics.add_writer(writer, within='clean')
+        
+        # Keep the stats, the facet cube and 'personas' in step with the fixed values
+        with metrics.stage('stats'):
+            writer.apply_stats(db)
+        with metrics.stage('personas'):
+            writer.apply_personas(db)
         
         print(f"🎉 Double accent fix complete! Fixed {updated} documents")
+        metrics.finish(updated=updated)
         
         # Test result
         sample = collection.find_one({'nombre': {'$regex': 'MEDITERR'}})
@@ -3,19 +3,15 @@ from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
 
+from repair_pipeline import FixWriter
+from run_metrics import RunMetrics
+from text_repair import repair
+
 load_dotenv()
 
 def final_clean_text(text):
-    if not isinstance(text, str):
-        return text
-    
-    # Fix remaining character issues
-    result = text
-    result = result.replace('ÁÓ', 'Ó')    # FUNDACIÁÓN -> FUNDACIÓN
-    result = result.replace('ÁÑ', 'Ñ')    # ESPAÁÑOLA -> ESPAÑOLA  
-    result = result.replace('ÁÍ', 'Í')    # CIRUGÁÍA -> CIRUGÍA
-    
-    return result
+    # Fix remaining character issues (FUNDACIÁÓN -> FUNDACIÓN, ESPAÁÑOLA -> ESPAÑOLA...)
+    return repair(text, 'final_clean_text')
 
 def final_database_clean():
     try:
@@ -26,9 +22,13 @@ def final_database_clean():
         print("🔧 Final character cleanup...")
         
         updated = 0
+        metrics = RunMetrics('fix-encoding-final-clean')
+        writer = FixWriter(collection)
         cursor = collection.find({})
         
-        for doc in cursor:
+        metrics.start('clean')
+        for doc in metrics.timed('read', writer.documents(cursor), within='clean'):
+            metrics.count('documents')
             updates = {}
             
             # Fix nombre
@@ -70,12 +70,24 @@ def final_database_clean():
             
             # Apply updates
             if updates:
-                collection.update_one({'_id': doc['_id']}, {'$set': updates})
+                metrics.changed('final_clean_text', updates)
+                writer.update(doc['_id'], updates)
             
             if updated % 50 == 0 and updated > 0:
-                print(f"✅ Cleaned {updated} documents...")
+                metrics.progress(f"✅ Cleaned {updated} documents...")
+
+        writer.flush()
+        metrics.stop('clean')
+        metrics.add_writer(writer, within='clean')
+        
+        # Keep the stats, the facet cube and 'personas' in step with the fixed values
+        with metrics.stage('stats'):
+            writer.apply_stats(db)
+        with metrics.stage('personas'):
+            writer.apply_personas(db)
         
         print(f"🎉 Final cleanup complete! Cleaned {updated} documents")
+        metrics.finish(updated=updated)
         
         # Test result
         sample = collection.find_one({'nombre': {'$regex': 'FUNDACI'}})
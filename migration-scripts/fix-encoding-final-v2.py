@@ -2,7 +2,10 @@ import pymongo
 from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
-import re
+
+from run_metrics import RunMetrics
+from text_repair import repair, trigger_pattern
+from repair_pipeline import FixWriter, field_filter, fix_projection
 
 load_dotenv()
 
@@ -11,27 +14,8 @@ def fix_encoding_v2(text):
     if not isinstance(text, str):
         return text
     
-    # Fix specific Unicode characters we see in the data
-    result = text
-    
-    # Remove problematic Unicode quotation marks
-    result = result.replace('"', 'Ó')  # Unicode 8220 -> Ó  
-    result = result.replace(''', 'Ñ')  # Unicode 8216 -> Ñ
-    result = result.replace('𼀽', 'Í')  # Unicode 61837 -> Í
-    
-    # Fix standard encoding issues
-    result = result.replace('Á', 'Á')  # 193 -> Á (already correct)
-    result = result.replace('É', 'É')  # 201 -> É (already correct) 
-    
-    # Additional common fixes
-    result = result.replace('Ã¡', 'á')
-    result = result.replace('Ã©', 'é')
-    result = result.replace('Ã­', 'í')
-    result = result.replace('Ã³', 'ó')
-    result = result.replace('Ãº', 'ú')
-    result = result.replace('Ã±', 'ñ')
-    
-    return result.strip() if result else None
+    result = repair(text, 'fix_encoding_v2')
+    return result if result else None
 
 def fix_database_encoding_v2():
     """Fix encoding in existing MongoDB data - comprehensive version"""
@@ -45,12 +29,21 @@ def fix_database_encoding_v2():
         
         print("🔧 Starting comprehensive encoding fix...")
         
-        # Process all documents
-        cursor = collection.find({})
+        metrics = RunMetrics('fix-encoding-final-v2')
+        writer = FixWriter(collection)
+        
+        # Only documents with encoding issues leave the server
+        fields = ['nombre', 'estado', 'fines', 'direccionEstatutaria.provincia', 'direccionEstatutaria.domicilio',
+                  'direccionNotificacion.provincia', 'direccionNotificacion.localidad',
+                  'patronos.nombre', 'patronos.cargo', 'actividades.nombre']
+        cursor = collection.find(field_filter(fields, trigger_pattern('fix_encoding_v2')),
+                                 fix_projection(fields))
         processed = 0
         fixed = 0
         
-        for doc in cursor:
+        metrics.start('clean')
+        for doc in metrics.timed('read', writer.documents(cursor), within='clean'):
+            metrics.count('documents')
             updates = {}
             
             # Fix nombre
@@ -143,15 +136,27 @@ def fix_database_encoding_v2():
             
             # Apply updates
             if updates:
-                collection.update_one({'_id': doc['_id']}, {'$set': updates})
+                metrics.changed('fix_encoding_v2', updates)
+                writer.update(doc['_id'], updates)
             
             processed += 1
             if processed % 500 == 0:
-                print(f"✅ Processed {processed} documents, fixed {fixed} with encoding issues")
+                metrics.progress(f"✅ Processed {processed} documents, fixed {fixed} with encoding issues")
+
+        writer.flush()
+        metrics.stop('clean')
+        metrics.add_writer(writer, within='clean')
+        
+        # Keep the stats, the facet cube and 'personas' in step with the fixed values
+        with metrics.stage('stats'):
+            writer.apply_stats(db)
+        with metrics.stage('personas'):
+            writer.apply_personas(db)
         
         print(f"\n🎉 Comprehensive encoding fix complete!")
         print(f"📊 Total processed: {processed}")
         print(f"🔧 Documents fixed: {fixed}")
+        metrics.finish(fixed=fixed)
         
         # Verify fix
         sample = collection.find_one({'nombre': {'$regex': 'FUNDACI'}})
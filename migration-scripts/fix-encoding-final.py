@@ -3,35 +3,15 @@ from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
 
+from repair_pipeline import FixWriter
+from run_metrics import RunMetrics
+from text_repair import repair
+
 load_dotenv()
 
 def fix_encoding_final(text):
     """Fix encoding issues using direct replacement"""
-    if not isinstance(text, str):
-        return text
-    
-    # Complete fixes for Spanish encoding issues
-    result = text
-    result = result.replace('Ã±', 'ñ')
-    result = result.replace('Ã³', 'ó')
-    result = result.replace('Ã¡', 'á')
-    result = result.replace('Ã©', 'é')
-    result = result.replace('Ã­', 'í')
-    result = result.replace('Ãº', 'ú')
-    result = result.replace('Ã"', 'Ó')
-    result = result.replace('Ã‰', 'É')
-    result = result.replace('Ã', 'Á')
-    result = result.replace('Ã ', 'à')
-    result = result.replace('Ã¨', 'è')
-    result = result.replace('Ã¬', 'ì')
-    result = result.replace('Ã²', 'ò')
-    result = result.replace('Ã¹', 'ù')
-    
-    # Special cases
-    result = result.replace('Ã"N', 'ÓN')
-    result = result.replace('Ã³n', 'ón')
-    
-    return result
+    return repair(text, 'fix_encoding_final')
 
 def fix_database_encoding():
     """Fix encoding in existing MongoDB data"""
@@ -45,12 +25,17 @@ def fix_database_encoding():
         
         print("🔧 Starting encoding fix for existing data...")
         
+        metrics = RunMetrics('fix-encoding-final')
+        writer = FixWriter(collection)
+        
         # Process all documents
         cursor = collection.find({})
         processed = 0
         fixed = 0
         
-        for doc in cursor:
+        metrics.start('clean')
+        for doc in metrics.timed('read', writer.documents(cursor), within='clean'):
+            metrics.count('documents')
             updates = {}
             
             # Fix nombre
@@ -76,15 +61,27 @@ def fix_database_encoding():
             
             # Apply updates
             if updates:
-                collection.update_one({'_id': doc['_id']}, {'$set': updates})
+                metrics.changed('fix_encoding_final', updates)
+                writer.update(doc['_id'], updates)
             
             processed += 1
             if processed % 500 == 0:
-                print(f"✅ Processed {processed} documents, fixed {fixed} with encoding issues")
+                metrics.progress(f"✅ Processed {processed} documents, fixed {fixed} with encoding issues")
+
+        writer.flush()
+        metrics.stop('clean')
+        metrics.add_writer(writer, within='clean')
+        
+        # Keep the stats, the facet cube and 'personas' in step with the fixed values
+        with metrics.stage('stats'):
+            writer.apply_stats(db)
+        with metrics.stage('personas'):
+            writer.apply_personas(db)
         
         print(f"\n🎉 Encoding fix complete!")
         print(f"📊 Total processed: {processed}")
         print(f"🔧 Documents fixed: {fixed}")
+        metrics.finish(fixed=fixed)
         
         # Verify fix
         sample = collection.find_one({'nombre': {'$regex': 'FUNDACI'}})
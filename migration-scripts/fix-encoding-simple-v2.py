@@ -3,19 +3,15 @@ from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
 
+from repair_pipeline import FixWriter
+from run_metrics import RunMetrics
+from text_repair import repair
+
 load_dotenv()
 
 def fix_unicode_chars(text):
-    if not isinstance(text, str):
-        return text
-    
-    # Fix the specific problematic characters we identified
-    result = text
-    result = result.replace(chr(8220), 'Ó')  # Unicode 8220 -> Ó  
-    result = result.replace(chr(8216), 'Ñ')  # Unicode 8216 -> Ñ
-    result = result.replace(chr(61837), 'Í') # Unicode 61837 -> Í
-    
-    return result
+    # Fix the specific problematic characters we identified (8220, 8216, 61837)
+    return repair(text, 'fix_unicode_chars')
 
 def fix_database():
     try:
@@ -26,9 +22,13 @@ def fix_database():
         print("🔧 Fixing Unicode characters...")
         
         updated = 0
+        metrics = RunMetrics('fix-encoding-simple-v2')
+        writer = FixWriter(collection)
         cursor = collection.find({})
         
-        for doc in cursor:
+        metrics.start('clean')
+        for doc in metrics.timed('read', writer.documents(cursor), within='clean'):
+            metrics.count('documents')
             updates = {}
             
             # Fix nombre
@@ -53,12 +53,24 @@ def fix_database():
             
             # Apply updates
             if updates:
-                collection.update_one({'_id': doc['_id']}, {'$set': updates})
+                metrics.changed('fix_unicode_chars', updates)
+                writer.update(doc['_id'], updates)
             
             if updated % 100 == 0 and updated > 0:
-                print(f"✅ Fixed {updated} documents...")
+                metrics.progress(f"✅ Fixed {updated} documents...")
+
+        writer.flush()
+        metrics.stop('clean')
+        metrics.add_writer(writer, within='clean')
+        
+        # Keep the stats, the facet cube and 'personas' in step with the fixed values
+        with metrics.stage('stats'):
+            writer.apply_stats(db)
+        with metrics.stage('personas'):
+            writer.apply_personas(db)
         
         print(f"🎉 Complete! Fixed {updated} documents")
+        metrics.finish(updated=updated)
         
         # Test result
         sample = collection.find_one({'nombre': {'$regex': 'FUNDACI'}})
@@ -3,32 +3,15 @@ from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
 
+from repair_pipeline import FixWriter
+from run_metrics import RunMetrics
+from text_repair import repair
+
 load_dotenv()
 
 def fix_encoding_simple(text):
     """Simple fix for common encoding issues"""
-    if not isinstance(text, str):
-        return text
-    
-    # Most common fixes for Spanish text
-    replacements = [
-        ('Ã±', 'ñ'),
-        ('Ã'', 'Ñ'),
-        ('Ã³', 'ó'),
-        ('Ã¡', 'á'),
-        ('Ã©', 'é'),
-        ('Ã­', 'í'),
-        ('Ãº', 'ú'),
-        ('Ã‰', 'É'),
-        ('Ã"N', 'ÓN'),
-        ('Ã³n', 'ón')
-    ]
-    
-    result = text
-    for wrong, correct in replacements:
-        result = result.replace(wrong, correct)
-    
-    return result
+    return repair(text, 'fix_encoding_simple')
 
 def fix_database_encoding():
     """Fix encoding in existing MongoDB data"""
@@ -49,9 +32,13 @@ def fix_database_encoding():
         processed = 0
         batch_size = 100
         
+        metrics = RunMetrics('fix-encoding-simple')
+        writer = FixWriter(collection)
         cursor = collection.find({})
         
-        for doc in cursor:
+        metrics.start('clean')
+        for doc in metrics.timed('read', writer.documents(cursor), within='clean'):
+            metrics.count('documents')
             updates = {}
             
             # Fix main fields
@@ -106,13 +93,25 @@ def fix_database_encoding():
             
             # Apply updates if any
             if updates:
-                collection.update_one({'_id': doc['_id']}, {'$set': updates})
+                metrics.changed('fix_encoding_simple', updates)
+                writer.update(doc['_id'], updates)
             
             processed += 1
             if processed % batch_size == 0:
-                print(f"✅ Processed {processed}/{total_docs} documents...")
+                metrics.progress(f"✅ Processed {processed}/{total_docs} documents...")
+
+        writer.flush()
+        metrics.stop('clean')
+        metrics.add_writer(writer, within='clean')
+        
+        # Keep the stats, the facet cube and 'personas' in step with the fixed values
+        with metrics.stage('stats'):
+            writer.apply_stats(db)
+        with metrics.stage('personas'):
+            writer.apply_personas(db)
         
         print(f"\n🎉 Encoding fix complete! Processed {processed} documents")
+        metrics.finish()
         
         # Show sample of fixed data
         sample = collection.find_one()
@@ -2,44 +2,16 @@ import pymongo
 from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
-import html
-import re
+
+from repair_pipeline import FixWriter
+from run_metrics import RunMetrics
+from text_repair import repair
 
 load_dotenv()
 
 def fix_html_entities_and_corruption(text):
     """Fix HTML entities and text corruption"""
-    if not isinstance(text, str):
-        return text
-    
-    # Fix HTML entities
-    result = html.unescape(text)
-    
-    # Fix specific text corruption patterns
-    result = result.replace('&#xD;', '\n')
-    result = result.replace('&#xA;', '\n')
-    result = result.replace('&amp;', '&')
-    result = result.replace('&lt;', '<')
-    result = result.replace('&gt;', '>')
-    result = result.replace('&quot;', '"')
-    result = result.replace('&apos;', "'")
-    
-    # Fix specific OCR/encoding errors
-    result = result.replace(' ele ', ' de ')
-    result = result.replace('M Musco', 'el Museo')
-    result = result.replace("d' Art", "d'Art")
-    result = result.replace('ulteriores', 'posteriores')
-    result = result.replace('.Thyssen-Bornemisza', ' Thyssen-Bornemisza')
-    result = result.replace(" o' ", " o ")
-    result = result.replace('pruvisrn9', 'previstos')
-    result = result.replace('(le ', 'de ')
-    result = result.replace(' M ', ' el ')
-    
-    # Clean up extra whitespace
-    result = re.sub(r'\s+', ' ', result)
-    result = result.strip()
-    
-    return result
+    return repair(text, 'fix_html_entities_and_corruption')
 
 def fix_database_html_entities():
     try:
@@ -50,9 +22,13 @@ def fix_database_html_entities():
         print("🔧 Fixing HTML entities and text corruption...")
         
         updated = 0
+        metrics = RunMetrics('fix-html-entities')
+        writer = FixWriter(collection)
         cursor = collection.find({})
         
-        for doc in cursor:
+        metrics.start('clean')
+        for doc in metrics.timed('read', writer.documents(cursor), within='clean'):
+            metrics.count('documents')
             updates = {}
             
             # Fix nombre
@@ -61,7 +37,7 @@ def fix_database_html_entities():
                 if cleaned != doc['nombre']:
                     updates['nombre'] = cleaned
                     updated += 1
-                    print(f"Fixed nombre: {doc['nombre'][:50]}... -> {cleaned[:50]}...")
+                    metrics.log(f"Fixed nombre: {doc['nombre'][:50]}... -> {cleaned[:50]}...")
             
             # Fix estado
             if doc.get('estado'):
@@ -74,7 +50,7 @@ def fix_database_html_entities():
                 cleaned = fix_html_entities_and_corruption(doc['fines'])
                 if cleaned != doc['fines']:
                     updates['fines'] = cleaned
-                    print(f"Fixed fines for: {doc.get('nombre', 'Unknown')}")
+                    metrics.log(f"Fixed fines for: {doc.get('nombre', 'Unknown')}")
             
             # Fix direcciones
             if doc.get('direccionEstatutaria'):
@@ -126,12 +102,24 @@ def fix_database_html_entities():
             
             # Apply updates
             if updates:
-                collection.update_one({'_id': doc['_id']}, {'$set': updates})
+                metrics.changed('fix_html_entities_and_corruption', updates)
+                writer.update(doc['_id'], updates)
             
             if updated % 25 == 0 and updated > 0:
-                print(f"✅ Fixed {updated} documents...")
+                metrics.progress(f"✅ Fixed {updated} documents...")
+
+        writer.flush()
+        metrics.stop('clean')
+        metrics.add_writer(writer, within='clean')
+        
+        # Keep the stats, the facet cube and 'personas' in step with the fixed values
+        with metrics.stage('stats'):
+            writer.apply_stats(db)
+        with metrics.stage('personas'):
+            writer.apply_personas(db)
         
         print(f"🎉 HTML entities fix complete! Fixed {updated} documents")
+        metrics.finish(updated=updated)
         
         # Test results
         sample = collection.find_one({'fines': {'$regex': '&#xD;'}})
@@ -2,22 +2,17 @@ import pymongo
 from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
-import re
+
+from run_metrics import RunMetrics
+from text_repair import repair, trigger_pattern
+from repair_pipeline import FixWriter, field_filter, fix_projection
 
 load_dotenv()
 
 def clean_invisible_chars(text):
-    if not isinstance(text, str):
-        return text
-    
-    # Remove invisible and control characters, but keep normal spaces
-    # Keep characters that are letters, numbers, spaces, and common punctuation
-    cleaned = re.sub(r'[^\w\sÁÉÍÓÚáéíóúÑñ.,;:()\-¿?¡!/@#$%&*+=<>{}[\]\\|"\'`~]', '', text)
-    
-    # Remove extra spaces
-    cleaned = re.sub(r'\s+', ' ', cleaned).strip()
-    
-    return cleaned
+    # Remove invisible and control characters, but keep normal spaces,
+    # letters, numbers and common punctuation
+    return repair(text, 'clean_invisible_chars')
 
 def fix_invisible_characters():
     try:
@@ -28,9 +23,17 @@ def fix_invisible_characters():
         print("🔧 Removing invisible characters...")
         
         updated = 0
-        cursor = collection.find({})
+        metrics = RunMetrics('fix-invisible-chars')
+        writer = FixWriter(collection)
+        # Only documents with something to clean leave the server
+        fields = ['nombre', 'estado', 'fines', 'direccionEstatutaria.provincia', 'direccionEstatutaria.domicilio',
+                  'patronos.nombre', 'patronos.cargo', 'actividades.nombre']
+        cursor = collection.find(field_filter(fields, trigger_pattern('clean_invisible_chars')),
+                                 fix_projection(fields))
         
-        for doc in cursor:
+        metrics.start('clean')
+        for doc in metrics.timed('read', writer.documents(cursor), within='clean'):
+            metrics.count('documents')
             updates = {}
             
             # Fix nombre
@@ -39,7 +42,7 @@ def fix_invisible_characters():
                 if cleaned != doc['nombre'] and len(cleaned) > 0:
                     updates['nombre'] = cleaned
                     updated += 1
-                    print(f"Fixed: '{doc['nombre']}' -> '{cleaned}'")
+                    metrics.log(f"Fixed: '{doc['nombre']}' -> '{cleaned}'")
             
             # Fix estado
             if doc.get('estado'):
@@ -103,12 +106,24 @@ def fix_invisible_characters():
             
             # Apply updates
             if updates:
-                collection.update_one({'_id': doc['_id']}, {'$set': updates})
+                metrics.changed('clean_invisible_chars', updates)
+                writer.update(doc['_id'], updates)
             
             if updated % 50 == 0 and updated > 0:
-                print(f"✅ Cleaned {updated} documents...")
+                metrics.progress(f"✅ Cleaned {updated} documents...")
+
+        writer.flush()
+        metrics.stop('clean')
+        metrics.add_writer(writer, within='clean')
+        
+        # Keep the stats, the facet cube and 'personas' in step with the fixed values
+        with metrics.stage('stats'):
+            writer.apply_stats(db)
+        with metrics.stage('personas'):
+            writer.apply_personas(db)
         
         print(f"🎉 Invisible character cleanup complete! Cleaned {updated} documents")
+        metrics.finish(updated=updated)
         
         # Test results
         sample = collection.find_one({'nombre': {'$regex': 'MEDITERR'}})
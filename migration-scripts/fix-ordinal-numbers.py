@@ -2,45 +2,16 @@ import pymongo
 from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
-import re
+
+from repair_pipeline import FixWriter
+from run_metrics import RunMetrics
+from text_repair import repair
 
 load_dotenv()
 
 def fix_ordinal_numbers(text):
     """Fix ordinal number encoding issues"""
-    if not isinstance(text, str):
-        return text
-    
-    # Fix ordinal number patterns
-    result = text
-    result = result.replace('1Âº', '1º')
-    result = result.replace('2Âº', '2º')
-    result = result.replace('3Âº', '3º')
-    result = result.replace('4Âº', '4º')
-    result = result.replace('5Âº', '5º')
-    result = result.replace('6Âº', '6º')
-    result = result.replace('7Âº', '7º')
-    result = result.replace('8Âº', '8º')
-    result = result.replace('9Âº', '9º')
-    result = result.replace('0Âº', '0º')
-    
-    # Fix feminine ordinals
-    result = result.replace('1Âª', '1ª')
-    result = result.replace('2Âª', '2ª')
-    result = result.replace('3Âª', '3ª')
-    result = result.replace('4Âª', '4ª')
-    result = result.replace('5Âª', '5ª')
-    result = result.replace('6Âª', '6ª')
-    result = result.replace('7Âª', '7ª')
-    result = result.replace('8Âª', '8ª')
-    result = result.replace('9Âª', '9ª')
-    result = result.replace('0Âª', '0ª')
-    
-    # Fix standalone ordinal symbols
-    result = result.replace('Âº', 'º')
-    result = result.replace('Âª', 'ª')
-    
-    return result.strip()
+    return repair(text, 'fix_ordinal_numbers')
 
 def fix_database_ordinals():
     try:
@@ -50,6 +21,9 @@ def fix_database_ordinals():
         
         print("🔧 Fixing ordinal number encoding...")
         
+        metrics = RunMetrics('fix-ordinal-numbers')
+        writer = FixWriter(collection)
+        
         # Find documents with ordinal encoding issues
         cursor = collection.find({
             '$or': [
@@ -62,7 +36,9 @@ def fix_database_ordinals():
         
         updated = 0
         
-        for doc in cursor:
+        metrics.start('clean')
+        for doc in metrics.timed('read', writer.documents(cursor), within='clean'):
+            metrics.count('documents')
             updates = {}
             
             # Fix nombre
@@ -70,7 +46,7 @@ def fix_database_ordinals():
                 cleaned = fix_ordinal_numbers(doc['nombre'])
                 if cleaned != doc['nombre']:
                     updates['nombre'] = cleaned
-                    print(f"Fixed nombre: {doc['nombre']} -> {cleaned}")
+                    metrics.log(f"Fixed nombre: {doc['nombre']} -> {cleaned}")
                     updated += 1
             
             # Fix fines
@@ -86,7 +62,7 @@ def fix_database_ordinals():
                     cleaned = fix_ordinal_numbers(addr['domicilio'])
                     if cleaned != addr['domicilio']:
                         updates['direccionEstatutaria.domicilio'] = cleaned
-                        print(f"Fixed address: {addr['domicilio']} -> {cleaned}")
+                        metrics.log(f"Fixed address: {addr['domicilio']} -> {cleaned}")
                         
                 if addr.get('provincia') and ('Âº' in addr['provincia'] or 'Âª' in addr['provincia']):
                     cleaned = fix_ordinal_numbers(addr['provincia'])
@@ -100,7 +76,7 @@ def fix_database_ordinals():
                     cleaned = fix_ordinal_numbers(addr['domicilio'])
                     if cleaned != addr['domicilio']:
                         updates['direccionNotificacion.domicilio'] = cleaned
-                        print(f"Fixed notification address: {addr['domicilio']} -> {cleaned}")
+                        metrics.log(f"Fixed notification address: {addr['domicilio']} -> {cleaned}")
                         
                 if addr.get('localidad') and ('Âº' in addr['localidad'] or 'Âª' in addr['localidad']):
                     cleaned = fix_ordinal_numbers(addr['localidad'])
@@ -130,9 +106,21 @@ def fix_database_ordinals():
             
             # Apply updates
             if updates:
-                collection.update_one({'_id': doc['_id']}, {'$set': updates})
+                metrics.changed('fix_ordinal_numbers', updates)
+                writer.update(doc['_id'], updates)
+
+        writer.flush()
+        metrics.stop('clean')
+        metrics.add_writer(writer, within='clean')
+        
+        # Keep the stats, the facet cube and 'personas' in step with the fixed values
+        with metrics.stage('stats'):
+            writer.apply_stats(db)
+        with metrics.stage('personas'):
+            writer.apply_personas(db)
         
         print(f"🎉 Ordinal number fix complete! Fixed {updated} documents")
+        metrics.finish(updated=updated)
         
         # Verify no more ordinal issues remain
         remaining = collection.count_documents({
@@ -2,63 +2,16 @@ import pymongo
 from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
-import html
-import re
+
+from repair_pipeline import FixWriter
+from run_metrics import RunMetrics
+from text_repair import repair
 
 load_dotenv()
 
 def comprehensive_text_cleanup(text):
     """Comprehensive text cleanup for remaining HTML entities and corruption"""
-    if not isinstance(text, str):
-        return text
-    
-    # Fix HTML entities
-    result = html.unescape(text)
-    
-    # Fix remaining HTML entities that might not be caught
-    result = result.replace('&#xD;', '\n')
-    result = result.replace('&#xA;', '\n')
-    result = result.replace('&#x0D;', '\n')
-    result = result.replace('&#x0A;', '\n')
-    result = result.replace('&#13;', '\n')
-    result = result.replace('&#10;', '\n')
-    
-    # Fix text corruption patterns from the examples
-    result = result.replace(' ele ', ' de ')
-    result = result.replace('ele arte', 'de arte')
-    result = result.replace('M Musco', 'el Museo')
-    result = result.replace("d' Art", "d'Art")
-    result = result.replace('ulteriores', 'posteriores')
-    result = result.replace('.Thyssen-Bornemisza', ' Thyssen-Bornemisza')
-    result = result.replace(" o' ", " o ")
-    result = result.replace('pruvisrn9', 'previstos')
-    result = result.replace('(le ', 'de ')
-    result = result.replace(' (le ', ' de ')
-    result = result.replace('Musco', 'Museo')
-    result = result.replace('Museoâ', 'Museo')
-    result = result.replace('encada', 'en cada')
-    result = result.replace('criterior', 'criterios')
-    result = result.replace('2Âº', '2º')
-    result = result.replace('Âº', 'º')
-    result = result.replace('Â¡', '¡')
-    
-    # Fix specific character issues
-    result = result.replace('MÁšSICA', 'MÚSICA')
-    result = result.replace('NÁšÑEZ', 'NÚÑEZ')
-    result = result.replace('SÁšBITO', 'SÚBITO')
-    result = result.replace('COMÁšN', 'COMÚN')
-    result = result.replace('SANLÁšCAR', 'SANLÚCAR')
-    result = result.replace('ARGÁœELLO', 'ARGÜELLO')
-    result = result.replace('PAILÁš', 'PAILÁ')
-    result = result.replace('RAÁšL', 'RAÚL')
-    result = result.replace('CLÍNICA', 'CLÍNICA')
-    
-    # Clean up multiple whitespace and normalize line breaks
-    result = re.sub(r'\s*\n\s*', '\n', result)  # Clean up line breaks
-    result = re.sub(r'\s+', ' ', result)        # Multiple spaces to single space
-    result = result.strip()
-    
-    return result
+    return repair(text, 'comprehensive_text_cleanup')
 
 def fix_remaining_entities():
     try:
@@ -68,6 +21,9 @@ def fix_remaining_entities():
         
         print("🔧 Fixing remaining HTML entities and text corruption...")
         
+        metrics = RunMetrics('fix-remaining-entities')
+        writer = FixWriter(collection)
+        
         # Find documents with &#xD; or other HTML entities
         cursor = collection.find({
             '$or': [
@@ -89,7 +45,9 @@ def fix_remaining_entities():
         
         updated = 0
         
-        for doc in cursor:
+        metrics.start('clean')
+        for doc in metrics.timed('read', writer.documents(cursor), within='clean'):
+            metrics.count('documents')
             updates = {}
             
             # Fix nombre
@@ -97,7 +55,7 @@ def fix_remaining_entities():
                 cleaned = comprehensive_text_cleanup(doc['nombre'])
                 if cleaned != doc['nombre']:
                     updates['nombre'] = cleaned
-                    print(f"Fixed nombre: {doc['nombre']} -> {cleaned}")
+                    metrics.log(f"Fixed nombre: {doc['nombre']} -> {cleaned}")
                     updated += 1
             
             # Fix estado
@@ -111,7 +69,7 @@ def fix_remaining_entities():
                 cleaned = comprehensive_text_cleanup(doc['fines'])
                 if cleaned != doc['fines']:
                     updates['fines'] = cleaned
-                    print(f"Fixed fines for: {doc.get('nombre', 'Unknown')}")
+                    metrics.log(f"Fixed fines for: {doc.get('nombre', 'Unknown')}")
             
             # Fix direcciones
             if doc.get('direccionEstatutaria'):
@@ -163,9 +121,21 @@ def fix_remaining_entities():
             
             # Apply updates
             if updates:
-                collection.update_one({'_id': doc['_id']}, {'$set': updates})
+                metrics.changed('comprehensive_text_cleanup', updates)
+                writer.update(doc['_id'], updates)
+
+        writer.flush()
+        metrics.stop('clean')
+        metrics.add_writer(writer, within='clean')
+        
+        # Keep the stats, the facet cube and 'personas' in step with the fixed values
+        with metrics.stage('stats'):
+            writer.apply_stats(db)
+        with metrics.stage('personas'):
+            writer.apply_personas(db)
         
         print(f"🎉 Remaining HTML entities fix complete! Fixed {updated} documents")
+        metrics.finish(updated=updated)
         
         # Verify no more HTML entities remain
         remaining = collection.count_documents({
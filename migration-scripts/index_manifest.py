@@ -0,0 +1,33 @@
+"""The fundaciones indexes, declared once for every loader
+
+The manifest is the JSON file the Next.js restore route imports too, so the
+Python loaders and the API build exactly the same set. Loaders insert into
+an index-less collection first and call build_indexes() at the end, which
+sends all of them in one createIndexes command.
+"""
+import json
+import os
+
+from pymongo import IndexModel
+
+MANIFEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                             'fundaciones-frontend', 'src', 'lib', 'fundaciones-indexes.json')
+
+
+def load_manifest(path=MANIFEST_PATH):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def index_models(manifest=None):
+    manifest = manifest or load_manifest()
+    return [IndexModel(list(index['keys'].items()), **index.get('options', {}))
+            for index in manifest['indexes']]
+
+
+def build_indexes(collection, manifest=None):
+    """Create every index of the manifest on the collection; returns their names"""
+    models = index_models(manifest)
+    names = collection.create_indexes(models)
+    print(f"🔧 {len(names)} indexes ready on '{collection.name}': {', '.join(names)}")
+    return names
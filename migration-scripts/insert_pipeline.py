@@ -0,0 +1,122 @@
+"""Overlapped build/insert for the Excel loaders
+
+The loaders used to build a batch of documents, wait for insert_many to come
+back, then build the next one, so either Python or the connection was idle at
+any time. PipelinedInserter puts a bounded queue between the two: the caller
+keeps building batches while writer threads send the previous ones, each on
+its own connection checked out of the client's pool. When the writers fall
+behind the queue fills up and submit() blocks (backpressure), so memory stays
+at about queue_size batches and the load takes about max(build, write).
+
+Batches may finish out of order with several writers. on_batch is still
+called in submission order, once every earlier batch is in, so a checkpoint
+never records rows that are not committed yet.
+
+With a batcher (see batch_sizing.py), the write time of each batch is fed
+back to it so the builder's next batches are sized for the measured latency.
+"""
+import queue
+import threading
+import time
+
+from migration_checkpoint import insert_batch
+
+_DONE = object()
+
+
+class PipelinedInserter:
+    """Insert batches of documents from writer threads while the caller builds more
+
+    on_batch(rows_done, inserted) runs after each batch, in submission order.
+    """
+
+    def __init__(self, collection, writers=1, queue_size=None, on_batch=None, batcher=None):
+        self.collection = collection
+        self.on_batch = on_batch
+        self.batcher = batcher
+        self.queue = queue.Queue(maxsize=queue_size or 2 * writers)
+        self.lock = threading.Lock()
+        self.error = None
+        self.submitted = 0
+        self.inserted = 0
+        self.bytes_sent = 0
+        self.build_blocked = 0.0
+        self.write_time = 0.0
+        self._finished = {}
+        self._next = 0
+        self._threads = [threading.Thread(target=self._writer, name=f'writer-{i + 1}', daemon=True)
+                         for i in range(writers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, rows_done, documents, nbytes=0):
+        """Queue one batch of nbytes encoded bytes; blocks while the queue is full"""
+        started = time.perf_counter()
+        while True:
+            self._raise_error()
+            try:
+                self.queue.put((self.submitted, rows_done, documents, nbytes), timeout=0.5)
+                break
+            except queue.Full:
+                continue
+        self.build_blocked += time.perf_counter() - started
+        self.submitted += 1
+
+    def close(self):
+        """Wait for every queued batch; re-raises the first writer error"""
+        for _ in self._threads:
+            self.queue.put(_DONE)
+        for thread in self._threads:
+            thread.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def _writer(self):
+        while True:
+            item = self.queue.get()
+            if item is _DONE:
+                return
+            if self.error is not None:
+                # Keep draining so the builder never blocks on a dead pipeline
+                continue
+            seq, rows_done, documents, nbytes = item
+            try:
+                started = time.perf_counter()
+                inserted = insert_batch(self.collection, documents)
+                elapsed = time.perf_counter() - started
+                if self.batcher:
+                    self.batcher.record(nbytes, elapsed)
+                with self.lock:
+                    self.write_time += elapsed
+                    self.inserted += inserted
+                    self.bytes_sent += nbytes
+                    self._finished[seq] = (rows_done, inserted)
+                    self._report()
+            except Exception as e:
+                with self.lock:
+                    if self.error is None:
+                        self.error = e
+
+    def _report(self):
+        """Call on_batch for the batches whose predecessors are all in (lock held)"""
+        while self._next in self._finished:
+            rows_done, inserted = self._finished.pop(self._next)
+            self._next += 1
+            if self.on_batch:
+                self.on_batch(rows_done, inserted)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Abandon the queued batches: the checkpoint only has what finished
+            with self.lock:
+                self.error = self.error or exc
+            for _ in self._threads:
+                self.queue.put(_DONE)
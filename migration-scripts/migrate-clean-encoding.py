@@ -7,6 +7,17 @@ import os
 from dotenv import load_dotenv
 import sys
 import codecs
+import argparse
+
+from collection_sync import content_hash, sync_documents
+from index_manifest import build_indexes
+from sheet_cache import read_sheet
+from run_metrics import RunMetrics
+from collection_stats import StatsAccumulator, save_stats
+from facet_cube import save_facets
+from personas import rebuild_personas
+from date_fields import ORIGINALS_FIELD, DateReport, date_values
+from search_keys import add_search_keys
 
 load_dotenv()
 
@@ -38,16 +49,17 @@ def clean_text(text):
     
     return text.strip() if text else None
 
-def restructure_foundation_data(row):
+def restructure_foundation_data(row, dates=None):
     """Restructure flat Excel data into nested MongoDB document with clean encoding"""
+    originals = {}
     foundation = {
         '_id': int(row['@_idfundacion']),
         'nombre': clean_text(row.get('Nombre')),
         'numRegistro': clean_text(row.get('NumRegistro')),
-        'fechaConstitucion': row.get('FechaConstitucion') if pd.notna(row.get('FechaConstitucion')) else None,
-        'fechaInscripcion': row.get('FechaInscripcion') if pd.notna(row.get('FechaInscripcion')) else None,
+        **date_values(row.get('FechaConstitucion'), 'fechaConstitucion', dates, originals),
+        **date_values(row.get('FechaInscripcion'), 'fechaInscripcion', dates, originals),
         'nif': row.get('NIFFundacion') if pd.notna(row.get('NIFFundacion')) else None,
-        'fechaExtincion': row.get('FechaExtincion') if pd.notna(row.get('FechaExtincion')) else None,
+        **date_values(row.get('FechaExtincion'), 'fechaExtincion', dates, originals),
         'estado': clean_text(row.get('EstadoFundacion')),
         'fines': clean_text(row.get('Fines')),
         
@@ -145,6 +157,13 @@ def restructure_foundation_data(row):
                 'nombre': clean_text(row.get(f'Organos/Organo/{i}/NombreOrgano'))
             })
     
+    # Unparseable dates keep their text
+    if originals:
+        foundation[ORIGINALS_FIELD] = originals
+    
+    # Normalized search keys
+    add_search_keys(foundation)
+    
     # Add metadata
     foundation['metadata'] = {
         'fechaActualizacion': datetime.now(),
@@ -155,20 +174,19 @@ def restructure_foundation_data(row):
     
     return foundation
 
-def migrate_excel_to_mongodb_clean():
-    """Main migration function with clean encoding"""
+def migrate_excel_to_mongodb_clean(sync=False):
+    """Main migration function with clean encoding
+
+    With sync, the collection is not dropped: only new, changed and removed
+    foundations are written (see collection_sync.py).
+    """
+    metrics = RunMetrics('migrate-clean-encoding')
     try:
         # MongoDB connection
         mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
         client = MongoClient(mongodb_uri)
         db_name = os.getenv('MONGODB_DB_NAME', 'fundaciones_espana')
         db = client[db_name]
-        
-        # Drop existing collection
-        if 'fundaciones' in db.list_collection_names():
-            print("⚠️  Dropping existing 'fundaciones' collection...")
-            db.fundaciones.drop()
-        
         collection = db.fundaciones
         
         # Read Excel file
@@ -176,61 +194,94 @@ def migrate_excel_to_mongodb_clean():
         file_path = "/Users/paulo/Documents/Proyectos/Trabajo/Captaru/Datos Subvenciones/BBDD de fundaciones España actualizada 040724.xls"
         
         # Read Excel file - try different approaches
-        try:
-            df = pd.read_excel(file_path, engine='xlrd')
-            print(f"✅ Successfully read Excel with xlrd engine")
-        except Exception as e:
-            print(f"❌ Failed with xlrd: {e}")
+        with metrics.stage('read'):
             try:
-                df = pd.read_excel(file_path, engine='openpyxl')
-                print(f"✅ Successfully read Excel with openpyxl engine")
-            except Exception as e2:
-                print(f"❌ Failed with openpyxl: {e2}")
-                return
+                df = read_sheet(file_path, engine='xlrd')
+                print(f"✅ Successfully read Excel with xlrd engine")
+            except Exception as e:
+                print(f"❌ Failed with xlrd: {e}")
+                try:
+                    df = read_sheet(file_path, engine='openpyxl')
+                    print(f"✅ Successfully read Excel with openpyxl engine")
+                except Exception as e2:
+                    print(f"❌ Failed with openpyxl: {e2}")
+                    return
         
         print(f"📊 Found {len(df)} foundations to migrate with clean encoding")
         
-        # Process and insert documents
-        documents = []
         errors = []
+        restructure = metrics.wrap('build', restructure_foundation_data)
+        stats = StatsAccumulator()
+        dates = DateReport()
         
-        for index, row in df.iterrows():
-            try:
-                doc = restructure_foundation_data(row)
+        def build_documents():
+            for index, row in df.iterrows():
+                try:
+                    doc = restructure(row, dates)
+                except Exception as e:
+                    errors.append({
+                        'index': index,
+                        'id': row.get('@_idfundacion', 'unknown'),
+                        'error': str(e)
+                    })
+                    print(f"❌ Error processing row {index}: {e}")
+                    continue
+                stats.add(doc)
+                yield index, doc
+        
+        if sync:
+            # Compare content hashes and write only the differences
+            print("🔄 Syncing changes into 'fundaciones'...")
+            with metrics.stage('sync'):
+                changes = sync_documents(collection, (doc for _, doc in build_documents()))
+            metrics.count('documents', changes['inserted'] + changes['updated'] + changes['unchanged'])
+            print(f"  New: {changes['inserted']}, changed: {changes['updated']}, "
+                  f"unchanged: {changes['unchanged']}, deleted: {changes['deleted']}")
+        else:
+            # Drop existing collection
+            if 'fundaciones' in db.list_collection_names():
+                print("⚠️  Dropping existing 'fundaciones' collection...")
+                db.fundaciones.drop()
+            
+            # Process and insert documents
+            documents = []
+            insert_many = metrics.wrap('write', collection.insert_many)
+            
+            for index, doc in build_documents():
+                # Stored so that a later --sync can tell what changed
+                doc['contentHash'] = content_hash(doc)
                 documents.append(doc)
                 
                 # Insert in batches of 1000
                 if len(documents) >= 1000:
-                    collection.insert_many(documents)
-                    print(f"✅ Inserted {len(documents)} documents with clean encoding (total: {index + 1}/{len(df)})")
+                    insert_many(documents)
+                    metrics.count('documents', len(documents))
+                    metrics.progress(f"✅ Inserted documents with clean encoding up to {index + 1}/{len(df)}")
                     documents = []
-                    
-            except Exception as e:
-                errors.append({
-                    'index': index,
-                    'id': row.get('@_idfundacion', 'unknown'),
-                    'error': str(e)
-                })
-                print(f"❌ Error processing row {index}: {e}")
-        
-        # Insert remaining documents
-        if documents:
-            collection.insert_many(documents)
-            print(f"✅ Inserted final {len(documents)} documents with clean encoding")
+            
+            # Insert remaining documents
+            if documents:
+                insert_many(documents)
+                metrics.count('documents', len(documents))
+                print(f"✅ Inserted final {len(documents)} documents with clean encoding")
         
         # Create indexes
         print("\n🔧 Creating indexes...")
-        collection.create_index('nombre')
-        collection.create_index('nif')
-        collection.create_index('estado')
-        collection.create_index('direccionEstatutaria.provincia')
-        collection.create_index([('nombre', pymongo.TEXT), ('fines', pymongo.TEXT)])
+        with metrics.stage('index'):
+            build_indexes(collection)
+        with metrics.stage('stats'):
+            save_stats(db, stats, 'sync' if sync else 'load')
+            save_facets(db, stats, 'sync' if sync else 'load')
+        with metrics.stage('personas'):
+            rebuild_personas(db, collection)
         
         # Summary
         total_docs = collection.count_documents({})
         print(f"\n✅ Clean migration complete!")
         print(f"📊 Total documents in MongoDB: {total_docs}")
         print(f"❌ Errors encountered: {len(errors)}")
+        dates.print_summary()
+        metrics.finish(errors=len(errors), sync=sync, dates=dates.report())
         
         if errors:
             with open('migration-scripts/migration_errors_clean.json', 'w', encoding='utf-8') as f:
@@ -256,5 +307,10 @@ def migrate_excel_to_mongodb_clean():
         sys.exit(1)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Migrate the registry Excel file to MongoDB with clean encoding')
+    parser.add_argument('--sync', action='store_true',
+                        help='Write only new, changed and removed foundations instead of dropping the collection')
+    args = parser.parse_args()
+
     print("🚀 Starting clean Excel to MongoDB migration...")
-    migrate_excel_to_mongodb_clean()
\ No newline at end of file
+    migrate_excel_to_mongodb_clean(sync=args.sync)
\ No newline at end of file
@@ -7,35 +7,33 @@ import os
 from dotenv import load_dotenv
 import sys
 import html
+import argparse
+
+from columnar_builder import build_registry_documents, used_columns
+from date_fields import ORIGINALS_FIELD, DateReport, date_values
+from search_keys import add_search_keys
+from excel_stream import ExcelStream, peak_rss_mb
+from migration_checkpoint import Checkpoint, source_fingerprint
+from collection_swap import staging_name, promote
+from collection_sync import content_hash, sync_documents
+from index_manifest import build_indexes
+from insert_pipeline import PipelinedInserter
+from batch_sizing import AdaptiveBatcher
+from run_metrics import RunMetrics
+from collection_stats import StatsAccumulator, compute_stats, save_stats
+from facet_cube import save_facets
+from personas import rebuild_personas
+from sheet_cache import read_sheet
+
+from text_repair import repair
 
 load_dotenv()
 
+FUENTE_DATOS = 'BBDD de fundaciones España actualizada 040724.xls'
+
 def fix_encoding(text):
     """Fix encoding issues in text"""
-    if not isinstance(text, str):
-        return text
-    
-    # Common encoding fixes
-    fixes = {
-        'Ã¡': 'á', 'Ã©': 'é', 'Ã­': 'í', 'Ã³': 'ó', 'Ãº': 'ú',
-        'Ã ': 'à', 'Ã¨': 'è', 'Ã¬': 'ì', 'Ã²': 'ò', 'Ã¹': 'ù',
-        'Ã¢': 'â', 'Ãª': 'ê', 'Ã®': 'î', 'Ã´': 'ô', 'Ã»': 'û',
-        'Ã': 'Á', 'Ã‰': 'É', 'ÃÃ': 'Í', 'Ã"': 'Ó', 'Ãš': 'Ú',
-        'Ã€': 'À', 'Ãˆ': 'È', 'ÃŒ': 'Ì', 'Ã™': 'Ù',
-        'Ã‚': 'Â', 'ÃŠ': 'Ê', 'ÃŽ': 'Î', 'Ã"': 'Ô', 'Ã›': 'Û',
-        'Ã±': 'ñ', 'Ã'': 'Ñ',
-        'Ã§': 'ç', 'Ã‡': 'Ç',
-        'Ã¼': 'ü', 'Ãœ': 'Ü',
-        'Ã¤': 'ä', 'Ã„': 'Ä',
-        'Ã¶': 'ö', 'Ã–': 'Ö',
-        'Ã"N': 'ÓN', 'Ã³n': 'ón'
-    }
-    
-    result = text
-    for wrong, correct in fixes.items():
-        result = result.replace(wrong, correct)
-    
-    return result
+    return repair(text, 'fix_encoding')
 
 def clean_data_for_mongodb(data):
     """Clean data for MongoDB insertion"""
@@ -55,16 +53,17 @@ def clean_data_for_mongodb(data):
         cleaned[clean_key] = value
     return cleaned
 
-def restructure_foundation_data(row):
+def restructure_foundation_data(row, dates=None):
     """Restructure flat Excel data into nested MongoDB document"""
+    originals = {}
     foundation = {
         '_id': int(row['@_idfundacion']),
         'nombre': fix_encoding(row['Nombre']) if pd.notna(row['Nombre']) else None,
         'numRegistro': fix_encoding(row['NumRegistro']) if pd.notna(row['NumRegistro']) else None,
-        'fechaConstitucion': row['FechaConstitucion'] if pd.notna(row['FechaConstitucion']) else None,
-        'fechaInscripcion': row['FechaInscripcion'] if pd.notna(row['FechaInscripcion']) else None,
+        **date_values(row['FechaConstitucion'], 'fechaConstitucion', dates, originals),
+        **date_values(row['FechaInscripcion'], 'fechaInscripcion', dates, originals),
         'nif': row['NIFFundacion'] if pd.notna(row['NIFFundacion']) else None,
-        'fechaExtincion': row['FechaExtincion'] if pd.notna(row['FechaExtincion']) else None,
+        **date_values(row['FechaExtincion'], 'fechaExtincion', dates, originals),
         'estado': fix_encoding(row['EstadoFundacion']) if pd.notna(row['EstadoFundacion']) else None,
         'fines': fix_encoding(row['Fines']) if pd.notna(row['Fines']) else None,
         
@@ -162,17 +161,41 @@ def restructure_foundation_data(row):
                 'nombre': fix_encoding(row.get(f'Organos/Organo/{i}/NombreOrgano'))
             })
     
+    # Unparseable dates keep their text
+    if originals:
+        foundation[ORIGINALS_FIELD] = originals
+    
+    # Normalized search keys
+    add_search_keys(foundation)
+    
     # Add metadata
     foundation['metadata'] = {
         'fechaActualizacion': datetime.now(),
-        'fuenteDatos': 'BBDD de fundaciones España actualizada 040724.xls',
+        'fuenteDatos': FUENTE_DATOS,
         'encodingFixed': True
     }
     
     return foundation
 
-def migrate_excel_to_mongodb():
-    """Main migration function"""
+def migrate_excel_to_mongodb(resume=False, sync=False, blue_green=False, chunk_size=None, writers=1):
+    """Main migration function
+
+    With resume, an unfinished run of the same Excel data continues after its
+    last committed batch instead of dropping the collection. With sync, the
+    collection is not dropped at all: only new, changed and removed
+    foundations are written (see collection_sync.py). With blue_green,
+    the load and the indexes go to 'fundaciones_staging', which then replaces
+    'fundaciones' in one rename (see collection_swap.py). With chunk_size, the
+    sheet is streamed in blocks of that many rows instead of loaded whole.
+    Batches are inserted by `writers` threads while the next ones are built
+    (see insert_pipeline.py). Stage timings go to a run report (see
+    run_metrics.py). The figures of /api/fundaciones/stats are counted on
+    the way and saved to 'fundaciones_stats' (see collection_stats.py).
+    """
+    if sync and blue_green:
+        raise ValueError("--sync writes in place and cannot be combined with --blue-green")
+    metrics = RunMetrics('migrate-to-mongodb-fixed')
+    clean = metrics.wrap('clean', fix_encoding)
     try:
         # MongoDB connection
         mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
@@ -180,70 +203,134 @@ def migrate_excel_to_mongodb():
         db_name = os.getenv('MONGODB_DB_NAME', 'fundaciones_espana')
         db = client[db_name]
         
-        # Drop existing collection
-        if 'fundaciones' in db.list_collection_names():
-            print("⚠️  Dropping existing 'fundaciones' collection...")
-            db.fundaciones.drop()
-        
-        collection = db.fundaciones
-        
         # Read Excel file with different encodings
         print("📖 Reading Excel file with encoding fixes...")
         file_path = "/Users/paulo/Documents/Proyectos/Trabajo/Captaru/Datos Subvenciones/BBDD de fundaciones España actualizada 040724.xls"
+        errors = []
+        dates = DateReport()
         
-        try:
-            # Try reading with different engines and options
-            df = pd.read_excel(file_path, engine='xlrd')
-        except:
-            try:
-                df = pd.read_excel(file_path, engine='openpyxl')
-            except Exception as e:
-                print(f"❌ Error reading Excel file: {e}")
-                return
-        
-        print(f"📊 Found {len(df)} foundations to migrate with encoding fixes")
+        if chunk_size:
+            # Row blocks with only the columns the builder reads
+            with metrics.stage('read'):
+                stream = ExcelStream(file_path)
+            usecols = used_columns(build_registry_documents, stream.header, fix_encoding, errors, FUENTE_DATOS)
+            fingerprint, total_rows = stream.fingerprint, stream.row_count
+            print(f"📊 Streaming {total_rows} rows in blocks of {chunk_size} ({len(usecols)}/{len(stream.header)} columns)")
+            
+            def build_from(skip):
+                for chunk in stream.chunks(chunk_size, usecols=usecols, skip_rows=skip):
+                    yield from build_registry_documents(chunk, clean, errors, FUENTE_DATOS, dates=dates)
+        else:
+            with metrics.stage('read'):
+                try:
+                    # Try reading with different engines and options
+                    df = read_sheet(file_path, engine='xlrd')
+                except:
+                    try:
+                        df = read_sheet(file_path, engine='openpyxl')
+                    except Exception as e:
+                        print(f"❌ Error reading Excel file: {e}")
+                        return
+            
+            print(f"📊 Found {len(df)} foundations to migrate with encoding fixes")
+            fingerprint, total_rows = source_fingerprint(df), len(df)
+            
+            def build_from(skip):
+                return build_registry_documents(df.iloc[skip:], clean, errors, FUENTE_DATOS, dates=dates)
         
-        # Process and insert documents
-        documents = []
-        errors = []
+        target = staging_name('fundaciones') if blue_green else 'fundaciones'
+        collection = db[target]
+        checkpoint = None
+        stats = StatsAccumulator()
+        count_stats = metrics.wrap('stats', stats.add)
         
-        for index, row in df.iterrows():
-            try:
-                doc = restructure_foundation_data(row)
-                documents.append(doc)
+        if sync:
+            # Compare content hashes and write only the differences
+            print("🔄 Syncing changes into 'fundaciones'...")
+            def counted(documents):
+                for _, doc in documents:
+                    count_stats(doc)
+                    yield doc
+            
+            with metrics.stage('sync'):
+                changes = sync_documents(collection, counted(metrics.timed('build', build_from(0))))
+            metrics.count('documents', changes['inserted'] + changes['updated'] + changes['unchanged'])
+            print(f"  New: {changes['inserted']}, changed: {changes['updated']}, "
+                  f"unchanged: {changes['unchanged']}, deleted: {changes['deleted']}")
+        else:
+            checkpoint = Checkpoint(db, target, fingerprint)
+            rows_done = checkpoint.resume_point() if resume else None
+            if rows_done is None:
+                # Drop existing collection
+                if target in db.list_collection_names():
+                    print(f"⚠️  Dropping existing '{target}' collection...")
+                    db[target].drop()
+                checkpoint.start(total_rows)
+                rows_done = 0
+            else:
+                print(f"⏩ Resuming after {rows_done}/{total_rows or '?'} committed rows")
+            
+            def on_batch(rows, inserted):
+                checkpoint.save(rows, inserted)
+                metrics.progress(f"✅ Inserted documents with fixed encoding up to row {rows}/{total_rows or '?'}")
+            
+            # Process and insert documents (column-wise builder, same documents
+            # as restructure_foundation_data() row by row) while the writer
+            # threads send the previous batches
+            batcher = AdaptiveBatcher()
+            add = metrics.wrap('encode', batcher.add)
+            hash_document = metrics.wrap('hash', content_hash)
+            
+            with PipelinedInserter(collection, writers=writers, on_batch=on_batch, batcher=batcher) as inserter:
+                for index, doc in metrics.timed('build', build_from(rows_done)):
+                    # Stored so that a later --sync can tell what changed
+                    doc['contentHash'] = hash_document(doc)
+                    count_stats(doc)
+                    # Insert in batches sized by encoded bytes, checkpointing after each one
+                    if add(doc):
+                        inserter.submit(index + 1, *batcher.take())
                 
-                # Insert in batches of 1000
-                if len(documents) >= 1000:
-                    collection.insert_many(documents)
-                    print(f"✅ Inserted {len(documents)} documents with fixed encoding (total: {index + 1}/{len(df)})")
-                    documents = []
-                    
-            except Exception as e:
-                errors.append({
-                    'index': index,
-                    'id': row['@_idfundacion'],
-                    'error': str(e)
-                })
-                print(f"❌ Error processing row {index}: {e}")
-        
-        # Insert remaining documents
-        if documents:
-            collection.insert_many(documents)
-            print(f"✅ Inserted final {len(documents)} documents with fixed encoding")
+                # Insert remaining documents
+                if batcher.documents:
+                    inserter.submit(index + 1, *batcher.take())
+            # Writer threads run alongside the builder: these overlap with 'build'
+            metrics.add_time('write', inserter.write_time)
+            metrics.add_time('queue_wait', inserter.build_blocked)
+            metrics.count('documents', inserter.inserted)
+            metrics.count('bytes_sent', inserter.bytes_sent)
+            print(f"📦 {batcher.summary()}")
         
         # Create indexes
         print("\n🔧 Creating indexes...")
-        collection.create_index('nombre')
-        collection.create_index('nif')
-        collection.create_index('estado')
-        collection.create_index('direccionEstatutaria.provincia')
-        collection.create_index([('nombre', pymongo.TEXT), ('fines', pymongo.TEXT)])
+        with metrics.stage('index'):
+            build_indexes(collection)
+        if checkpoint:
+            checkpoint.complete()
+        
+        if target != 'fundaciones':
+            promote(db)
+            collection = db.fundaciones
+        
+        # A resumed run only counted the rows it built: count from the collection instead
+        with metrics.stage('stats'):
+            if stats.total == collection.estimated_document_count():
+                save_stats(db, stats, 'sync' if sync else 'load')
+                save_facets(db, stats, 'sync' if sync else 'load')
+            else:
+                stats = compute_stats(collection)
+                save_stats(db, stats, 'recount')
+                save_facets(db, stats, 'recount')
+        with metrics.stage('personas'):
+            rebuild_personas(db, collection)
         
         # Summary
         total_docs = collection.count_documents({})
         print(f"\n✅ Migration complete with encoding fixes!")
         print(f"📊 Total documents in MongoDB: {total_docs}")
         print(f"❌ Errors encountered: {len(errors)}")
+        print(f"🧠 Peak memory: {peak_rss_mb():.0f} MB")
+        dates.print_summary()
+        metrics.finish(errors=len(errors), sync=sync, writers=writers, peakMemoryMB=round(peak_rss_mb()), dates=dates.report())
         
         if errors:
             with open('migration-scripts/migration_errors_fixed.json', 'w', encoding='utf-8') as f:
@@ -263,5 +350,20 @@ def migrate_excel_to_mongodb():
         sys.exit(1)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Migrate the registry Excel file to MongoDB')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue an interrupted migration of the same file instead of starting over')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--sync', action='store_true',
+                      help='Write only new, changed and removed foundations instead of dropping the collection')
+    mode.add_argument('--blue-green', action='store_true',
+                      help="Load into 'fundaciones_staging' and swap it in when complete (keeps the old data)")
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='Stream the Excel file in blocks of N rows (bounded memory) instead of loading it whole')
+    parser.add_argument('--writers', type=int, default=1,
+                        help='Insert batches from N threads while the next ones are built (default: 1)')
+    args = parser.parse_args()
+
     print("🚀 Starting Excel to MongoDB migration with encoding fixes...")
-    migrate_excel_to_mongodb()
\ No newline at end of file
+    migrate_excel_to_mongodb(resume=args.resume, sync=args.sync, blue_green=args.blue_green,
+                             chunk_size=args.chunk_size, writers=args.writers)
\ No newline at end of file
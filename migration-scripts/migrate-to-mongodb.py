@@ -7,6 +7,15 @@ import os
 from dotenv import load_dotenv
 import sys
 
+from index_manifest import build_indexes
+from sheet_cache import read_sheet
+from run_metrics import RunMetrics
+from collection_stats import StatsAccumulator, save_stats
+from facet_cube import save_facets
+from personas import rebuild_personas
+from date_fields import ORIGINALS_FIELD, DateReport, date_values
+from search_keys import add_search_keys
+
 load_dotenv()
 
 def clean_data_for_mongodb(data):
@@ -25,16 +34,17 @@ def clean_data_for_mongodb(data):
         cleaned[clean_key] = value
     return cleaned
 
-def restructure_foundation_data(row):
+def restructure_foundation_data(row, dates=None):
     """Restructure flat Excel data into nested MongoDB document"""
+    originals = {}
     foundation = {
         '_id': int(row['@_idfundacion']),
         'nombre': row['Nombre'],
         'numRegistro': row['NumRegistro'],
-        'fechaConstitucion': row['FechaConstitucion'],
-        'fechaInscripcion': row['FechaInscripcion'],
+        **date_values(row['FechaConstitucion'], 'fechaConstitucion', dates, originals),
+        **date_values(row['FechaInscripcion'], 'fechaInscripcion', dates, originals),
         'nif': row['NIFFundacion'],
-        'fechaExtincion': row['FechaExtincion'] if pd.notna(row['FechaExtincion']) else None,
+        **date_values(row['FechaExtincion'], 'fechaExtincion', dates, originals),
         'estado': row['EstadoFundacion'],
         'fines': row['Fines'] if pd.notna(row['Fines']) else None,
         
@@ -132,6 +142,13 @@ def restructure_foundation_data(row):
                 'nombre': row.get(f'Organos/Organo/{i}/NombreOrgano')
             })
     
+    # Unparseable dates keep their text
+    if originals:
+        foundation[ORIGINALS_FIELD] = originals
+    
+    # Normalized search keys
+    add_search_keys(foundation)
+    
     # Add metadata
     foundation['metadata'] = {
         'fechaActualizacion': datetime.now(),
@@ -142,6 +159,7 @@ def restructure_foundation_data(row):
 
 def migrate_excel_to_mongodb():
     """Main migration function"""
+    metrics = RunMetrics('migrate-to-mongodb')
     try:
         # MongoDB connection
         mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/fundaciones_espana')
@@ -159,23 +177,30 @@ def migrate_excel_to_mongodb():
         # Read Excel file
         print("📖 Reading Excel file...")
         file_path = "/Users/paulo/Documents/Proyectos/Trabajo/Captaru/Datos Subvenciones/BBDD de fundaciones España actualizada 040724.xls"
-        df = pd.read_excel(file_path)
+        with metrics.stage('read'):
+            df = read_sheet(file_path)
         
         print(f"📊 Found {len(df)} foundations to migrate")
         
         # Process and insert documents
         documents = []
         errors = []
+        restructure = metrics.wrap('build', restructure_foundation_data)
+        insert_many = metrics.wrap('write', collection.insert_many)
+        stats = StatsAccumulator()
+        dates = DateReport()
         
         for index, row in df.iterrows():
             try:
-                doc = restructure_foundation_data(row)
+                doc = restructure(row, dates)
+                stats.add(doc)
                 documents.append(doc)
                 
                 # Insert in batches of 1000
                 if len(documents) >= 1000:
-                    collection.insert_many(documents)
-                    print(f"✅ Inserted {len(documents)} documents (total: {index + 1}/{len(df)})")
+                    insert_many(documents)
+                    metrics.count('documents', len(documents))
+                    metrics.progress(f"✅ Inserted documents up to {index + 1}/{len(df)}")
                     documents = []
                     
             except Exception as e:
@@ -188,22 +213,27 @@ def migrate_excel_to_mongodb():
         
         # Insert remaining documents
         if documents:
-            collection.insert_many(documents)
+            insert_many(documents)
+            metrics.count('documents', len(documents))
             print(f"✅ Inserted final {len(documents)} documents")
         
         # Create indexes
         print("\n🔧 Creating indexes...")
-        collection.create_index('nombre')
-        collection.create_index('nif')
-        collection.create_index('estado')
-        collection.create_index('direccionEstatutaria.provincia')
-        collection.create_index([('nombre', pymongo.TEXT), ('fines', pymongo.TEXT)])
+        with metrics.stage('index'):
+            build_indexes(collection)
+        with metrics.stage('stats'):
+            save_stats(db, stats, 'load')
+            save_facets(db, stats, 'load')
+        with metrics.stage('personas'):
+            rebuild_personas(db, collection)
         
         # Summary
         total_docs = collection.count_documents({})
         print(f"\n✅ Migration complete!")
         print(f"📊 Total documents in MongoDB: {total_docs}")
         print(f"❌ Errors encountered: {len(errors)}")
+        dates.print_summary()
+        metrics.finish(errors=len(errors), dates=dates.report())
         
         if errors:
             with open('migration-scripts/migration_errors.json', 'w') as f:
@@ -0,0 +1,80 @@
+"""Checkpoints for resumable Excel -> MongoDB migrations
+
+Progress lives in the 'migration_checkpoints' control collection, next to the
+data: one document per target collection with a fingerprint of the source
+rows and how many of them are already committed. A resumed run skips those
+rows instead of dropping the collection and starting over. Documents carry a
+deterministic _id, so a batch that was half-written when the previous run
+died can simply be sent again.
+"""
+import hashlib
+from datetime import datetime
+
+import pandas as pd
+from pymongo.errors import BulkWriteError
+
+CHECKPOINT_COLLECTION = 'migration_checkpoints'
+
+DUPLICATE_KEY = 11000
+
+
+def source_fingerprint(df):
+    """Content hash of a DataFrame (same rows and columns -> same fingerprint)"""
+    digest = hashlib.sha1()
+    digest.update('\x1f'.join(map(str, df.columns)).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+def insert_batch(collection, documents):
+    """insert_many that skips documents already there; returns how many were inserted"""
+    try:
+        return len(collection.insert_many(documents, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        errors = e.details.get('writeErrors', [])
+        if any(error.get('code') != DUPLICATE_KEY for error in errors):
+            raise
+        return e.details.get('nInserted', 0)
+
+
+class Checkpoint:
+    """Committed progress of one migration into one collection"""
+
+    def __init__(self, db, target, fingerprint):
+        self.control = db[CHECKPOINT_COLLECTION]
+        self.target = target
+        self.fingerprint = fingerprint
+
+    def resume_point(self):
+        """Rows already committed by an unfinished run of the same source, or None"""
+        state = self.control.find_one({'_id': self.target})
+        if not state or state.get('completed'):
+            return None
+        if state.get('source') != self.fingerprint:
+            print("⚠️  Checkpoint belongs to a different source file, starting over")
+            return None
+        return state['rowsDone']
+
+    def start(self, total_rows):
+        now = datetime.now()
+        self.control.replace_one({'_id': self.target}, {
+            'source': self.fingerprint,
+            'totalRows': total_rows,
+            'rowsDone': 0,
+            'inserted': 0,
+            'completed': False,
+            'startedAt': now,
+            'updatedAt': now
+        }, upsert=True)
+
+    def save(self, rows_done, inserted):
+        """Record a committed batch: rows_done source rows, inserted new documents"""
+        self.control.update_one({'_id': self.target}, {
+            '$set': {'rowsDone': rows_done, 'updatedAt': datetime.now()},
+            '$inc': {'inserted': inserted}
+        })
+
+    def complete(self):
+        self.control.update_one({'_id': self.target}, {
+            '$set': {'completed': True, 'updatedAt': datetime.now()}
+        })
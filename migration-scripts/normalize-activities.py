@@ -3,33 +3,11 @@ from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
 
-load_dotenv()
+from repair_pipeline import FixWriter
+from run_metrics import RunMetrics
+from text_repair import normalize_activity_name
 
-def normalize_activity_name(name):
-    """Normalize activity names by removing periods and standardizing case"""
-    if not isinstance(name, str):
-        return name
-    
-    # Remove trailing periods and extra spaces
-    normalized = name.strip().rstrip('.')
-    
-    # Standardize common activities to proper case
-    activity_map = {
-        'SANIDAD': 'Sanidad',
-        'CULTURA': 'Cultura', 
-        'EDUCACION': 'Educación',
-        'INVESTIGACION': 'Investigación',
-        'SERVICIOS SOCIALES': 'Servicios Sociales',
-        'DEPORTE': 'Deporte'
-    }
-    
-    # Check if it matches any of our standardized names
-    normalized_upper = normalized.upper()
-    if normalized_upper in activity_map:
-        return activity_map[normalized_upper]
-    
-    # Otherwise return with proper capitalization
-    return normalized.title()
+load_dotenv()
 
 def normalize_database_activities():
     try:
@@ -40,9 +18,13 @@ def normalize_database_activities():
         print("🔧 Normalizing activity names...")
         
         updated = 0
+        metrics = RunMetrics('normalize-activities')
+        writer = FixWriter(collection)
         cursor = collection.find({'actividades': {'$exists': True, '$ne': []}})
         
-        for doc in cursor:
+        metrics.start('clean')
+        for doc in metrics.timed('read', writer.documents(cursor), within='clean'):
+            metrics.count('documents')
             activities_updated = False
             
             for actividad in doc['actividades']:
@@ -53,7 +35,7 @@ def normalize_database_activities():
                     if normalized != original:
                         actividad['clasificacion1'] = normalized
                         activities_updated = True
-                        print(f"Normalized: '{original}' -> '{normalized}'")
+                        metrics.log(f"Normalized: '{original}' -> '{normalized}'")
                 
                 if actividad.get('nombre'):
                     original = actividad['nombre']
@@ -63,16 +45,25 @@ def normalize_database_activities():
                         activities_updated = True
             
             if activities_updated:
-                collection.update_one(
-                    {'_id': doc['_id']}, 
-                    {'$set': {'actividades': doc['actividades']}}
-                )
+                metrics.changed('normalize_activity_name', ['actividades'])
+                writer.update(doc['_id'], {'actividades': doc['actividades']})
                 updated += 1
             
             if updated % 100 == 0 and updated > 0:
-                print(f"✅ Processed {updated} documents...")
+                metrics.progress(f"✅ Processed {updated} documents...")
+
+        writer.flush()
+        metrics.stop('clean')
+        metrics.add_writer(writer, within='clean')
+        
+        # Keep the stats, the facet cube and 'personas' in step with the fixed values
+        with metrics.stage('stats'):
+            writer.apply_stats(db)
+        with metrics.stage('personas'):
+            writer.apply_personas(db)
         
         print(f"🎉 Activity normalization complete! Updated {updated} documents")
+        metrics.finish(updated=updated)
         
         # Show the normalized activity distribution
         print("\n📊 Normalized activity distribution:")
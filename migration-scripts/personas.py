@@ -0,0 +1,113 @@
+"""Reverse index of the people in the registry: patronos, fundadores and directivos
+
+People exist only inside the foundations' patronos, fundadores and
+directivos arrays, so finding every foundation a person sits in meant
+scanning every array of the collection. 'personas' holds one entry per
+person and role of each foundation:
+
+    {key: 'garcia juan perez', nombre: 'Pérez García, Juan', rol: 'patrono',
+     cargo: 'Presidente', fundacion: 1234, fundacionNombre: 'Fundación ...'}
+
+indexed on key. The key is the name folded like the search keys (NFC,
+casefold, no accents or punctuation) with its words sorted, so 'PÉREZ
+GARCÍA, Juan' and 'Juan Pérez García' are the same person.
+
+The collection is rebuilt in bulk from 'fundaciones' after each load,
+repair of names (repair-database.py and the fix-*.py scripts) and restore
+(/api/restore, which builds it the same way in src/lib/personas.ts; keep
+the two in step). The entries go to a scratch collection renamed over
+'personas', so lookups never see half of it.
+
+    python personas.py      # rebuild, e.g. after editing 'fundaciones' by hand
+"""
+import os
+
+from pymongo import IndexModel
+
+from search_keys import words
+
+PERSONAS_COLLECTION = 'personas'
+
+# Foundation array -> role of its people
+ROLES = {'patronos': 'patrono', 'fundadores': 'fundador', 'directivos': 'directivo'}
+
+# Fields of a foundation the entries are built from; a repair of any of them means a rebuild
+PERSONA_PROJECTION = {'nombre': 1, **dict.fromkeys(ROLES, 1)}
+
+PERSONA_INDEXES = [
+    IndexModel([('key', 1), ('rol', 1)]),
+    IndexModel([('fundacion', 1)]),
+]
+
+INSERT_BATCH_SIZE = 5000
+
+
+def persona_key(name):
+    """The folded words of a name, sorted; '' when it has none"""
+    if not isinstance(name, str):
+        return ''
+    return ' '.join(sorted(words(name)))
+
+
+def persona_entries(doc):
+    """The 'personas' entries of one foundation"""
+    entries = []
+    for field, rol in ROLES.items():
+        for person in doc.get(field) or []:
+            if not isinstance(person, dict):
+                continue
+            key = persona_key(person.get('nombre'))
+            if not key:
+                continue
+            entries.append({
+                'key': key,
+                'nombre': person['nombre'],
+                'rol': rol,
+                'cargo': person.get('cargo'),
+                'fundacion': doc['_id'],
+                'fundacionNombre': doc.get('nombre'),
+            })
+    return entries
+
+
+def rebuild_personas(db, collection=None):
+    """Replace 'personas' with the entries of every foundation; returns how many there are"""
+    collection = collection if collection is not None else db.fundaciones
+    scratch = db[PERSONAS_COLLECTION + '_build']
+    scratch.drop()
+
+    total = 0
+    batch = []
+    for doc in collection.find({}, PERSONA_PROJECTION):
+        batch.extend(persona_entries(doc))
+        if len(batch) >= INSERT_BATCH_SIZE:
+            scratch.insert_many(batch, ordered=False)
+            total += len(batch)
+            batch = []
+    if batch:
+        scratch.insert_many(batch, ordered=False)
+        total += len(batch)
+
+    if total:
+        scratch.create_indexes(PERSONA_INDEXES)
+        scratch.rename(PERSONAS_COLLECTION, dropTarget=True)
+    else:
+        db[PERSONAS_COLLECTION].drop()
+    print(f"👥 People index saved to '{PERSONAS_COLLECTION}' ({total} entries)")
+    return total
+
+
+def touches_personas(paths):
+    """Whether any changed field path ('patronos.nombre', 'nombre'...) feeds the entries"""
+    return any(path.split('.')[0] in PERSONA_PROJECTION for path in paths)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    db = client[os.getenv('MONGODB_DB_NAME', 'fundaciones_espana')]
+    print("👥 Building the people index from 'fundaciones'...")
+    rebuild_personas(db)
@@ -0,0 +1,102 @@
+import argparse
+import os
+import sys
+from datetime import datetime
+
+from pymongo import MongoClient
+from dotenv import load_dotenv
+
+from repair_pipeline import TRANSFORMS, DEFAULT_CHAIN, build_chain, run_repair, run_parallel_repair
+from run_metrics import RunMetrics
+from collection_stats import apply_delta
+from facet_cube import apply_facet_delta
+from personas import rebuild_personas, touches_personas
+
+load_dotenv()
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Apply all text fixes to the fundaciones collection in a single scan')
+    parser.add_argument('--steps', default=','.join(DEFAULT_CHAIN),
+                        help=f"Comma separated transforms, in order (available: {', '.join(TRANSFORMS)})")
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Compute the changes without writing them')
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='Updates per bulk_write round-trip (default: BULK_BATCH_SIZE or 500)')
+    parser.add_argument('--no-prefilter', dest='prefilter', action='store_false',
+                        help='Fetch every document instead of only those a transform may change')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes, each repairing its own _id range (default: 1)')
+    return parser.parse_args()
+
+def repair_database():
+    args = parse_args()
+    try:
+        steps = [step.strip() for step in args.steps.split(',') if step.strip()]
+        chain = build_chain(steps)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(2)
+
+    try:
+        mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
+        client = MongoClient(mongodb_uri)
+        db_name = os.getenv('MONGODB_DB_NAME', 'fundaciones_espana')
+        collection = client[db_name].fundaciones
+
+        print(f"🔧 Repairing '{db_name}.fundaciones' in one pass: {' → '.join(t.name for t in chain)}")
+        if args.dry_run:
+            print("⚠️  Dry run, nothing will be written")
+
+        metrics = RunMetrics('repair-database')
+        start = datetime.now()
+        with metrics.stage('clean'):
+            if args.workers > 1:
+                print(f"⚡ Using {args.workers} worker processes")
+                result = run_parallel_repair(mongodb_uri, db_name, steps, args.workers,
+                                             dry_run=args.dry_run, batch_size=args.batch_size,
+                                             prefilter=args.prefilter)
+            else:
+                result = run_repair(collection, chain, dry_run=args.dry_run, batch_size=args.batch_size,
+                                    prefilter=args.prefilter)
+        elapsed = (datetime.now() - start).total_seconds()
+
+        # With several workers these are summed over the processes and overlap
+        within = 'clean' if args.workers == 1 else None
+        metrics.add_time('read', result['read_time'], within)
+        metrics.add_time('write', result['write_time'], within)
+        metrics.count('documents', result['processed'])
+        metrics.count('updated', result['updated'])
+        metrics.count('bytes_sent', result['bytes_sent'])
+        metrics.count('batches', result['batches'])
+        metrics.count('retries', result['retries'])
+        metrics.count('write_errors', result['failed'])
+        for (name, path), count in result['fields_changed_by_path'].items():
+            metrics.changed(name, [path], count)
+
+        print(f"\n🎉 Repair complete in {elapsed:.1f}s")
+        print(f"📊 Documents scanned: {result['processed']}{'' if args.prefilter else ' (no pre-filter)'}")
+        print(f"🔧 Documents updated: {result['updated']} in {result['batches']} bulk writes")
+        if 'shards' in result:
+            print(f"🧩 Shards: {result['shards']}")
+        if result['retries'] or result['failed']:
+            print(f"⚠️  Retried batches: {result['retries']}, failed updates: {result['failed']}")
+        for name, count in result['fields_changed'].items():
+            print(f"   {name}: {count} fields")
+        if not args.dry_run:
+            # Keep /api/fundaciones/stats and the facet cube in step with the repaired values
+            with metrics.stage('stats'):
+                apply_delta(client[db_name], result['stats_delta'], collection)
+                apply_facet_delta(client[db_name], result['stats_delta'], collection)
+            # Repaired names of people or foundations: the people index is rebuilt in bulk
+            if touches_personas(path for _, path in result['fields_changed_by_path']):
+                with metrics.stage('personas'):
+                    rebuild_personas(client[db_name], collection)
+        metrics.finish(steps=steps, workers=args.workers, dryRun=args.dry_run, prefilter=args.prefilter)
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    repair_database()
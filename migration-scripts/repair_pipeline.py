@@ -0,0 +1,404 @@
+"""One-pass repair of the fundaciones collection
+
+Each fix-*.py script used to stream the whole collection on its own. Here the
+same fixes are transforms over declared field paths, chained in order and
+applied to every document during a single scan; only fields that actually
+changed are written back.
+
+The standalone scripts still run on their own; they write through FixWriter,
+which keeps the search keys, the stats, the facet cube and 'personas' in
+step with what they change, as run_repair() and repair-database.py do.
+"""
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from pymongo import MongoClient
+
+import text_repair
+from bulk_writer import BulkUpdater
+from collection_stats import StatsDelta, apply_delta, compute_stats, save_stats, stats_keys
+from facet_cube import FACET_PROJECTION, apply_facet_delta, save_facets
+from personas import rebuild_personas, touches_personas
+from search_keys import search_key_updates
+from text_repair import repair, trigger_pattern, normalize_activity_name, ACTIVITY_TRIGGER
+
+# fields: dotted paths; 'patronos.nombre' walks every element of the array
+# trigger: server-side $regex matching every value fn may change, or None
+# when any value may change (the documents cannot be pre-filtered)
+Transform = namedtuple('Transform', ['name', 'fields', 'fn', 'accept', 'trigger'])
+
+BASIC_FIELDS = ['nombre', 'estado', 'fines',
+                'direccionEstatutaria.provincia', 'direccionEstatutaria.domicilio']
+PEOPLE_FIELDS = ['patronos.nombre', 'patronos.cargo']
+
+
+def _profile(name):
+    return lambda text: repair(text, name)
+
+
+def _profile_transform(name, fields, profile_name, accept=None):
+    return Transform(name, fields, _profile(profile_name), accept or _always, trigger_pattern(profile_name))
+
+
+def _always(original, cleaned):
+    return True
+
+
+def _non_empty(original, cleaned):
+    return len(cleaned) > 0
+
+
+def _strip_trailing_period(text):
+    return text.rstrip('.') if isinstance(text, str) and text.endswith('.') else text
+
+
+# Same fixes and fields as the standalone scripts, in the order they were run
+TRANSFORMS = {
+    # fix-encoding-final.py, over the fields fix-encoding-final-v2.py also covered
+    'encoding': _profile_transform('encoding', BASIC_FIELDS + ['direccionNotificacion.provincia',
+                                                               'direccionNotificacion.localidad']
+                                   + PEOPLE_FIELDS + ['actividades.nombre'], 'fix_encoding_final'),
+    # fix-html-entities.py
+    'html_entities': _profile_transform('html_entities', BASIC_FIELDS + PEOPLE_FIELDS + ['actividades.nombre'],
+                                        'fix_html_entities_and_corruption'),
+    # fix-remaining-entities.py
+    'remaining_entities': _profile_transform('remaining_entities', BASIC_FIELDS + PEOPLE_FIELDS
+                                             + ['actividades.nombre'], 'comprehensive_text_cleanup'),
+    # fix-ordinal-numbers.py
+    'ordinals': _profile_transform('ordinals', BASIC_FIELDS + ['direccionNotificacion.domicilio',
+                                                               'direccionNotificacion.localidad'] + PEOPLE_FIELDS,
+                                   'fix_ordinal_numbers'),
+    # fix-double-accents.py
+    'double_accents': _profile_transform('double_accents', BASIC_FIELDS + PEOPLE_FIELDS, 'fix_double_accents'),
+    # fix-invisible-chars.py (never blank a field)
+    'invisible_chars': _profile_transform('invisible_chars', BASIC_FIELDS + PEOPLE_FIELDS + ['actividades.nombre'],
+                                          'clean_invisible_chars', _non_empty),
+    # normalize-activities.py
+    'activities': Transform('activities', ['actividades.clasificacion1'],
+                            normalize_activity_name, _always, ACTIVITY_TRIGGER),
+    'activity_names': Transform('activity_names', ['actividades.nombre'],
+                                _strip_trailing_period, _always, r'\.$'),
+}
+
+DEFAULT_CHAIN = ['encoding', 'html_entities', 'remaining_entities', 'ordinals',
+                 'double_accents', 'invisible_chars', 'activities', 'activity_names']
+
+
+def build_chain(names=None):
+    """Resolve transform names into an ordered chain"""
+    names = names or DEFAULT_CHAIN
+    unknown = [name for name in names if name not in TRANSFORMS]
+    if unknown:
+        raise ValueError(f"Unknown transforms: {', '.join(unknown)} (available: {', '.join(TRANSFORMS)})")
+    return [TRANSFORMS[name] for name in names]
+
+
+def field_filter(fields, pattern):
+    """$or of one $regex over several fields (array paths match any element)"""
+    return {'$or': [{field: {'$regex': pattern}} for field in fields]}
+
+
+def field_projection(fields):
+    """Projection of the top-level fields a set of paths lives in"""
+    return {field.split('.')[0]: 1 for field in fields}
+
+
+def fix_projection(fields):
+    """field_projection() plus the grouping fields FixWriter needs for the stats"""
+    return {**field_projection(fields), **FACET_PROJECTION}
+
+
+def candidate_filter(chain):
+    """find() filter for the documents at least one transform may change
+
+    Transforms over the same field share one $regex. Returns {} (every
+    document) if a transform in the chain has no trigger.
+    """
+    patterns = {}
+    for transform in chain:
+        if transform.trigger is None:
+            return {}
+        for field in transform.fields:
+            patterns.setdefault(field, []).append(transform.trigger)
+    return {'$or': [{field: {'$regex': '|'.join(triggers)}} for field, triggers in patterns.items()]}
+
+
+def chain_projection(chain):
+    return field_projection([field for transform in chain for field in transform.fields])
+
+
+def _apply_leaf(container, key, transform, stats):
+    """Transform container[key] in place; True when it changed"""
+    original = container.get(key)
+    if not original:
+        return False
+    cleaned = transform.fn(original)
+    if cleaned == original or not transform.accept(original, cleaned):
+        return False
+    container[key] = cleaned
+    stats[transform.name] += 1
+    return True
+
+
+def _apply_field(doc, path, transform, stats):
+    """Apply a transform to one field path; returns the $set key that changed, if any"""
+    head, _, tail = path.partition('.')
+    if not tail:
+        return head if _apply_leaf(doc, head, transform, stats) else None
+
+    value = doc.get(head)
+    if isinstance(value, dict):
+        return path if _apply_leaf(value, tail, transform, stats) else None
+    if isinstance(value, list):
+        changed = False
+        for item in value:
+            if isinstance(item, dict) and _apply_leaf(item, tail, transform, stats):
+                changed = True
+        # Arrays are written back whole, like the original scripts did
+        return head if changed else None
+    return None
+
+
+def _get_path(doc, key):
+    value = doc
+    for part in key.split('.'):
+        value = value[part]
+    return value
+
+
+def repair_document(doc, chain, stats, field_stats=None):
+    """Run the whole chain over one document; returns the $set of changed fields
+
+    field_stats, when given, counts the documents each (transform, field path)
+    changed.
+    """
+    changed = set()
+    for transform in chain:
+        for path in transform.fields:
+            key = _apply_field(doc, path, transform, stats)
+            if key:
+                changed.add(key)
+                if field_stats is not None:
+                    field_stats[(transform.name, path)] += 1
+    return {key: _get_path(doc, key) for key in sorted(changed)}
+
+
+def _with_updates(doc, updates):
+    """A copy of doc with a $set applied (top-level fields and 'field.subfield' paths)"""
+    result = dict(doc)
+    for key, value in updates.items():
+        head, _, tail = key.partition('.')
+        if tail:
+            nested = result.get(head)
+            result[head] = {**(nested if isinstance(nested, dict) else {}), tail: value}
+        else:
+            result[head] = value
+    return result
+
+
+class FixWriter(BulkUpdater):
+    """BulkUpdater for the fix-*.py scripts that keeps the derived data in step
+
+    Read the documents through documents(), so that their grouping values
+    are known before the script edits them in place. Each update() then also
+    sets the search keys of a changed nombre, nif or fines and records the
+    grouping changes; apply_stats() and apply_personas() bring the stats,
+    the facet cube and 'personas' up to date once the updates are flushed.
+    An update of a document not read through documents() cannot be diffed:
+    the stats and the cube are then counted again.
+    """
+
+    def __init__(self, collection, **kwargs):
+        super().__init__(collection, **kwargs)
+        self.delta = StatsDelta()
+        self.paths = set()
+        self.recount = False
+        self._current = None
+
+    def documents(self, cursor):
+        """The documents of cursor, remembering the grouping values of each as read"""
+        for doc in cursor:
+            self._current = (doc, stats_keys(doc))
+            yield doc
+        self._current = None
+
+    def update(self, _id, updates):
+        # A fixed nombre, nif or fines needs its search keys again
+        updates = {**updates, **search_key_updates(updates, updates)}
+        if self._current is not None and self._current[0].get('_id') == _id:
+            doc, before = self._current
+            self.delta.change(before, stats_keys(_with_updates(doc, updates)))
+        elif any(key.split('.')[0] in FACET_PROJECTION for key in updates):
+            self.recount = True
+        self.paths.update(updates)
+        super().update(_id, updates)
+
+    def apply_stats(self, db):
+        """Flush, then apply the recorded changes to the stats and the facet cube"""
+        self.flush()
+        if self.recount:
+            stats = compute_stats(self.collection)
+            save_stats(db, stats, 'recount')
+            save_facets(db, stats, 'recount')
+            return
+        apply_delta(db, self.delta, self.collection)
+        apply_facet_delta(db, self.delta, self.collection)
+
+    def apply_personas(self, db):
+        """Flush, then rebuild 'personas' if a name of a person or foundation changed"""
+        self.flush()
+        if touches_personas(self.paths):
+            rebuild_personas(db, self.collection)
+
+
+def run_repair(collection, chain, dry_run=False, progress_every=500, batch_size=None, query=None, label='',
+               prefilter=True):
+    """Stream the collection once and write back only what changed, in bulk batches
+
+    With prefilter, only candidate documents (see candidate_filter) and only
+    the fields the chain reads, plus the grouping fields, leave the server.
+    The result's stats_delta holds the changes to the /api/fundaciones/stats
+    groupings and facet cube cells (see collection_stats.apply_delta and
+    facet_cube.apply_facet_delta). Documents whose nombre, nif or fines
+    changed get their search keys recomputed in the same update.
+    """
+    stats = Counter()
+    field_stats = Counter()
+    processed = 0
+    updated = 0
+    read_time = 0.0
+    delta = StatsDelta()
+    writer = BulkUpdater(collection, batch_size=batch_size, label=label)
+    prefix = f'[{label}] ' if label else ''
+
+    projection = None
+    if prefilter:
+        candidates = candidate_filter(chain)
+        if candidates:
+            query = {'$and': [query, candidates]} if query else candidates
+        # The grouping fields too: a cube cell needs all of a document's values
+        projection = {**chain_projection(chain), **FACET_PROJECTION}
+
+    cursor = collection.find(query or {}, projection)
+    while True:
+        started = time.perf_counter()
+        doc = next(cursor, None)
+        read_time += time.perf_counter() - started
+        if doc is None:
+            break
+
+        before = stats_keys(doc)
+        updates = repair_document(doc, chain, stats, field_stats)
+        if updates:
+            # A repaired nombre, nif or fines needs its search keys again
+            updates.update(search_key_updates(doc, updates))
+            delta.change(before, stats_keys(doc))
+            if not dry_run:
+                writer.update(doc['_id'], updates)
+            updated += 1
+
+        processed += 1
+        if processed % progress_every == 0:
+            print(f"✅ {prefix}Processed {processed} documents, {updated} updated")
+
+    writer.flush()
+
+    return {
+        'processed': processed,
+        'updated': updated,
+        'batches': writer.batches,
+        'retries': writer.retries,
+        'failed': writer.failed,
+        'read_time': read_time,
+        'write_time': writer.write_time,
+        'bytes_sent': writer.bytes_sent,
+        'fields_changed': dict(stats),
+        'fields_changed_by_path': dict(field_stats),
+        'stats_delta': delta
+    }
+
+
+def split_id_ranges(collection, shards):
+    """Split the integer _id space into contiguous [start, end) ranges"""
+    numeric = {'_id': {'$type': 'number'}}
+    lowest = collection.find_one(numeric, {'_id': 1}, sort=[('_id', 1)])
+    highest = collection.find_one(numeric, {'_id': 1}, sort=[('_id', -1)])
+    if lowest is None:
+        return []
+
+    start, stop = int(lowest['_id']), int(highest['_id']) + 1
+    step = max(1, -(-(stop - start) // shards))
+    return [(lo, min(lo + step, stop)) for lo in range(start, stop, step)]
+
+
+def _shard_query(id_range):
+    if id_range is None:
+        # Anything that is not a number would fall outside every range
+        return {'_id': {'$not': {'$type': 'number'}}}
+    return {'_id': {'$gte': id_range[0], '$lt': id_range[1]}}
+
+
+def _repair_shard(mongodb_uri, db_name, chain_names, id_range, dry_run, batch_size, prefilter):
+    """Worker: own MongoClient, own bulk writer, one _id range"""
+    client = MongoClient(mongodb_uri)
+    try:
+        if text_repair.STATS_ENABLED:
+            # Fresh counters: a worker process may repair several shards
+            text_repair.enable_stats()
+        label = 'other ids' if id_range is None else f'{id_range[0]}-{id_range[1] - 1}'
+        result = run_repair(client[db_name].fundaciones, build_chain(chain_names), dry_run=dry_run,
+                            batch_size=batch_size, query=_shard_query(id_range), label=label,
+                            prefilter=prefilter)
+        if text_repair.STATS_ENABLED:
+            result['rule_stats'] = text_repair.rule_stats()
+        return result
+    finally:
+        client.close()
+
+
+def merge_results(results):
+    """Add up the statistics returned by each shard"""
+    merged = {'processed': 0, 'updated': 0, 'batches': 0, 'retries': 0, 'failed': 0,
+              'read_time': 0.0, 'write_time': 0.0, 'bytes_sent': 0}
+    fields = Counter()
+    paths = Counter()
+    delta = StatsDelta()
+    for result in results:
+        for key in merged:
+            merged[key] += result[key]
+        fields.update(result['fields_changed'])
+        paths.update(result['fields_changed_by_path'])
+        delta.merge(result['stats_delta'])
+    merged['fields_changed'] = dict(fields)
+    merged['stats_delta'] = delta
+    merged['fields_changed_by_path'] = dict(paths)
+    return merged
+
+
+def run_parallel_repair(mongodb_uri, db_name, chain_names, workers, dry_run=False, batch_size=None, shards=None,
+                        prefilter=True):
+    """Repair the collection with one process per _id range and merge their statistics
+
+    The work is CPU-bound string handling, so processes (not threads) are used;
+    each worker opens its own connection and sends its own bulk writes.
+    """
+    build_chain(chain_names)  # fail fast on unknown names, before forking
+    client = MongoClient(mongodb_uri)
+    try:
+        ranges = split_id_ranges(client[db_name].fundaciones, shards or workers * 4)
+    finally:
+        client.close()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_repair_shard, mongodb_uri, db_name, chain_names, id_range,
+                                   dry_run, batch_size, prefilter)
+                   for id_range in ranges + [None]]
+        results = [future.result() for future in futures]
+
+    merged = merge_results(results)
+    merged['shards'] = len(results)
+    for result in results:
+        # Rule hits counted in the workers, so that this process can report them
+        text_repair.merge_stats(result.get('rule_stats', {}))
+    return merged
@@ -6,8 +6,26 @@ import os
 from datetime import datetime
 from dotenv import load_dotenv
 import requests
+import argparse
 from io import BytesIO
 
+from columnar_builder import build_production_documents, used_columns
+from date_fields import ORIGINALS_FIELD, DateReport, date_values
+from search_keys import add_search_keys
+from excel_stream import ExcelStream, peak_rss_mb
+from migration_checkpoint import Checkpoint, source_fingerprint
+from collection_sync import content_hash, sync_documents
+from collection_swap import staging_name, promote
+from index_manifest import build_indexes
+from insert_pipeline import PipelinedInserter
+from batch_sizing import AdaptiveBatcher
+from sheet_cache import read_sheet
+from run_metrics import RunMetrics
+from collection_stats import StatsAccumulator, compute_stats, save_stats
+from facet_cube import save_facets
+from personas import rebuild_personas
+from text_repair import repair, normalize_activity_name
+
 # Load environment variables
 load_dotenv()
 
@@ -20,20 +38,40 @@ def download_excel_from_url(url):
     else:
         raise Exception(f"Error al descargar archivo: {response.status_code}")
 
+def open_excel_source(excel_source):
+    """Local path as is; URLs are downloaded first"""
+    if isinstance(excel_source, str) and excel_source.startswith('http'):
+        return download_excel_from_url(excel_source)
+    return excel_source
+
 def load_excel_data(excel_source):
     """Load data from Excel file or URL"""
     print("📖 Leyendo archivo Excel...")
     
-    # Si es una URL, descargar primero
-    if isinstance(excel_source, str) and excel_source.startswith('http'):
-        excel_file = download_excel_from_url(excel_source)
-    else:
-        excel_file = excel_source
-    
-    df = pd.read_excel(excel_file, sheet_name=0)
+    df = read_sheet(open_excel_source(excel_source), sheet_name=0)
     print(f"✅ Datos cargados: {len(df)} filas, {len(df.columns)} columnas")
     return df
 
+def stream_excel_data(excel_source, chunk_size, clean=None, dates=None):
+    """Open the Excel file for reading in blocks of chunk_size rows
+
+    Returns (stream, build_from): build_from(skip) yields (index, document)
+    for the rows after the first skip, reading only the columns the document
+    builder uses. Text cells go through clean (clean_text by default); date
+    cells are counted in dates (a DateReport).
+    """
+    clean = clean or clean_text
+    print(f"📖 Leyendo archivo Excel por bloques de {chunk_size} filas...")
+    stream = ExcelStream(open_excel_source(excel_source))
+    usecols = used_columns(build_production_documents, stream.header, clean_text, normalize_activity_name)
+    print(f"✅ {len(usecols)} de {len(stream.header)} columnas necesarias")
+    
+    def build_from(skip):
+        for chunk in stream.chunks(chunk_size, usecols=usecols, skip_rows=skip):
+            yield from build_production_documents(chunk, clean, normalize_activity_name, dates)
+    
+    return stream, build_from
+
 def clean_text(text):
     """Clean text with proper encoding"""
     if pd.isna(text):
@@ -41,72 +79,19 @@ def clean_text(text):
     if not isinstance(text, str):
         return str(text)
     
-    # Diccionario de reemplazos de caracteres mal codificados
-    replacements = {
-        'Ã³': 'ó', 'Ã¡': 'á', 'Ã©': 'é', 'Ã­': 'í', 'Ãº': 'ú', 'Ã±': 'ñ',
-        'Ã'': 'Ñ', 'Ã': 'Á', 'Ã‰': 'É', 'Ã': 'Í', 'Ã"': 'Ó', 'Ãš': 'Ú',
-        'Â¡': '¡', 'Â¿': '¿', 'Âº': 'º', 'Âª': 'ª',
-        'â€œ': '"', 'â€': '"', 'â€™': "'", 'â€"': '–', 'â€"': '—',
-        'â‚¬': '€', 'Â°': '°',
-        '&#xD;': '\n', '&#xA;': '\n', '&#x20;': ' ',
-        '3Âº': '3º', '1Âª': '1ª', '2Âº': '2º', '4Âº': '4º',
-        'MEDITERRÃNEO': 'MEDITERRÁNEO',
-        'BRITÃNICA': 'BRITÁNICA',
-        'InvestigaciÃ³n': 'Investigación',
-        'FundaciÃ³n': 'Fundación',
-        'EducaciÃ³n': 'Educación',
-        'TecnolÃ³gica': 'Tecnológica',
-        'ColaboraciÃ³n': 'Colaboración'
-    }
-    
-    # Aplicar reemplazos
-    result = text
-    for old, new in replacements.items():
-        result = result.replace(old, new)
-    
-    # Limpiar espacios múltiples
-    result = ' '.join(result.split())
-    
-    # Eliminar caracteres invisibles Unicode
-    invisible_chars = [8220, 8216, 61837]
-    for char_code in invisible_chars:
-        result = result.replace(chr(char_code), '')
-    
-    return result.strip()
-
-def normalize_activity_name(name):
-    """Normalize activity names"""
-    if not isinstance(name, str):
-        return name
-    
-    # Remove trailing periods and extra spaces
-    normalized = name.strip().rstrip('.')
-    
-    # Standardize common activities
-    activity_map = {
-        'SANIDAD': 'Sanidad',
-        'CULTURA': 'Cultura', 
-        'EDUCACION': 'Educación',
-        'INVESTIGACION': 'Investigación',
-        'SERVICIOS SOCIALES': 'Servicios Sociales',
-        'DEPORTE': 'Deporte'
-    }
-    
-    normalized_upper = normalized.upper()
-    if normalized_upper in activity_map:
-        return activity_map[normalized_upper]
-    
-    return normalized.title()
+    # Reemplazos de caracteres mal codificados, espacios e invisibles en una pasada
+    return repair(text, 'clean_text')
 
-def convert_to_mongodb_document(row):
+def convert_to_mongodb_document(row, dates=None):
     """Convert DataFrame row to MongoDB document with fixed encoding"""
+    originals = {}
     doc = {
         '_id': int(row['Nº Hoja Registral']),
         'nombre': clean_text(row['Denominación']),
         'numRegistro': str(row['Número de Registro']),
         'estado': clean_text(row['Estado']),
-        'fechaConstitucion': str(row['Fecha de Constitución']) if pd.notna(row['Fecha de Constitución']) else None,
-        'fechaInscripcion': str(row['Fecha de Inscripción']) if pd.notna(row['Fecha de Inscripción']) else None,
+        **date_values(row['Fecha de Constitución'], 'fechaConstitucion', dates, originals),
+        **date_values(row['Fecha de Inscripción'], 'fechaInscripcion', dates, originals),
         'fines': clean_text(row['Fines']),
         'nif': str(row['N.I.F.']) if pd.notna(row['N.I.F.']) else None
     }
@@ -177,50 +162,143 @@ def convert_to_mongodb_document(row):
             organos.append({'nombre': clean_text(row[f'Órgano de Representación {i}'])})
     doc['organos'] = organos
     
+    # Fechas que no se pudieron interpretar: se guarda el texto
+    if originals:
+        doc[ORIGINALS_FIELD] = originals
+    
+    # Claves de búsqueda normalizadas
+    add_search_keys(doc)
+    
     return doc
 
-def migrate_to_mongodb(excel_source, connection_string=None):
-    """Main migration function"""
+def migrate_to_mongodb(excel_source, connection_string=None, resume=False, sync=False, blue_green=False,
+                       chunk_size=None, writers=1):
+    """Main migration function
+
+    With resume, an unfinished run of the same Excel data continues after its
+    last committed batch instead of clearing the collection. With sync, the
+    collection is not cleared at all: only new, changed and removed
+    foundations are written (see collection_sync.py). With blue_green, the
+    load goes to 'fundaciones_staging', which replaces 'fundaciones' in one
+    rename once its indexes are built (see collection_swap.py). With
+    chunk_size, the sheet is streamed in blocks instead of loaded whole.
+    Full loads insert from `writers` threads while the next batches are
+    built (see insert_pipeline.py). Stage timings go to a run report (see
+    run_metrics.py). The figures of /api/fundaciones/stats are counted while
+    the documents are built and saved to 'fundaciones_stats' (see
+    collection_stats.py).
+    """
+    if sync and blue_green:
+        raise ValueError("--sync escribe en la colección activa y no se puede combinar con --blue-green")
+    metrics = RunMetrics('restore-from-excel-production')
+    clean = metrics.wrap('clean', clean_text)
+    dates = DateReport()
     try:
         # Use provided connection string or default
         mongo_uri = connection_string or os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
         
-        # Load data
-        df = load_excel_data(excel_source)
+        # Load data (whole sheet, or row blocks with bounded memory)
+        if chunk_size:
+            with metrics.stage('read'):
+                stream, build_from = stream_excel_data(excel_source, chunk_size, clean, dates)
+            fingerprint, total_rows = stream.fingerprint, stream.row_count
+        else:
+            with metrics.stage('read'):
+                df = load_excel_data(excel_source)
+            fingerprint, total_rows = source_fingerprint(df), len(df)
+            
+            def build_from(skip):
+                return build_production_documents(df.iloc[skip:], clean, normalize_activity_name, dates)
         
         # Connect to MongoDB
         print(f"🔌 Conectando a MongoDB...")
         client = MongoClient(mongo_uri)
         db = client['fundaciones_espana']
-        collection = db.fundaciones
-        
-        # Clear existing data
-        print("🗑️  Limpiando colección existente...")
-        collection.delete_many({})
+        target = staging_name('fundaciones') if blue_green else 'fundaciones'
+        collection = db[target]
+        checkpoint = None
+        stats = StatsAccumulator()
+        count_stats = metrics.wrap('stats', stats.add)
         
-        # Convert and insert documents
-        print("💾 Migrando datos...")
-        documents = []
-        for idx, row in df.iterrows():
-            doc = convert_to_mongodb_document(row)
-            documents.append(doc)
+        if sync:
+            # Compare content hashes and write only the differences
+            print("🔄 Sincronizando cambios...")
+            def counted(documents):
+                for _, doc in documents:
+                    count_stats(doc)
+                    yield doc
             
-            if len(documents) >= 100:
-                collection.insert_many(documents)
-                documents = []
-                print(f"  Procesados {idx + 1} documentos...")
-        
-        # Insert remaining documents
-        if documents:
-            collection.insert_many(documents)
+            with metrics.stage('sync'):
+                changes = sync_documents(collection, counted(metrics.timed('build', build_from(0))))
+            metrics.count('documents', changes['inserted'] + changes['updated'] + changes['unchanged'])
+            print(f"  Nuevos: {changes['inserted']}, modificados: {changes['updated']}, "
+                  f"sin cambios: {changes['unchanged']}, eliminados: {changes['deleted']}")
+        else:
+            checkpoint = Checkpoint(db, target, fingerprint)
+            rows_done = checkpoint.resume_point() if resume else None
+            if rows_done is None:
+                # Drop rather than delete_many so the load runs without indexes
+                print("🗑️  Limpiando colección existente...")
+                collection.drop()
+                checkpoint.start(total_rows)
+                rows_done = 0
+            else:
+                print(f"⏩ Reanudando tras {rows_done}/{total_rows or '?'} filas ya migradas")
+            
+            def on_batch(rows, inserted):
+                checkpoint.save(rows, inserted)
+                metrics.progress(f"  Procesados {rows} documentos...")
+            
+            # Convert documents while the writer threads insert the previous
+            # batches, checkpointing after each batch
+            print("💾 Migrando datos...")
+            batcher = AdaptiveBatcher()
+            add = metrics.wrap('encode', batcher.add)
+            hash_document = metrics.wrap('hash', content_hash)
+            with PipelinedInserter(collection, writers=writers, on_batch=on_batch, batcher=batcher) as inserter:
+                for idx, doc in metrics.timed('build', build_from(rows_done)):
+                    # Stored so that a later --sync can tell what changed
+                    doc['contentHash'] = hash_document(doc)
+                    count_stats(doc)
+                    
+                    # Lotes por tamaño BSON, ajustados a la latencia medida
+                    if add(doc):
+                        inserter.submit(idx + 1, *batcher.take())
+                
+                # Insert remaining documents
+                if batcher.documents:
+                    inserter.submit(idx + 1, *batcher.take())
+            # Los hilos escriben en paralelo al constructor: 'write' se solapa con 'build'
+            metrics.add_time('write', inserter.write_time)
+            metrics.add_time('queue_wait', inserter.build_blocked)
+            metrics.count('documents', inserter.inserted)
+            metrics.count('bytes_sent', inserter.bytes_sent)
+            print(f"📦 {batcher.summary()}")
         
         # Create indexes
         print("📇 Creando índices...")
-        collection.create_index('nombre')
-        collection.create_index('estado')
-        collection.create_index('nif')
-        collection.create_index('direccionEstatutaria.provincia')
-        collection.create_index('actividades.clasificacion1')
+        with metrics.stage('index'):
+            build_indexes(collection)
+        if checkpoint:
+            checkpoint.complete()
+        
+        if target != 'fundaciones':
+            promote(db)
+            collection = db.fundaciones
+        
+        # Estadísticas de /api/fundaciones/stats y cubo de filtros; una carga reanudada solo vio
+        # parte de los documentos y las recuenta desde la colección
+        with metrics.stage('stats'):
+            if stats.total == collection.estimated_document_count():
+                save_stats(db, stats, 'sync' if sync else 'load')
+                save_facets(db, stats, 'sync' if sync else 'load')
+            else:
+                stats = compute_stats(collection)
+                save_stats(db, stats, 'recount')
+                save_facets(db, stats, 'recount')
+        # Índice inverso de patronos, fundadores y directivos
+        with metrics.stage('personas'):
+            rebuild_personas(db, collection)
         
         # Verify migration
         total_docs = collection.count_documents({})
@@ -232,6 +310,10 @@ def migrate_to_mongodb(excel_source, connection_string=None):
         provincias = collection.distinct('direccionEstatutaria.provincia')
         print(f"📈 Estados únicos: {len(estados)}")
         print(f"📍 Provincias únicas: {len(provincias)}")
+        print(f"🧠 Memoria máxima del proceso: {peak_rss_mb():.0f} MB")
+        dates.print_summary()
+        metrics.finish(target=target, sync=sync, writers=writers, peakMemoryMB=round(peak_rss_mb()),
+                       dates=dates.report())
         
         # Sample document
         sample = collection.find_one()
@@ -249,6 +331,20 @@ def migrate_to_mongodb(excel_source, connection_string=None):
         return False
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Restaurar la colección fundaciones desde el Excel del registro')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continuar una migración interrumpida del mismo archivo en lugar de empezar de cero')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--sync', action='store_true',
+                      help='Escribir solo las fundaciones nuevas, modificadas o eliminadas, sin vaciar la colección')
+    mode.add_argument('--blue-green', action='store_true',
+                      help="Cargar en 'fundaciones_staging' y sustituir la colección al terminar (conserva la anterior)")
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='Leer el Excel por bloques de N filas (memoria acotada) en lugar de cargarlo entero')
+    parser.add_argument('--writers', type=int, default=1,
+                        help='Insertar los lotes desde N hilos mientras se construyen los siguientes (por defecto: 1)')
+    args = parser.parse_args()
+
     print("🚀 Script de Migración y Restauración para Producción")
     print("=" * 50)
     
@@ -280,7 +376,8 @@ if __name__ == "__main__":
     
     # Ejecutar migración
     print(f"\n🚀 Iniciando migración...")
-    success = migrate_to_mongodb(excel_source, connection_string)
+    success = migrate_to_mongodb(excel_source, connection_string, resume=args.resume, sync=args.sync,
+                                 blue_green=args.blue_green, chunk_size=args.chunk_size, writers=args.writers)
     
     if success:
         print("\n✨ ¡Migración completada exitosamente!")
@@ -0,0 +1,36 @@
+import os
+import sys
+
+from pymongo import MongoClient
+from dotenv import load_dotenv
+
+from collection_swap import rollback
+from collection_stats import compute_stats, save_stats
+from facet_cube import save_facets
+from personas import rebuild_personas
+
+load_dotenv()
+
+def rollback_fundaciones():
+    """Put 'fundaciones_previous' (kept by the last --blue-green load) back live"""
+    try:
+        mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
+        client = MongoClient(mongodb_uri)
+        db_name = os.getenv('MONGODB_DB_NAME', 'fundaciones_espana')
+        db = client[db_name]
+
+        rollback(db)
+        # The stored stats and facet cube describe the release that was just rolled back
+        stats = compute_stats(db.fundaciones)
+        save_stats(db, stats, 'rollback')
+        save_facets(db, stats, 'rollback')
+        # And 'personas' points at foundations that are no longer there
+        rebuild_personas(db)
+        print(f"📊 Documents in 'fundaciones': {db.fundaciones.count_documents({})}")
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    rollback_fundaciones()
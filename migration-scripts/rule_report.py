@@ -0,0 +1,201 @@
+"""Which text repair rules fire, how often, and which never can
+
+Runs every profile of text_repair.py over a corpus and reports, per profile,
+the hits of each rule, the time spent in each step, the rules that never
+fired and the rules that are shadowed by others (see TextRepairer.shadowed).
+
+    python rule_report.py                                # strings of the fundaciones collection
+    python rule_report.py --excel "BBDD de fundaciones.xls"
+    python rule_report.py --runs run-reports/            # runs made with TEXT_REPAIR_STATS=1
+    python rule_report.py --profiles clean_text --marginal-cost 20000
+
+--marginal-cost times each profile again without each of its rules, on a
+sample of the strings: the rules whose removal saves the most are the ones
+worth pruning or narrowing first.
+"""
+import argparse
+import gc
+import glob
+import json
+import os
+import random
+import time
+
+from dotenv import load_dotenv
+
+import text_repair
+from text_repair import PROFILES, RuleStats, TextRepairer, compile_rules, get_repairer, stats_report
+
+load_dotenv()
+
+
+def document_strings(value):
+    """Every string leaf of a document"""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from document_strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from document_strings(item)
+
+
+def collection_strings(limit=None):
+    from pymongo import MongoClient
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    collection = client[os.getenv('MONGODB_DB_NAME', 'fundaciones_espana')].fundaciones
+    cursor = collection.find({}, {'_id': 0, 'metadata': 0, 'contentHash': 0})
+    if limit:
+        cursor = cursor.limit(limit)
+    for doc in cursor:
+        yield from document_strings(doc)
+
+
+def excel_strings(path, limit=None):
+    from sheet_cache import read_sheet
+    df = read_sheet(path)
+    if limit:
+        df = df.head(limit)
+    for column in df.columns:
+        if df[column].dtype == object:
+            yield from (value for value in df[column] if isinstance(value, str))
+
+
+def run_corpus(strings, profiles):
+    """Repair every string with every profile, counting; returns the number of strings"""
+    text_repair.enable_stats(profiles)
+    repairers = [get_repairer(name) for name in profiles]
+    count = 0
+    for text in strings:
+        for repairer in repairers:
+            repairer(text)
+        count += 1
+    return count
+
+
+def load_runs(paths):
+    """{profile: RuleStats} summed over the ruleStats of run reports"""
+    files = []
+    for path in paths:
+        files += sorted(glob.glob(os.path.join(path, '*.json'))) if os.path.isdir(path) else [path]
+    merged = {}
+    for file in files:
+        with open(file, encoding='utf-8') as f:
+            report = json.load(f)
+        for name, profile in report.get('ruleStats', {}).items():
+            if name not in PROFILES:
+                continue
+            stats = merged.setdefault(name, RuleStats())
+            stats.calls += profile['calls']
+            stats.memo_hits += profile['memoHits']
+            stats.changed += profile['changed']
+            stats.seconds.update(profile['seconds'])
+            stats.hits.update({rule['old']: rule['hits'] for rule in profile['rules']})
+    return merged, len(files)
+
+
+def _without(repairer, rule):
+    """Copy of repairer compiled without one rule"""
+    copy = TextRepairer(repairer.profile)
+    copy.rules = [r for r in repairer.rules if r is not rule]
+    copy.pattern, copy.table = compile_rules(copy.rules)
+    return copy
+
+
+def _time(repairer, strings, rounds=3):
+    # _repair skips the memo: every string pays for the scan. GC off, as timeit does
+    best = None
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for text in strings:
+                repairer._repair(text)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        gc.enable()
+    return best
+
+
+def marginal_costs(name, strings):
+    """[(rule, seconds saved without it)] on strings, most expensive first"""
+    repairer = TextRepairer(PROFILES[name])
+    shadowed = {id(rule) for rule, _ in repairer.shadowed()}
+    _time(repairer, strings, rounds=1)  # warm-up
+    baseline = _time(repairer, strings)
+    costs = [(rule, baseline - _time(_without(repairer, rule), strings))
+             for rule in repairer.rules if id(rule) not in shadowed]
+    return sorted(costs, key=lambda item: -item[1]), baseline
+
+
+def print_report(report, top):
+    for name, profile in report.items():
+        steps = ', '.join(f'{step} {seconds:.3f}s' for step, seconds in profile['seconds'].items())
+        print(f"\n=== {name}: {profile['calls']} calls, {profile['memoHits']} memo hits, "
+              f"{profile['changed']} changed" + (f" ({steps})" if steps else ''))
+        fired = sorted((rule for rule in profile['rules'] if rule['hits']), key=lambda rule: -rule['hits'])
+        for rule in fired[:top]:
+            print(f"  {rule['hits']:>10}  {rule['group']:<18} {rule['old']!r} -> {rule['new']!r}")
+        if len(fired) > top:
+            print(f"  ... {len(fired) - top} more rules fired")
+        idle = [rule for rule in profile['rules'] if not rule['hits'] and 'shadowed' not in rule]
+        if idle:
+            print(f"  💤 Never fired ({len(idle)}): " + ', '.join(repr(rule['old']) for rule in idle))
+        for rule in profile['rules']:
+            if 'shadowed' in rule:
+                print(f"  🚫 Shadowed {rule['group']} {rule['old']!r}: {rule['shadowed']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Report how often each text repair rule fires')
+    parser.add_argument('--excel', default=None, help='Use the text cells of this workbook as the corpus')
+    parser.add_argument('--runs', nargs='+', default=None,
+                        help='Sum the rule statistics of these run reports (files or directories)')
+    parser.add_argument('--profiles', default=','.join(PROFILES),
+                        help='Comma-separated profiles (default: all)')
+    parser.add_argument('--limit', type=int, default=None, help='Documents or rows to read')
+    parser.add_argument('--top', type=int, default=15, help='Rules listed per profile')
+    parser.add_argument('--marginal-cost', type=int, default=0, metavar='N',
+                        help='Also time each rule on a sample of N strings')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=None, help='Write the report to this JSON file')
+    args = parser.parse_args()
+
+    profiles = [name.strip() for name in args.profiles.split(',') if name.strip()]
+    unknown = set(profiles) - set(PROFILES)
+    if unknown:
+        parser.error(f"Unknown profiles: {', '.join(sorted(unknown))}")
+
+    sample = []
+    if args.runs:
+        stats, files = load_runs(args.runs)
+        stats = {name: value for name, value in stats.items() if name in profiles}
+        print(f"📝 {files} run reports, {len(stats)} profiles with statistics")
+        report = stats_report(stats)
+    else:
+        strings = excel_strings(args.excel, args.limit) if args.excel else collection_strings(args.limit)
+        if args.marginal_cost:
+            strings = list(strings)
+            sample = random.Random(args.seed).sample(strings, min(args.marginal_cost, len(strings)))
+        count = run_corpus(strings, profiles)
+        print(f"📖 {count} strings through {len(profiles)} profiles")
+        report = stats_report({name: get_repairer(name).stats for name in profiles})
+
+    print_report(report, args.top)
+
+    if sample:
+        for name in profiles:
+            costs, baseline = marginal_costs(name, sample)
+            report[name]['marginalCost'] = {'baselineSeconds': round(baseline, 6), 'strings': len(sample),
+                                            'rules': [{'group': rule.group, 'old': rule.old,
+                                                       'seconds': round(saved, 6)} for rule, saved in costs]}
+            print(f"\n⏱️  {name}: {baseline * 1e6 / len(sample):.2f} µs/string; costliest rules:")
+            for rule, saved in costs[:args.top]:
+                print(f"  {saved * 1e6 / len(sample):8.3f} µs/string  {rule.group:<18} {rule.old!r}")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Report saved to {args.out}")
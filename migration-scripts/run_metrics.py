@@ -0,0 +1,210 @@
+"""Per-stage timers and counters for the migration and fix scripts
+
+A script creates one RunMetrics, times its stages (read, clean, build,
+encode, write, index), counts documents, bytes sent and fields changed per
+rule, and calls finish() at the end. finish() prints a short summary, writes
+a JSON run report to RUN_REPORT_DIR and, when METRICS_TEXTFILE is set, the
+same numbers in OpenMetrics text format (for node_exporter's textfile
+collector or a push gateway).
+
+Per-document messages go through log(), which prints nothing unless
+MIGRATION_LOG_DOCS=1: printing every fixed string was a good part of the
+cost of the fix loops. progress() prints at most once every
+PROGRESS_INTERVAL seconds.
+
+Stages nest: 'build' includes the 'clean' calls made while building, and
+with a streamed sheet it also includes reading the rows.
+
+With TEXT_REPAIR_STATS=1 the report also carries the hits of every text
+repair rule (see text_repair.stats_report).
+"""
+import json
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from text_repair import stats_report
+
+REPORT_DIR = os.getenv('RUN_REPORT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'run-reports'))
+METRICS_TEXTFILE = os.getenv('METRICS_TEXTFILE')
+LOG_DOCS = os.getenv('MIGRATION_LOG_DOCS', '') not in ('', '0')
+PROGRESS_INTERVAL = float(os.getenv('PROGRESS_INTERVAL', '5'))
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _metric_name(name):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+class RunMetrics:
+    """Timers and counters of one script run"""
+
+    def __init__(self, run, log_docs=None):
+        self.run = run
+        self.log_docs = LOG_DOCS if log_docs is None else log_docs
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        self._last_progress = 0.0
+        self._started = {}
+        self.stages = Counter()
+        self.counters = Counter()
+        self.changes = Counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] += time.perf_counter() - start
+
+    def start(self, name):
+        """Open stage name, for spans that are awkward to wrap in stage()"""
+        self._started[name] = time.perf_counter()
+
+    def stop(self, name):
+        self.stages[name] += time.perf_counter() - self._started.pop(name)
+
+    def add_time(self, name, seconds, within=None):
+        """Book seconds measured elsewhere under name (and take them out of `within`)"""
+        self.stages[name] += seconds
+        if within:
+            self.stages[within] -= seconds
+
+    def timed(self, name, iterable, within=None):
+        """Yield from iterable, booking the time spent producing each item under name
+
+        With within, that time is also taken out of the enclosing stage, e.g.
+        the cursor reads of a loop timed as a whole under 'clean'.
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_time(name, time.perf_counter() - start, within)
+                return
+            self.add_time(name, time.perf_counter() - start, within)
+            yield item
+
+    def wrap(self, name, fn):
+        """fn, with every call booked under name"""
+        stages = self.stages
+        perf_counter = time.perf_counter
+
+        def timed_fn(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                stages[name] += perf_counter() - start
+        return timed_fn
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def changed(self, rule, fields, n=1):
+        """Record the fields (e.g. the keys of a $set) one rule changed in a document
+
+        n counts several documents at once, for totals gathered elsewhere.
+        """
+        for field in fields:
+            self.changes[(rule, field)] += n
+
+    def add_writer(self, writer, within=None):
+        """Take over the write time and totals of a BulkUpdater"""
+        self.add_time('write', writer.write_time, within)
+        self.count('bytes_sent', writer.bytes_sent)
+        self.count('batches', writer.batches)
+        self.count('write_errors', writer.failed)
+        self.count('retries', writer.retries)
+
+    def log(self, message):
+        """Per-document message, only printed with MIGRATION_LOG_DOCS=1"""
+        if self.log_docs:
+            print(message)
+
+    def progress(self, message):
+        """Progress line, printed at most once every PROGRESS_INTERVAL seconds"""
+        now = time.perf_counter()
+        if now - self._last_progress >= PROGRESS_INTERVAL:
+            self._last_progress = now
+            print(message)
+
+    def report(self, **extra):
+        elapsed = time.perf_counter() - self._start
+        documents = self.counters.get('documents', 0)
+        fields = {}
+        for (rule, field), n in sorted(self.changes.items()):
+            fields.setdefault(rule, {})[field] = n
+        report = {
+            'run': self.run,
+            'startedAt': self.started_at.isoformat(timespec='seconds'),
+            'elapsedSeconds': round(elapsed, 3),
+            'docsPerSecond': round(documents / elapsed, 1) if elapsed else None,
+            'stages': {name: round(seconds, 3) for name, seconds in self.stages.items()},
+            'counters': dict(self.counters),
+            'fieldsChanged': fields,
+            **extra
+        }
+        rules = stats_report()
+        if rules:
+            report['ruleStats'] = rules
+        return report
+
+    def openmetrics(self, report):
+        run = _label(self.run)
+        lines = [
+            '# TYPE migration_elapsed_seconds gauge',
+            f'migration_elapsed_seconds{{run="{run}"}} {report["elapsedSeconds"]}',
+            '# TYPE migration_docs_per_second gauge',
+            f'migration_docs_per_second{{run="{run}"}} {report["docsPerSecond"] or 0}',
+            '# TYPE migration_stage_seconds gauge',
+        ]
+        lines += [f'migration_stage_seconds{{run="{run}",stage="{_label(name)}"}} {seconds}'
+                  for name, seconds in report['stages'].items()]
+        for name, value in report['counters'].items():
+            metric = f'migration_{_metric_name(name)}'
+            lines += [f'# TYPE {metric} gauge', f'{metric}{{run="{run}"}} {value}']
+        lines.append('# TYPE migration_fields_changed gauge')
+        lines += [f'migration_fields_changed{{run="{run}",rule="{_label(rule)}",field="{_label(field)}"}} {n}'
+                  for rule, counts in report['fieldsChanged'].items() for field, n in counts.items()]
+        rules = report.get('ruleStats', {})
+        if rules:
+            lines.append('# TYPE migration_rule_hits gauge')
+            lines += [f'migration_rule_hits{{run="{run}",profile="{_label(name)}",group="{_label(rule["group"])}",'
+                      f'rule="{_label(ascii(rule["old"])[1:-1])}"}} {rule["hits"]}'
+                      for name, profile in rules.items() for rule in profile['rules'] if rule['hits']]
+            lines.append('# TYPE migration_repair_seconds gauge')
+            lines += [f'migration_repair_seconds{{run="{run}",profile="{_label(name)}",step="{step}"}} {seconds}'
+                      for name, profile in rules.items() for step, seconds in profile['seconds'].items()]
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def finish(self, **extra):
+        """Print the summary and write the JSON report (and the OpenMetrics file)"""
+        report = self.report(**extra)
+        stages = ', '.join(f'{name} {seconds:.1f}s' for name, seconds in report['stages'].items())
+        print(f"⏱️  {self.run}: {report['elapsedSeconds']:.1f}s, {report['docsPerSecond'] or 0:.0f} docs/s"
+              + (f" ({stages})" if stages else ''))
+
+        os.makedirs(REPORT_DIR, exist_ok=True)
+        path = os.path.join(REPORT_DIR, f"{self.run}-{self.started_at:%Y%m%d-%H%M%S}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+        print(f"📝 Run report: {path}")
+
+        if METRICS_TEXTFILE:
+            # Write aside and rename, so a collector never reads half a file
+            partial = METRICS_TEXTFILE + '.partial'
+            with open(partial, 'w', encoding='utf-8') as f:
+                f.write(self.openmetrics(report))
+            os.replace(partial, METRICS_TEXTFILE)
+        return report
@@ -0,0 +1,404 @@
+"""Offline BM25 index over nombre and fines, with a local query service
+
+MongoDB's text index on nombre and fines is never used by the API, and the
+search keys (search_keys.py) find documents but do not rank them. This
+builds a BM25 inverted index on disk, from the cleaned collection or from a
+registry workbook read through the Parquet sheet cache (cleaned with the
+loaders' text_repair profile), and answers ranked queries from it:
+
+    python search_index.py build                       # from the collection
+    python search_index.py build --sheet fundaciones.xlsx
+    python search_index.py query "fomento de la cultura" --limit 10
+    python search_index.py serve --port 8765           # GET /search?q=...&limit=10
+
+Words are folded like the search keys (NFC, casefold, no accents), the
+STOPWORDS dropped and the rest reduced with a light Spanish stemmer (plural
+and gender endings, as Savoy's light stemmer does). nombre counts
+FIELD_WEIGHTS times more than fines, both in the term frequencies and the
+document lengths.
+
+The index is a directory of .npy arrays that queries memory-map, so opening
+it costs nothing and only the postings of the query terms are paged in:
+
+    terms, term_offsets           the sorted vocabulary as UTF-8, binary searched
+    postings_offsets              where each term's postings start
+    postings_docs, postings_scores
+                                  per term, documents and their BM25 score,
+                                  highest score first
+    lookup_docs, lookup_scores    the same postings by document row
+    doc_ids                       the _id of each document row
+
+Scores are final at build time (idf and length normalization included), so
+a one-term query reads only its first `limit` postings. A longer one runs
+Fagin's threshold algorithm: it reads the best postings of each term, scores
+the documents found exactly with binary searches in the lookup arrays, and
+stops once the limit-th score beats the most any unread document can score
+(the sum of the terms' next scores), reading deeper otherwise. Common terms
+no longer mean summing postings over the whole corpus, so the cost follows
+the depth needed, not the corpus size; the worst case is several terms that
+most documents share with much the same score. The index is a snapshot:
+rebuild it after a load or repair. A new build is written aside and renamed over the old one, so a
+running service keeps answering from the files it has open.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from array import array
+from collections import Counter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from search_keys import STOPWORDS as SEARCH_STOPWORDS, words
+
+INDEX_DIR = os.environ.get('SEARCH_INDEX_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                            '.search-index'))
+# Bump when the files or the stems change, so an old index is rebuilt rather than misread
+INDEX_VERSION = 2
+
+K1 = 1.2
+B = 0.75
+FIELD_WEIGHTS = {'nombre': 2.0, 'fines': 1.0}
+
+ARRAYS = ('terms', 'term_offsets', 'postings_offsets', 'postings_docs', 'postings_scores', 'lookup_docs',
+          'lookup_scores', 'doc_ids')
+
+# Postings read per term in the first round of a multi-term query; each further round reads 4 times more
+FIRST_DEPTH = 64
+
+# The search keys' stopwords and the other common Spanish function words; already folded
+STOPWORDS = SEARCH_STOPWORDS | frozenset((
+    'como', 'cual', 'cuando', 'donde', 'entre', 'era', 'es', 'esa', 'esas', 'ese', 'esos', 'esta', 'estas',
+    'este', 'esto', 'estos', 'fue', 'ha', 'han', 'hasta', 'le', 'les', 'mas', 'mi', 'muy', 'ni', 'no', 'nos',
+    'otra', 'otras', 'otro', 'otros', 'pero', 'si', 'sin', 'sobre', 'son', 'tambien', 'todo', 'todos', 'ya',
+))
+
+# Sheet layouts: (id column, nombre column, fines column, text_repair profile of the loader)
+SHEET_LAYOUTS = (
+    ('Nº Hoja Registral', 'Denominación', 'Fines', 'clean_text'),
+    ('@_idfundacion', 'Nombre', 'Fines', 'fix_encoding'),
+)
+
+
+def stem(word):
+    """Light Spanish stemmer: drops the final vowel and plural endings of words of 5+ letters
+
+    'fundaciones' -> 'fundacion', 'culturales' -> 'cultural', 'nacional' stays,
+    'luces' -> 'luz', 'intereses' -> 'inter' like 'interes'. Expects folded words
+    (no accents).
+    """
+    if len(word) < 5:
+        return word
+    last = word[-1]
+    if last in 'aeo':
+        return word[:-1]
+    if last == 's':
+        if word.endswith('eses'):
+            # 'intereses' -> 'interes', stemmed again as the singular is
+            return stem(word[:-2])
+        if word.endswith('ces'):
+            return word[:-3] + 'z'
+        if word[-2] in 'aeo':
+            return word[:-2]
+    return word
+
+
+def analyze(text):
+    """The indexed terms of a text, in order"""
+    if not isinstance(text, str):
+        return []
+    return [stem(word) for word in words(text) if word not in STOPWORDS]
+
+
+def collection_documents(collection):
+    """(_id, nombre, fines) of every document of the collection"""
+    for doc in collection.find({}, {'nombre': 1, 'fines': 1}):
+        yield doc['_id'], doc.get('nombre'), doc.get('fines')
+
+
+def sheet_documents(source):
+    """(_id, nombre, fines) of a registry workbook, cleaned as its loader cleans them"""
+    from sheet_cache import read_sheet
+    from text_repair import repair
+
+    df = read_sheet(source)
+    for id_column, nombre_column, fines_column, profile in SHEET_LAYOUTS:
+        if id_column in df.columns:
+            break
+    else:
+        raise ValueError(f"Unknown sheet layout: no {' or '.join(layout[0] for layout in SHEET_LAYOUTS)} column")
+
+    def clean(value):
+        return repair(value, profile) if isinstance(value, str) else None
+
+    for _id, nombre, fines in zip(df[id_column], df[nombre_column], df[fines_column]):
+        yield int(_id), clean(nombre), clean(fines)
+
+
+def _write(path, arrays, meta):
+    """Write the index aside and rename it over path"""
+    partial = path + '.partial'
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+    for name in ARRAYS:
+        np.save(os.path.join(partial, name + '.npy'), arrays[name])
+    with open(os.path.join(partial, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    previous = path + '.old'
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, previous)
+    os.rename(partial, path)
+    shutil.rmtree(previous, ignore_errors=True)
+
+
+def build_index(documents, path=INDEX_DIR, source=''):
+    """Index (_id, nombre, fines) tuples into path; returns the index metadata"""
+    vocabulary = {}
+    term_rows, doc_rows, frequencies = array('i'), array('i'), array('f')
+    ids, lengths = [], array('f')
+
+    for row, (_id, nombre, fines) in enumerate(documents):
+        counts = Counter()
+        length = 0.0
+        for field, text in (('nombre', nombre), ('fines', fines)):
+            terms = analyze(text)
+            length += FIELD_WEIGHTS[field] * len(terms)
+            for term in terms:
+                counts[term] += FIELD_WEIGHTS[field]
+        for term, frequency in counts.items():
+            term_rows.append(vocabulary.setdefault(term, len(vocabulary)))
+            doc_rows.append(row)
+            frequencies.append(frequency)
+        ids.append(_id)
+        lengths.append(length)
+
+    n = len(ids)
+    terms = sorted(vocabulary)
+    rank = np.empty(len(terms), dtype=np.int64)
+    rank[[vocabulary[term] for term in terms]] = np.arange(len(terms))
+
+    term = rank[np.frombuffer(term_rows, dtype=np.int32)]
+    doc = np.frombuffer(doc_rows, dtype=np.int32)
+    tf = np.frombuffer(frequencies, dtype=np.float32).astype(np.float64)
+    dl = np.frombuffer(lengths, dtype=np.float32).astype(np.float64)
+    avgdl = dl.mean() if n and dl.mean() > 0 else 1.0
+
+    df = np.bincount(term, minlength=len(terms))
+    idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+    scores = idf[term] * tf * (K1 + 1) / (tf + K1 * (1 - B + B * dl[doc] / avgdl))
+
+    # By term, then best score first; stable, so ties keep the document order
+    order = np.lexsort((-scores, term))
+    by_doc = np.argsort(term, kind='stable')
+    encoded = [t.encode('utf-8') for t in terms]
+    term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    term_offsets[1:] = np.cumsum([len(t) for t in encoded])
+    postings_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    postings_offsets[1:] = np.cumsum(df)
+
+    arrays = {
+        'terms': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+        'term_offsets': term_offsets,
+        'postings_offsets': postings_offsets,
+        'postings_docs': doc[order].astype(np.int32),
+        'postings_scores': scores[order].astype(np.float32),
+        'lookup_docs': doc[by_doc].astype(np.int32),
+        'lookup_scores': scores[by_doc].astype(np.float32),
+        'doc_ids': np.asarray(ids, dtype=np.int64),
+    }
+    meta = {
+        'version': INDEX_VERSION,
+        'documents': n,
+        'terms': len(terms),
+        'postings': int(len(order)),
+        'avgdl': float(avgdl),
+        'k1': K1,
+        'b': B,
+        'fieldWeights': FIELD_WEIGHTS,
+        'source': source,
+        'builtAt': datetime.now().isoformat(timespec='seconds'),
+    }
+    _write(path, arrays, meta)
+    return meta
+
+
+class SearchIndex:
+    """A built index, memory-mapped"""
+
+    def __init__(self, path=INDEX_DIR):
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != INDEX_VERSION:
+            raise ValueError(f"Index version {self.meta.get('version')}, expected {INDEX_VERSION}: rebuild it")
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, name + '.npy'), mmap_mode='r'))
+
+    def term_row(self, term):
+        """Position of a term in the vocabulary, or None"""
+        key = term.encode('utf-8')
+        lo, hi = 0, len(self.term_offsets) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe = self.terms[self.term_offsets[mid]:self.term_offsets[mid + 1]].tobytes()
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return mid
+        return None
+
+    def _span(self, row):
+        return int(self.postings_offsets[row]), int(self.postings_offsets[row + 1])
+
+    def _score(self, spans, docs):
+        """Exact scores of document rows (sorted, unique) for the query terms"""
+        totals = np.zeros(len(docs))
+        for start, end in spans:
+            found = start + np.searchsorted(self.lookup_docs[start:end], docs)
+            inside = found < end
+            hit = np.zeros(len(docs), dtype=bool)
+            hit[inside] = self.lookup_docs[found[inside]] == docs[inside]
+            totals[hit] += self.lookup_scores[found[hit]]
+        return totals
+
+    def search(self, text, limit=20):
+        """[(_id, score)] of the best `limit` documents for a query, best first"""
+        rows = [self.term_row(term) for term in dict.fromkeys(analyze(text))]
+        spans = [self._span(row) for row in rows if row is not None]
+        if not spans or limit <= 0:
+            return []
+
+        if len(spans) == 1:
+            start, end = spans[0]
+            end = min(end, start + limit)
+            docs, totals = self.postings_docs[start:end], self.postings_scores[start:end].astype(np.float64)
+        else:
+            longest = max(end - start for start, end in spans)
+            scored, scores = np.empty(0, dtype=np.int32), np.empty(0)
+            read, depth = 0, max(FIRST_DEPTH, limit)
+            while True:
+                # Each round reads the next postings of every term and scores the documents not scored yet
+                found = np.unique(np.concatenate([self.postings_docs[start + read:min(end, start + depth)]
+                                                  for start, end in spans]))
+                found = found[~np.isin(found, scored, assume_unique=True)]
+                scored = np.concatenate([scored, found])
+                scores = np.concatenate([scores, self._score(spans, found)])
+                # Ties are cut by document order, as a full scan would
+                order = np.lexsort((scored, -scores))[:limit]
+                docs, totals = scored[order], scores[order]
+                if depth >= longest:
+                    break
+                # The most a document not read yet can score
+                bound = sum(float(self.postings_scores[start + depth]) for start, end in spans if start + depth < end)
+                if len(docs) == limit and totals[-1] > bound:
+                    break
+                read, depth = depth, depth * 4
+
+        return [(int(self.doc_ids[doc]), float(score)) for doc, score in zip(docs, totals)]
+
+
+def serve(index, host='127.0.0.1', port=8765):
+    """GET /search?q=...&limit=20 -> ranked _ids as JSON; GET /health -> the index metadata"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+            if url.path == '/health':
+                return self._send(200, index.meta)
+            if url.path != '/search':
+                return self._send(404, {'error': 'Not found'})
+            query = params.get('q', [''])[0]
+            try:
+                limit = int(params.get('limit', ['20'])[0])
+            except ValueError:
+                return self._send(400, {'error': 'limit must be an integer'})
+            started = time.perf_counter()
+            results = index.search(query, limit)
+            took = (time.perf_counter() - started) * 1000
+            self._send(200, {'query': query, 'tookMs': round(took, 3),
+                             'results': [{'_id': _id, 'score': round(score, 4)} for _id, score in results]})
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"🔎 Serving {index.meta['documents']} documents on http://{host}:{port}/search?q=...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='BM25 index over nombre and fines')
+    parser.add_argument('--index', default=INDEX_DIR, help=f'Index directory (default: {INDEX_DIR})')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='Build the index')
+    build.add_argument('--sheet', help='Registry workbook to index instead of the collection')
+    query = commands.add_parser('query', help='Print the best matches of a query')
+    query.add_argument('text')
+    query.add_argument('--limit', type=int, default=20)
+    server = commands.add_parser('serve', help='Answer GET /search?q=... over HTTP')
+    server.add_argument('--host', default='127.0.0.1')
+    server.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'build':
+            from run_metrics import RunMetrics
+
+            metrics = RunMetrics('search-index')
+            if args.sheet:
+                print(f"📖 Indexing {args.sheet}...")
+                documents, source = sheet_documents(args.sheet), os.path.basename(args.sheet)
+            else:
+                from dotenv import load_dotenv
+                from pymongo import MongoClient
+
+                load_dotenv()
+                client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+                collection = client[os.getenv('MONGODB_DB_NAME', 'fundaciones_espana')].fundaciones
+                print("📖 Indexing the 'fundaciones' collection...")
+                documents, source = collection_documents(collection), 'fundaciones'
+            with metrics.stage('index'):
+                meta = build_index(metrics.timed('read', documents, within='index'), args.index, source)
+            metrics.count('documents', meta['documents'])
+            print(f"🎉 Index saved to {args.index} ({meta['documents']} documents, {meta['terms']} terms, "
+                  f"{meta['postings']} postings)")
+            metrics.finish(terms=meta['terms'], postings=meta['postings'])
+        elif args.command == 'query':
+            index = SearchIndex(args.index)
+            started = time.perf_counter()
+            results = index.search(args.text, args.limit)
+            took = (time.perf_counter() - started) * 1000
+            for _id, score in results:
+                print(f"{_id}\t{score:.4f}")
+            print(f"🔎 {len(results)} results in {took:.2f} ms", file=sys.stderr)
+        else:
+            serve(SearchIndex(args.index), args.host, args.port)
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Normalized search keys for /api/fundaciones and the export route
+
+The routes searched nombre, nif and fines with an unanchored,
+case-insensitive $regex, which no index can serve (every keystroke scanned
+the collection) and which missed 'Fundacion' for 'Fundación'. Every
+document now carries keys folded once at ingest:
+
+    nombreNorm    the name NFC-normalized, casefolded, without accents and
+                  punctuation, words separated by one space
+    nifNorm       the NIF in capitals without spaces, dots or dashes
+    nombreTokens  the words of the name and their prefixes from
+                  MIN_PREFIX letters, deduplicated
+    finesTokens   the words of fines without STOPWORDS, deduplicated
+
+each with an index (multikey for the arrays), so the routes search with
+anchored prefixes and equality lookups (see src/lib/search.ts, which folds
+the query the same way; keep the two in step).
+
+Loaders add them in their document builders and repairs (run_repair() and
+the fix-*.py scripts' FixWriter) recompute the ones whose source field
+changed (search_key_updates).
+
+    python search_keys.py      # (re)compute them for the whole collection, e.g. after editing 'fundaciones' by hand
+"""
+import math
+import os
+import re
+import unicodedata
+
+SEARCH_FIELDS = ('nombreNorm', 'nifNorm', 'nombreTokens', 'finesTokens')
+
+# Source field -> the keys derived from it
+SOURCE_FIELDS = {
+    'nombre': ('nombreNorm', 'nombreTokens'),
+    'nif': ('nifNorm',),
+    'fines': ('finesTokens',),
+}
+
+# Shortest prefix stored for the name words; shorter words are stored whole
+MIN_PREFIX = 3
+
+# Too common in fines to narrow a search; already folded
+STOPWORDS = frozenset((
+    'a', 'al', 'con', 'de', 'del', 'e', 'el', 'en', 'la', 'las', 'lo', 'los', 'o', 'para',
+    'por', 'que', 'se', 'su', 'sus', 'u', 'un', 'una', 'y',
+))
+
+WORD = re.compile(r'[^\W_]+')
+NIF_JUNK = re.compile(r'[^0-9A-Z]+')
+
+
+def _text(value):
+    """The text of a cell; None for null and NaN"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return value if isinstance(value, str) else str(value)
+
+
+def fold(text):
+    """NFC, casefold, then drop the accents (NFKD without combining marks)"""
+    text = unicodedata.normalize('NFC', text).casefold()
+    return ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+
+
+def words(text):
+    """The folded words of a text, in order"""
+    return WORD.findall(fold(text))
+
+
+def _unique(items):
+    return list(dict.fromkeys(items))
+
+
+def prefixes(tokens):
+    """Each word with its prefixes from MIN_PREFIX characters, deduplicated"""
+    return _unique(token[:end] for token in tokens
+                   for end in range(min(MIN_PREFIX, len(token)), len(token) + 1))
+
+
+def normalize_nif(value):
+    text = _text(value)
+    if text is None:
+        return None
+    return NIF_JUNK.sub('', fold(text).upper()) or None
+
+
+def nombre_keys(value):
+    text = _text(value)
+    tokens = words(text) if text is not None else []
+    return {'nombreNorm': ' '.join(tokens) or None, 'nombreTokens': prefixes(tokens)}
+
+
+def fines_keys(value):
+    text = _text(value)
+    tokens = words(text) if text is not None else []
+    return {'finesTokens': _unique(token for token in tokens if token not in STOPWORDS)}
+
+
+def search_keys(doc):
+    """The SEARCH_FIELDS of a document, in that order"""
+    return {**nombre_keys(doc.get('nombre')), 'nifNorm': normalize_nif(doc.get('nif')),
+            **fines_keys(doc.get('fines'))}
+
+
+def add_search_keys(doc):
+    """Add the search keys to a document being built; returns it"""
+    keys = search_keys(doc)
+    for field in SEARCH_FIELDS:
+        doc[field] = keys[field]
+    return doc
+
+
+def search_key_updates(doc, changed):
+    """The $set of the keys whose source field is among the changed $set keys"""
+    sources = {key.split('.')[0] for key in changed} & SOURCE_FIELDS.keys()
+    if not sources:
+        return {}
+    keys = search_keys(doc)
+    return {field: keys[field] for source in sorted(sources) for field in SOURCE_FIELDS[source]}
+
+
+def backfill(collection, batch_size=None):
+    """Recompute the keys of every document; returns how many changed"""
+    from bulk_writer import BulkUpdater
+
+    writer = BulkUpdater(collection, batch_size=batch_size)
+    updated = 0
+    projection = {field: 1 for field in (*SOURCE_FIELDS, *SEARCH_FIELDS)}
+    for doc in collection.find({}, projection):
+        keys = search_keys(doc)
+        update = {field: value for field, value in keys.items() if doc.get(field, ()) != value}
+        if update:
+            writer.update(doc['_id'], update)
+            updated += 1
+            if updated % 5000 == 0:
+                print(f"✅ Updated {updated} documents...")
+    writer.flush()
+    return updated
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    from index_manifest import build_indexes
+
+    load_dotenv()
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    collection = client[os.getenv('MONGODB_DB_NAME', 'fundaciones_espana')].fundaciones
+    print("🔎 Computing the search keys of 'fundaciones'...")
+    print(f"🎉 Search keys updated on {backfill(collection)} documents")
+    build_indexes(collection)
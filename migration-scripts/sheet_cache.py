@@ -0,0 +1,244 @@
+"""Parquet cache of the parsed registry workbook
+
+Parsing the .xls is the slowest step of every script that reads it, and the
+analyzer, the migrators and the encoding tests all parse the same file.
+read_sheet() parses the first sheet once and keeps the result as a Parquet
+file named after the SHA-1 of the workbook bytes; the next read of the same
+file memory-maps that copy instead. Column dtypes are recorded with it so a
+cached read gives back the same DataFrame read_excel() did (same dtypes, NaN
+for empty cells), and source_fingerprint() of either one is the same.
+
+Every column has a fixed Arrow type, so any Parquet reader can open the
+entries. Object columns are stored as strings; those mixing text with
+numbers or dates (postal codes, phone numbers) also get an int8 column with
+the Python type of each cell (CELL_TYPES), which turns them back on read. A
+sheet with cells of any other type is not cached.
+
+Entries live in SHEET_CACHE_DIR (default: .sheet-cache next to this file).
+After each write the least recently used entries are removed until the
+cache fits in SHEET_CACHE_MAX_MB. SHEET_CACHE_DIR= (empty) turns the cache
+off, and so does a missing pyarrow.
+"""
+import hashlib
+import io
+import json
+import os
+import time
+from datetime import date, datetime, time as clock
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = os.environ.get('SHEET_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                           '.sheet-cache'))
+CACHE_MAX_MB = float(os.environ.get('SHEET_CACHE_MAX_MB', 2048))
+
+# Bump when the stored layout changes, so old entries are not read back
+CACHE_VERSION = 2
+
+METADATA_KEY = b'sheet_cache'
+
+
+def _contents(source):
+    """(path, bytes) of a source: path, bytes or file-like object"""
+    if isinstance(source, str):
+        return source, None
+    if isinstance(source, bytes):
+        return None, source
+    contents = source.read()
+    source.seek(0)
+    return None, contents
+
+
+def file_hash(source):
+    """SHA-1 of the workbook bytes"""
+    path, contents = _contents(source)
+    digest = hashlib.sha1()
+    if contents is not None:
+        digest.update(contents)
+    else:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(source, options):
+    """Workbook hash + the read_excel() options that change the result"""
+    # The engine only decides how the file is parsed, not what comes out
+    options = {key: value for key, value in options.items() if key != 'engine'}
+    digest = hashlib.sha1(file_hash(source).encode('ascii'))
+    digest.update(json.dumps([CACHE_VERSION, pd.__version__, options], sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+# Cell types of the mixed object columns: code -> (type, to text, from text).
+# Exact types: bool is not an int here, and Timestamp is not a datetime
+CELL_TYPES = {
+    0: (str, str, str),
+    1: (int, str, int),
+    2: (float, repr, float),
+    3: (bool, str, lambda text: text == 'True'),
+    4: (pd.Timestamp, pd.Timestamp.isoformat, pd.Timestamp),
+    5: (datetime, datetime.isoformat, datetime.fromisoformat),
+    6: (date, date.isoformat, date.fromisoformat),
+    7: (clock, clock.isoformat, clock.fromisoformat),
+}
+CELL_CODES = {cell_type: code for code, (cell_type, _, _) in CELL_TYPES.items()}
+
+
+class UncachableSheet(ValueError):
+    """A cell whose type has no entry in CELL_TYPES"""
+
+
+def _column_kind(series):
+    """How an object column is stored: 'string' (text only) or 'mixed' (text + cell types)"""
+    kinds = {type(value) for value in series.dropna()}
+    if kinds <= {str}:
+        return 'string'
+    unknown = kinds - CELL_CODES.keys()
+    if unknown:
+        raise UncachableSheet(f"column {series.name!r} has {', '.join(sorted(t.__name__ for t in unknown))} cells")
+    return 'mixed'
+
+
+def _to_table(df):
+    import pyarrow as pa
+
+    columns, names, kinds = [], [], []
+    for i, (name, series) in enumerate(df.items()):
+        kind = str(series.dtype)
+        if series.dtype == object:
+            kind = _column_kind(series)
+            values = series.tolist()
+            if kind == 'mixed':
+                codes = [None if pd.isna(value) else CELL_CODES[type(value)] for value in values]
+                values = [None if code is None else CELL_TYPES[code][1](value)
+                          for code, value in zip(codes, values)]
+                columns.append(pa.array(codes, type=pa.int8()))
+                names.append(f'{i}.type')
+            columns.append(pa.array(values, type=pa.string(), from_pandas=True))
+        else:
+            columns.append(pa.Array.from_pandas(series))
+        names.append(str(i))
+        kinds.append(kind)
+
+    # Column labels may repeat or not be strings: store positions, keep labels aside
+    table = pa.Table.from_arrays(columns, names=names)
+    metadata = {'columns': list(df.columns), 'kinds': kinds, 'rows': len(df)}
+    return table.replace_schema_metadata({METADATA_KEY: json.dumps(metadata, default=str).encode('utf-8')})
+
+
+def _from_table(table):
+    import pyarrow.compute as pc
+
+    metadata = json.loads(table.schema.metadata[METADATA_KEY])
+    data = {}
+    for i, kind in enumerate(metadata['kinds']):
+        column = table.column(str(i))
+        if kind == 'mixed':
+            # Codes straight from the Arrow buffer, -1 for empty cells
+            codes = pc.fill_null(table.column(f'{i}.type'), -1).to_numpy()
+            texts = column.to_numpy(zero_copy_only=False)
+            values = np.full(len(texts), np.nan, dtype=object)
+            for code in np.unique(codes[codes >= 0]).tolist():
+                rows = codes == code
+                parse = CELL_TYPES[code][2]
+                values[rows] = texts[rows] if code == 0 else [parse(text) for text in texts[rows]]
+            data[i] = pd.Series(values, dtype=object)
+        elif kind == 'string':
+            values = column.to_numpy(zero_copy_only=False)
+            # Empty cells are NaN in read_excel(), not None
+            values[pc.is_null(column).to_numpy()] = np.nan
+            data[i] = pd.Series(values, dtype=object)
+        else:
+            data[i] = column.to_pandas().astype(kind, copy=False)
+    df = pd.DataFrame(data, index=pd.RangeIndex(table.num_rows))
+    df.columns = metadata['columns']
+    return df
+
+
+def _evict(keep):
+    """Drop least recently used entries until the cache fits in CACHE_MAX_MB"""
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith('.parquet'):
+            path = os.path.join(CACHE_DIR, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    limit = CACHE_MAX_MB * 1024 * 1024
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        if path == keep:
+            continue
+        os.remove(path)
+        total -= size
+        print(f"🧹 Evicted {os.path.basename(path)} from the sheet cache")
+
+
+def _entry_path(source, read_excel_options):
+    """Where the cache entry of a read goes, or None when the cache is off"""
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return None
+    if not CACHE_DIR:
+        return None
+    return os.path.join(CACHE_DIR, cache_key(source, read_excel_options) + '.parquet')
+
+
+def _read_entry(path, rows=None):
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path, memory_map=True)
+    df = _from_table(table if rows is None else table.slice(0, rows))
+    # The mtime is the last use: eviction keeps the entries in use
+    os.utime(path)
+    print(f"⚡ Sheet read from cache ({os.path.basename(path)[:12]}...)")
+    return df
+
+
+def read_sheet(source, **read_excel_options):
+    """pd.read_excel(source, **options), served from the Parquet cache when possible
+
+    source: a path, the file contents as bytes, or a file-like object.
+    """
+    path = _entry_path(source, read_excel_options)
+    if path is None:
+        return pd.read_excel(_excel_input(source), **read_excel_options)
+    if os.path.exists(path):
+        return _read_entry(path)
+
+    import pyarrow.parquet as pq
+
+    df = pd.read_excel(_excel_input(source), **read_excel_options)
+    started = time.time()
+    try:
+        table = _to_table(df)
+    except UncachableSheet as e:
+        print(f"⚠️  Sheet not cached: {e}")
+        return df
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Write aside and rename, so a killed run never leaves half an entry
+    partial = path + '.partial'
+    pq.write_table(table, partial)
+    os.replace(partial, path)
+    print(f"💾 Sheet cached in {time.time() - started:.1f}s ({os.path.getsize(path) / (1024 * 1024):.1f} MB)")
+    _evict(path)
+    return df
+
+
+def read_sheet_head(source, nrows, **read_excel_options):
+    """The first nrows rows of read_sheet(): from the cache entry when there is one,
+    else pd.read_excel(nrows=nrows), which is not cached"""
+    path = _entry_path(source, read_excel_options)
+    if path is not None and os.path.exists(path):
+        return _read_entry(path, nrows)
+    return pd.read_excel(_excel_input(source), nrows=nrows, **read_excel_options)
+
+
+def _excel_input(source):
+    return io.BytesIO(source) if isinstance(source, bytes) else source
@@ -1,10 +1,10 @@
-import pandas as pd
+from sheet_cache import read_sheet_head
 
 # Test the encoding fix approach
 def test_encoding_fix():
     # Read a sample from the Excel file
     file_path = "/Users/paulo/Documents/Proyectos/Trabajo/Captaru/Datos Subvenciones/BBDD de fundaciones España actualizada 040724.xls"
-    df = pd.read_excel(file_path, nrows=10)
+    df = read_sheet_head(file_path, 10)
     
     print("Original text samples:")
     for i, row in df.iterrows():
@@ -16,7 +16,7 @@ def test_encoding_fix():
     print("\nTesting encoding fixes:")
     
     # Test different approaches
-    test_text = "REAL FUNDACIÃ"N DE TOLEDO"
+    test_text = "REAL FUNDACIÃ“N DE TOLEDO"
     print(f"Original: {test_text}")
     
     # Approach 1: Try latin-1 to utf-8
@@ -34,7 +34,7 @@ def test_encoding_fix():
         print(f"Method 2 failed: {e}")
     
     # Approach 3: Manual replacement
-    fixed3 = test_text.replace('Ã"', 'Ó')
+    fixed3 = test_text.replace('Ã“', 'Ó')
     print(f"Method 3 (manual): {fixed3}")
 
 if __name__ == "__main__":
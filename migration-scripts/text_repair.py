@@ -0,0 +1,558 @@
+"""Shared text repair engine for the migration and fix scripts
+
+All the replacement tables of the fix-*.py scripts live here as one ordered
+rule set. A profile selects which rule groups apply, and within them the patterns its
+legacy function replaced (plus HTML unescaping, invisible character removal
+and whitespace collapsing), and is compiled into
+a single trie-shaped regex, so each string is scanned once whatever the
+number of rules. At each position the longest matching rule wins; for the
+same pattern the rule listed first wins.
+
+With TEXT_REPAIR_STATS=1 (or enable_stats()) every repairer also counts how
+often each rule fires and the time spent in each step; rule_report.py turns
+that into a report of hot, idle and shadowed rules.
+"""
+import html
+import os
+import re
+import time
+from collections import Counter, namedtuple
+
+Rule = namedtuple('Rule', ['group', 'old', 'new'])
+
+RULES = [
+    # Smart quotes left behind by a cp1252 round trip (fix-encoding-simple-v2.py)
+    Rule('smart_quotes', chr(8220), 'Ó'),
+    Rule('smart_quotes', chr(8216), 'Ñ'),
+    Rule('smart_quotes', chr(61837), 'Í'),
+
+    # The same characters when they are just noise (restore-from-excel-production.py)
+    Rule('invisible', chr(8220), ''),
+    Rule('invisible', chr(8216), ''),
+    Rule('invisible', chr(61837), ''),
+
+    # Literal XML/HTML entities
+    Rule('entities', '&#xD;', '\n'),
+    Rule('entities', '&#xA;', '\n'),
+    Rule('entities', '&#x0D;', '\n'),
+    Rule('entities', '&#x0A;', '\n'),
+    Rule('entities', '&#13;', '\n'),
+    Rule('entities', '&#10;', '\n'),
+    Rule('entities', '&#x20;', ' '),
+    Rule('entities', '&amp;', '&'),
+    Rule('entities', '&lt;', '<'),
+    Rule('entities', '&gt;', '>'),
+    Rule('entities', '&quot;', '"'),
+    Rule('entities', '&apos;', "'"),
+
+    # UTF-8 read as cp1252/latin-1
+    Rule('mojibake', 'Ã¡', 'á'),
+    Rule('mojibake', 'Ã©', 'é'),
+    Rule('mojibake', 'Ã­', 'í'),
+    Rule('mojibake', 'Ã³', 'ó'),
+    Rule('mojibake', 'Ãº', 'ú'),
+    Rule('mojibake', 'Ã\xa0', 'à'),
+    Rule('mojibake', 'Ã¨', 'è'),
+    Rule('mojibake', 'Ã¬', 'ì'),
+    Rule('mojibake', 'Ã²', 'ò'),
+    Rule('mojibake', 'Ã¹', 'ù'),
+    Rule('mojibake', 'Ã¢', 'â'),
+    Rule('mojibake', 'Ãª', 'ê'),
+    Rule('mojibake', 'Ã®', 'î'),
+    Rule('mojibake', 'Ã´', 'ô'),
+    Rule('mojibake', 'Ã»', 'û'),
+    Rule('mojibake', 'Ã\x81', 'Á'),
+    Rule('mojibake', 'Ã‰', 'É'),
+    Rule('mojibake', 'Ã\x8d', 'Í'),
+    Rule('mojibake', 'Ã“', 'Ó'),
+    Rule('mojibake', 'Ãš', 'Ú'),
+    Rule('mojibake', 'Ã€', 'À'),
+    Rule('mojibake', 'Ãˆ', 'È'),
+    Rule('mojibake', 'ÃŒ', 'Ì'),
+    Rule('mojibake', 'Ã™', 'Ù'),
+    Rule('mojibake', 'Ã‚', 'Â'),
+    Rule('mojibake', 'ÃŠ', 'Ê'),
+    Rule('mojibake', 'ÃŽ', 'Î'),
+    Rule('mojibake', 'Ã”', 'Ô'),
+    Rule('mojibake', 'Ã›', 'Û'),
+    Rule('mojibake', 'Ã±', 'ñ'),
+    Rule('mojibake', 'Ã‘', 'Ñ'),
+    Rule('mojibake', 'Ã§', 'ç'),
+    Rule('mojibake', 'Ã‡', 'Ç'),
+    Rule('mojibake', 'Ã¼', 'ü'),
+    Rule('mojibake', 'Ãœ', 'Ü'),
+    Rule('mojibake', 'Ã¤', 'ä'),
+    Rule('mojibake', 'Ã„', 'Ä'),
+    Rule('mojibake', 'Ã¶', 'ö'),
+    Rule('mojibake', 'Ã–', 'Ö'),
+
+    # Punctuation and symbols read as cp1252
+    Rule('symbols', 'Â¡', '¡'),
+    Rule('symbols', 'Â¿', '¿'),
+    Rule('symbols', 'Â°', '°'),
+    Rule('symbols', 'â€œ', '"'),
+    Rule('symbols', 'â€\x9d', '"'),
+    Rule('symbols', 'â€™', "'"),
+    Rule('symbols', 'â€“', '–'),
+    Rule('symbols', 'â€”', '—'),
+    Rule('symbols', 'â‚¬', '€'),
+
+    # Mojibake whose second byte was already lost (fix-encoding-final.py)
+    Rule('mojibake_lossy', 'Ã"', 'Ó'),
+    Rule('mojibake_lossy', 'Ã', 'Á'),
+
+    # Ordinals (fix-ordinal-numbers.py)
+    *[Rule('ordinals', f'{d}Âº', f'{d}º') for d in '1234567890'],
+    *[Rule('ordinals', f'{d}Âª', f'{d}ª') for d in '1234567890'],
+    Rule('ordinals', 'Âº', 'º'),
+    Rule('ordinals', 'Âª', 'ª'),
+
+    # OCR / manual corruption (fix-html-entities.py, fix-remaining-entities.py)
+    Rule('corruption', ' ele ', ' de '),
+    Rule('corruption', 'ele arte', 'de arte'),
+    Rule('corruption', 'M Musco', 'el Museo'),
+    Rule('corruption', "d' Art", "d'Art"),
+    Rule('corruption', 'ulteriores', 'posteriores'),
+    Rule('corruption', '.Thyssen-Bornemisza', ' Thyssen-Bornemisza'),
+    Rule('corruption', " o' ", " o "),
+    Rule('corruption', 'pruvisrn9', 'previstos'),
+    Rule('corruption', ' (le ', ' de '),
+    Rule('corruption', '(le ', 'de '),
+    Rule('corruption', 'Musco', 'Museo'),
+    Rule('corruption', 'Muscoâ', 'Museo'),
+    Rule('corruption', 'Museoâ', 'Museo'),
+    Rule('corruption', 'encada', 'en cada'),
+    Rule('corruption', 'criterior', 'criterios'),
+    Rule('corruption', 'MÁšSICA', 'MÚSICA'),
+    Rule('corruption', 'NÁšÑEZ', 'NÚÑEZ'),
+    Rule('corruption', 'SÁšBITO', 'SÚBITO'),
+    Rule('corruption', 'COMÁšN', 'COMÚN'),
+    Rule('corruption', 'SANLÁšCAR', 'SANLÚCAR'),
+    Rule('corruption', 'ARGÁœELLO', 'ARGÜELLO'),
+    Rule('corruption', 'PAILÁš', 'PAILÁ'),
+    Rule('corruption', 'RAÁšL', 'RAÚL'),
+
+    # Only fix-html-entities.py applied these, they are too broad for names
+    Rule('corruption_legacy', ' M Musco', ' el Museo'),
+    Rule('corruption_legacy', ' M ', ' el '),
+
+    # Doubled accented capitals (fix-double-accents.py)
+    Rule('double_accents', 'MEDITERRÁÁ', 'MEDITERRÁ'),
+    Rule('double_accents', 'BRITÁNÁ', 'BRITÁ'),
+    Rule('double_accents', 'ÁÁ', 'Á'),
+    Rule('double_accents', 'ÉÉ', 'É'),
+    Rule('double_accents', 'ÍÍ', 'Í'),
+    Rule('double_accents', 'ÓÓ', 'Ó'),
+    Rule('double_accents', 'ÚÚ', 'Ú'),
+    Rule('double_accents', 'ÑÑ', 'Ñ'),
+
+    # Leftovers of the lossy 'Ã' -> 'Á' fix (fix-encoding-final-clean.py)
+    Rule('accent_artifacts', 'ÁÓ', 'Ó'),
+    Rule('accent_artifacts', 'ÁÑ', 'Ñ'),
+    Rule('accent_artifacts', 'ÁÍ', 'Í'),
+]
+
+# Everything clean_invisible_chars() does not whitelist
+DISALLOWED_CHARS = re.compile(r'[^\w\sÁÉÍÓÚáéíóúÑñ.,;:()\-¿?¡!/@#$%&*+=<>{}[\]\\|"\'`~]')
+
+Profile = namedtuple('Profile', ['groups', 'patterns', 'unescape_html', 'drop_disallowed', 'collapse_whitespace',
+                                 'strip'])
+
+
+def profile(*groups, patterns=None, unescape_html=False, drop_disallowed=False, collapse_whitespace=False,
+            strip=False):
+    """patterns: the only rule patterns of the groups that apply (default: all of them)"""
+    return Profile(groups, None if patterns is None else frozenset(patterns), unescape_html, drop_disallowed,
+                   collapse_whitespace, strip)
+
+
+# The patterns each legacy function actually replaced, where it used only part of a group
+VOWELS = ('Ã¡', 'Ã©', 'Ã­', 'Ã³', 'Ãº', 'Ã±')
+CORRUPTION = (' ele ', 'M Musco', "d' Art", 'ulteriores', '.Thyssen-Bornemisza', " o' ", 'pruvisrn9', '(le ')
+NEWLINES = ('&#xD;', '&#xA;')
+
+
+# One profile per legacy cleaning function, named after it
+PROFILES = {
+    'fix_encoding': profile('mojibake'),
+    'fix_encoding_simple': profile('mojibake', patterns=(*VOWELS, 'Ã‘', 'Ã‰', 'Ã“')),
+    # Its bare 'Ã' -> 'Á' ran before the grave accents, so those never fired
+    'fix_encoding_final': profile('mojibake', 'mojibake_lossy', patterns=(*VOWELS, 'Ã‰', 'Ã"', 'Ã')),
+    'fix_encoding_v2': profile('smart_quotes', 'mojibake', patterns=(chr(8220), chr(8216), chr(61837), *VOWELS),
+                               strip=True),
+    'fix_unicode_chars': profile('smart_quotes'),
+    'final_clean_text': profile('accent_artifacts'),
+    'clean_text': profile('invisible', 'entities', 'mojibake', 'symbols', 'ordinals',
+                          patterns=(chr(8220), chr(8216), chr(61837), *NEWLINES, '&#x20;',
+                                    *VOWELS, 'Ã‘', 'Ã\x81', 'Ã‰', 'Ã\x8d', 'Ã“', 'Ãš',
+                                    *(rule.old for rule in RULES if rule.group == 'symbols'),
+                                    'Âº', 'Âª', '1Âª', '2Âº', '3Âº', '4Âº'),
+                          collapse_whitespace=True),
+    'fix_html_entities_and_corruption': profile('entities', 'corruption', 'corruption_legacy',
+                                                patterns=(*NEWLINES, '&amp;', '&lt;', '&gt;', '&quot;', '&apos;',
+                                                          *CORRUPTION, ' M Musco', ' M '),
+                                                unescape_html=True, collapse_whitespace=True),
+    'comprehensive_text_cleanup': profile('entities', 'ordinals', 'symbols', 'corruption',
+                                          patterns=(*NEWLINES, '&#x0D;', '&#x0A;', '&#13;', '&#10;', '2Âº', 'Âº',
+                                                    'Â¡', *CORRUPTION, 'ele arte', ' (le ', 'Musco', 'Muscoâ',
+                                                    'Museoâ', 'encada', 'criterior', 'MÁšSICA', 'NÁšÑEZ',
+                                                    'SÁšBITO', 'COMÁšN', 'SANLÁšCAR', 'ARGÁœELLO', 'PAILÁš',
+                                                    'RAÁšL'),
+                                          unescape_html=True, collapse_whitespace=True),
+    'fix_ordinal_numbers': profile('ordinals', strip=True),
+    'fix_double_accents': profile('double_accents'),
+    'clean_invisible_chars': profile(drop_disallowed=True, collapse_whitespace=True),
+}
+
+# Short values (provincias, estados, cargos...) repeat a lot, long ones (fines) don't
+MEMO_MAX_LENGTH = 120
+MEMO_SIZE = 100000
+
+# Whitespace str.split()/str.strip() know about, other than ' ', spelled for
+# the server (MongoDB's PCRE \s is ASCII only)
+SERVER_WHITESPACE = (r'[\t\n\x{b}\x{c}\r\x{1c}-\x{1f}\x{85}\x{a0}\x{1680}\x{2000}-\x{200a}'
+                     r'\x{2028}\x{2029}\x{202f}\x{205f}\x{3000}]')
+
+# Off by default: counting puts a list append and a few clock reads on every call
+STATS_ENABLED = os.getenv('TEXT_REPAIR_STATS', '') not in ('', '0')
+
+_END = ''
+
+
+def server_escape(ch):
+    """Escape one character for a MongoDB $regex (no raw control characters)"""
+    if ch == ' ' or (ch.isprintable() and not ch.isspace()):
+        return re.escape(ch)
+    return '\\x{%x}' % ord(ch)
+
+
+def _trie_pattern(node, escape=re.escape):
+    """Regex for a trie of literals that prefers the longest match"""
+    branches = [escape(ch) + _trie_pattern(child, escape) for ch, child in sorted(node.items()) if ch != _END]
+    if not branches:
+        return ''
+    body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if _END in node:
+        return '(?:' + body + ')?'
+    return body
+
+
+def _trie(literals):
+    trie = {}
+    for literal in literals:
+        node = trie
+        for ch in literal:
+            node = node.setdefault(ch, {})
+        node[_END] = True
+    return trie
+
+
+def compile_rules(rules):
+    """Compile rules into (pattern, lookup table); the first rule for a pattern wins"""
+    table = {}
+    for rule in rules:
+        table.setdefault(rule.old, rule.new)
+    if not table:
+        return None, table
+    return re.compile(_trie_pattern(_trie(table))), table
+
+
+def server_trigger(profile, literals):
+    """MongoDB $regex matching every string the profile could change
+
+    It may match strings that come out unchanged, never the other way round,
+    so it is safe as a find() pre-filter.
+    """
+    alternatives = []
+    if literals:
+        alternatives.append(_trie_pattern(_trie(literals), server_escape))
+    if profile.unescape_html:
+        alternatives.append('&')
+    if profile.drop_disallowed:
+        # PCRE's \w and \s are ASCII only, so this over-matches: still safe
+        alternatives.append(DISALLOWED_CHARS.pattern)
+    if profile.collapse_whitespace:
+        alternatives += ['^ ', ' $', '  ', SERVER_WHITESPACE]
+    elif profile.strip:
+        alternatives += [f'^(?: |{SERVER_WHITESPACE})', f'(?: |{SERVER_WHITESPACE})$']
+    return '|'.join(alternatives) or None
+
+
+class RuleStats:
+    """What one repairer did: calls, matches per rule pattern, seconds per step
+
+    Memo hits count the matches of the first call again, so the hits are per
+    string repaired, not per distinct string.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.memo_hits = 0
+        self.changed = 0
+        self.hits = Counter()
+        self.seconds = Counter()
+
+    def merge(self, other):
+        self.calls += other.calls
+        self.memo_hits += other.memo_hits
+        self.changed += other.changed
+        self.hits.update(other.hits)
+        self.seconds.update(other.seconds)
+
+
+class TextRepairer:
+    """A compiled profile: one regex scan plus the profile's post-processing"""
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.rules = [rule for rule in RULES if rule.group in profile.groups
+                      and (profile.patterns is None or rule.old in profile.patterns)]
+        self.pattern, self.table = compile_rules(self.rules)
+        self.trigger = server_trigger(profile, self.table)
+        self._lookup = lambda match: self.table[match.group()]
+        self._memo = {}
+        self.stats = None
+        self._fired = {}
+
+    def enable_stats(self):
+        """Start counting; the memo is emptied so that every string is seen once"""
+        self.stats = RuleStats()
+        self._memo.clear()
+        self._fired.clear()
+
+    def __call__(self, text):
+        if self.stats is not None:
+            return self._counted(text)
+        if not isinstance(text, str):
+            return text
+        if len(text) > MEMO_MAX_LENGTH:
+            return self._repair(text)
+        try:
+            return self._memo[text]
+        except KeyError:
+            if len(self._memo) >= MEMO_SIZE:
+                self._memo.clear()
+            result = self._memo[text] = self._repair(text)
+            return result
+
+    def _repair(self, text):
+        profile = self.profile
+        result = text
+        if profile.unescape_html and '&' in result:
+            result = html.unescape(result)
+        if self.pattern is not None:
+            result = self.pattern.sub(self._lookup, result)
+        if profile.drop_disallowed:
+            result = DISALLOWED_CHARS.sub('', result)
+        if profile.collapse_whitespace:
+            result = ' '.join(result.split())
+        elif profile.strip:
+            result = result.strip()
+        return result
+
+    def _counted(self, text):
+        """__call__ with statistics: same result, plus rule hits and step times"""
+        stats = self.stats
+        stats.calls += 1
+        if not isinstance(text, str):
+            return text
+        memoize = len(text) <= MEMO_MAX_LENGTH
+        if memoize and text in self._memo:
+            stats.memo_hits += 1
+            result = self._memo[text]
+            stats.hits.update(self._fired.get(text, ()))
+        else:
+            fired = []
+            result = self._repair_counted(text, fired)
+            stats.hits.update(fired)
+            if memoize:
+                if len(self._memo) >= MEMO_SIZE:
+                    self._memo.clear()
+                    self._fired.clear()
+                self._memo[text] = result
+                if fired:
+                    self._fired[text] = tuple(fired)
+        if result != text:
+            stats.changed += 1
+        return result
+
+    def _repair_counted(self, text, fired):
+        profile = self.profile
+        seconds = self.stats.seconds
+        table = self.table
+
+        def lookup(match):
+            old = match.group()
+            fired.append(old)
+            return table[old]
+
+        result = text
+        clock = time.perf_counter()
+        if profile.unescape_html and '&' in result:
+            result = html.unescape(result)
+            now = time.perf_counter()
+            seconds['unescape_html'] += now - clock
+            clock = now
+        if self.pattern is not None:
+            result = self.pattern.sub(lookup, result)
+            now = time.perf_counter()
+            seconds['rules'] += now - clock
+            clock = now
+        if profile.drop_disallowed:
+            result = DISALLOWED_CHARS.sub('', result)
+            now = time.perf_counter()
+            seconds['drop_disallowed'] += now - clock
+            clock = now
+        if profile.collapse_whitespace:
+            result = ' '.join(result.split())
+            seconds['collapse_whitespace'] += time.perf_counter() - clock
+        elif profile.strip:
+            result = result.strip()
+            seconds['strip'] += time.perf_counter() - clock
+        return result
+
+    def shadowed(self):
+        """[(rule, reason)] for the rules of this profile that can never fire
+
+        A rule is shadowed when an earlier rule has the same pattern, when
+        html.unescape() rewrites its pattern before the rules run, or when
+        other rules win on its own pattern (a longer match, or one that starts
+        earlier).
+        """
+        found = []
+        for rule in self.rules:
+            winner = next(r for r in self.rules if r.old == rule.old)
+            if winner is not rule:
+                found.append((rule, f"same pattern as the earlier '{winner.group}' rule"))
+            elif self.profile.unescape_html and html.unescape(rule.old) != rule.old:
+                found.append((rule, 'html.unescape() rewrites the pattern before the rules run'))
+            else:
+                match = self.pattern.search(rule.old)
+                if match is None or match.group() != rule.old:
+                    other = match.group() if match else ''
+                    found.append((rule, f"the rule for {other!r} matches first"))
+        return found
+
+
+_repairers = {}
+
+
+def get_repairer(name):
+    """Compiled repairer for a profile name (compiled once per process)"""
+    try:
+        return _repairers[name]
+    except KeyError:
+        repairer = _repairers[name] = TextRepairer(PROFILES[name])
+        if STATS_ENABLED:
+            repairer.enable_stats()
+        return repairer
+
+
+def enable_stats(names=None):
+    """Count rule hits from now on, for the named profiles (default: all)"""
+    global STATS_ENABLED
+    if names is None:
+        STATS_ENABLED = True
+        names = PROFILES
+    for name in names:
+        get_repairer(name).enable_stats()
+
+
+def merge_stats(stats):
+    """Add {profile: RuleStats} counted elsewhere (e.g. in a worker process) to this process"""
+    for name, other in stats.items():
+        repairer = get_repairer(name)
+        if repairer.stats is None:
+            repairer.enable_stats()
+        repairer.stats.merge(other)
+
+
+def rule_stats():
+    """{profile: RuleStats} for the profiles that counted anything in this process"""
+    return {name: repairer.stats for name, repairer in _repairers.items()
+            if repairer.stats is not None and repairer.stats.calls}
+
+
+def stats_report(stats=None):
+    """JSON-ready per-profile statistics: every rule with its hits, idle and shadowed rules flagged
+
+    stats defaults to rule_stats(); pass merged RuleStats to report on
+    several runs at once.
+    """
+    stats = rule_stats() if stats is None else stats
+    report = {}
+    for name, profile_stats in stats.items():
+        repairer = get_repairer(name)
+        shadowed = {id(rule): reason for rule, reason in repairer.shadowed()}
+        rules = []
+        for rule in repairer.rules:
+            entry = {'group': rule.group, 'old': rule.old, 'new': rule.new, 'hits': 0}
+            if id(rule) in shadowed:
+                entry['shadowed'] = shadowed[id(rule)]
+            else:
+                entry['hits'] = profile_stats.hits.get(rule.old, 0)
+            rules.append(entry)
+        report[name] = {
+            'calls': profile_stats.calls,
+            'memoHits': profile_stats.memo_hits,
+            'changed': profile_stats.changed,
+            'seconds': {step: round(value, 6) for step, value in profile_stats.seconds.items()},
+            'rules': rules,
+            'neverFired': sum(1 for entry in rules if not entry['hits'] and 'shadowed' not in entry),
+            'shadowed': len(shadowed),
+        }
+    return report
+
+
+def repair(text, name):
+    """Repair one string with the named profile; non-strings are returned as-is"""
+    return get_repairer(name)(text)
+
+
+def trigger_pattern(name):
+    """Server-side $regex for the strings the named profile may change"""
+    return get_repairer(name).trigger
+
+
+# Standard casing for the most common activity classifications
+ACTIVITY_MAP = {
+    'SANIDAD': 'Sanidad',
+    'CULTURA': 'Cultura',
+    'EDUCACION': 'Educación',
+    'INVESTIGACION': 'Investigación',
+    'SERVICIOS SOCIALES': 'Servicios Sociales',
+    'DEPORTE': 'Deporte'
+}
+
+
+def normalize_activity_name(name):
+    """Normalize activity names by removing periods and standardizing case"""
+    if not isinstance(name, str):
+        return name
+
+    # Remove trailing periods and extra spaces
+    normalized = name.strip().rstrip('.')
+
+    normalized_upper = normalized.upper()
+    if normalized_upper in ACTIVITY_MAP:
+        return ACTIVITY_MAP[normalized_upper]
+
+    # Otherwise return with proper capitalization
+    return normalized.title()
+
+
+def _activity_trigger():
+    # Latin-1 cased letters; anything above U+00FF is simply a candidate
+    letter = r'A-Za-z\x{aa}\x{b5}\x{ba}\x{c0}-\x{d6}\x{d8}-\x{f6}\x{f8}-\x{ff}'
+    upper = r'A-Z\x{c0}-\x{d6}\x{d8}-\x{de}'
+    lower = r'a-z\x{aa}\x{b5}\x{ba}\x{df}-\x{f6}\x{f8}-\x{ff}'
+    remapped = [key for key, value in ACTIVITY_MAP.items() if value != key.title()]
+    return '|'.join([
+        f'^(?: |{SERVER_WHITESPACE})', f'(?: |{SERVER_WHITESPACE})$', r'\.$',
+        f'[{letter}][{upper}]', f'(?:^|[^{letter}])[{lower}]', r'[\x{100}-\x{10ffff}]',
+        '(?i:' + '|'.join(remapped) + ')',
+    ])
+
+
+# Server-side $regex for the values normalize_activity_name() may change
+ACTIVITY_TRIGGER = _activity_trigger()